@@ -4,6 +4,7 @@ import numpy as np
 # from gui.Canvas import CanvasPanel
 from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg as FigureCanvas
 from models.ExperimentData import ExperimentData
+from util.Constants import PLOT_COLOURS
 import wx.lib.inspection
 
 
@@ -162,14 +163,13 @@ class BoxSizerPanel(wx.Panel):
 
         self.figure_canvas.line, = self.axes1.plot(x, y, linewidth=2)
 
-        labels = ['Reference', 'PC', 'PL']
-        colours = ['b', 'r', 'g']
         data = self.Data.Data
-        for i, label, colour in zip(data[:, 1:].T, labels, colours):
+        time = data[:, 0]
+        for label, colour in zip(data.names, PLOT_COLOURS):
 
             self.axes1.plot(
-                data[::1, 0],
-                i[::1],
+                time,
+                data[label],
                 '.',
                 # Color=colour,
                 # Label=label
@@ -231,38 +231,39 @@ class BoxSizerPanel(wx.Panel):
         # self.axes1.set_xbound([0, x[-1] + 1])
         self.figure_canvas.draw()
 
-    def offset_mean(self, val, col_num):
+    def offset_mean(self, val, channel):
         """
-        Determine mean value of col_num column between val to end of the array
+        Determine mean value of channel between val to end of the array
         """
-        col = self.Data.Data[:, col_num]
+        col = self.Data.Data[channel]
         fudge_factor = len(col) / float(SLIDER_MAX)
         # print(col)
         return np.min(col[int(fudge_factor) * val:])
 
-    def update_graph(self, mean_val, col_num):
-        labels = ['Reference', 'PC', 'PL']
-        colours = ['b', 'r', 'g']
-        data = np.copy(self.Data.Data)
-        data[:, col_num] = self.Data.Data[:, col_num] - mean_val
-        for i, label, colour in zip(data[:, 1:].T, labels, colours):
+    def update_graph(self, mean_val, channel):
+        data = self.Data.Data
+        time = data[:, 0]
+        for label, colour in zip(data.names, PLOT_COLOURS):
+            values = data[label]
+            if label == channel:
+                values = values - mean_val
 
             self.axes1.plot(
-                data[::1, 0],
-                i[::1],
+                time,
+                values,
                 '.',
                 color=colour,
                 # Label=label
             )
-        del self.axes1.lines[1:4]
+        del self.axes1.lines[1:1 + len(data.names)]
         # self.figure_canvas.draw()
 
     def OnSliderScroll(self, e):
 
         obj = e.GetEventObject()
         val = obj.GetValue()
-        mean_val = self.offset_mean(val, 1)
-        self.update_graph(mean_val, 1)
+        mean_val = self.offset_mean(val, 'Reference')
+        self.update_graph(mean_val, 'Reference')
         print(self.axes1.lines)
         self.move_left(val)
         print(str(val))
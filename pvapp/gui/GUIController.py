@@ -5,11 +5,12 @@ import numpy as np
 from util import utils
 from util.Constants import (
     CHANNELS,
-    CHANNEL_INDEX,
+    PLOT_COLOURS,
     INPUT_VOLTAGE_RANGE_STR,
     WAVEFORMS,
     OUTPUTS
 )
+from hardware.MeasurementExecutor import MeasurementExecutor
 from hardware.MeasurementHandler import MeasurementHandler
 from Canvas import CanvasPanel
 from DataPanel import DataPanel
@@ -19,6 +20,7 @@ from models.ExperimentSettings import ExperimentSettings
 from models.LightPulse import LightPulse
 
 from FrameSkeleton import FrameSkeleton  # import the newly created GUI file
+from Publisher import call_after_publish
 from wx.lib.pubsub import pub
 
 
@@ -77,9 +79,11 @@ class PlaceholderController(object):
 
         # data transformations
         pub.subscribe(self.view.Data.revertData, 'transform.revert')
+        pub.subscribe(self.view.Data.undo, 'transform.undo')
         pub.subscribe(self.view.Data.invertHandler, 'transform.invert')
         pub.subscribe(self.view.fftHandler, 'transform.fft')
         pub.subscribe(self.view.Data.binHandler, 'transform.bin')
+        pub.subscribe(self.view.Data.decimateHandler, 'transform.decimate')
         pub.subscribe(self.view.Data.offsetHandler, 'transform.offset')
 
         # plot changes
@@ -91,6 +95,10 @@ class PlaceholderController(object):
         # pub.subscribe(self.view.setPCCalibrationMean, 'calibration.pc')
         # pub.subscribe(self.view.setPCCalibrationStd, 'calibration.pc')
 
+        # measurements running in the background
+        pub.subscribe(self.view.onMeasurementComplete, 'measurement.complete')
+        pub.subscribe(self.view.onMeasurementError, 'measurement.error')
+
         pub.subscribe(self.view.setWaveformParameters, 'waveform.change')
         pub.subscribe(self.view.setCollectionParameters, 'collection.change')
 
@@ -283,19 +291,32 @@ class GUIController(FrameSkeleton):
         # Using that instance we then run the lights,
         # and measure the outputs
         self.measurement_handler = MeasurementHandler()
-        measurement_handler.add_to_queue(
+        self.measurement_handler.add_to_queue(
             self.light_pulse.complete_waveform,
             self.metadata
         )
 
-        raw_data = self.measurement_handler.single_measurement()
-        self.Data.updateRawData(raw_data)
-        self.Data.Data = utils.bin_data(raw_data, self.metadata.binning)
+        # the measurement runs on a worker thread, and the result comes
+        # back as a measurement.complete message
+        self.m_Measure.Disable()
+        self.executor = MeasurementExecutor(
+            self.measurement_handler, call_after_publish
+        )
+        self.executor.start()
+
+    def onMeasurementComplete(self, datasets):
+        self.m_Measure.Enable()
+        # the measurement is binned as it is acquired
+        self.Data.updateRawData(datasets[0])
         # We then plot the datas, this has to be changed if the plots want
         # to be updated on the fly.
 
         pub.sendMessage('update.plot')
 
+    def onMeasurementError(self, message):
+        self.m_Measure.Enable()
+        pub.sendMessage('statusbar.update', status=message, is_error=True)
+
 
     def fftHandler(self):
         channel = self.data_panel.m_fftChoice.GetStringSelection()
@@ -330,14 +351,14 @@ class GUIController(FrameSkeleton):
     #
 
     def plotHandler(self):
-        self.PlotData(self.Data.Data)
+        self.PlotData(self.Data.Data, data_labels=self.Data.Data.names)
 
-    def PlotData(self, data, data_labels=['Reference', 'PC', 'PL'],
+    def PlotData(self, data, data_labels=CHANNELS,
                  title=['Raw Data', 'Time (s)', 'Voltage (V)'], e=None):
 
         self.Fig1.clear()
         labels = data_labels
-        colours = ['b', 'r', 'g']
+        colours = PLOT_COLOURS
 
         # this is done not to clog up the plot with many points
         if data.shape[0] > 1000:
@@ -646,14 +667,12 @@ class DataPanelHandler(object):
         # TODO refactor
         self.figure_canvas.line, = self.axes1.plot(x, y, linewidth=2)
 
-        labels = ['Reference', 'PC', 'PL']
-        colours = ['b', 'r', 'g']
         data = self.Data.Data
-        for i, label, colour in zip(data[:, 1:].T, labels, colours):
+        for label, colour in zip(data.names, PLOT_COLOURS):
 
             self.axes1.plot(
-                data[::1, 0],
-                i[::1],
+                data[:, 0],
+                data[label],
                 '.',
                 color=colour,
                 # Label=label
@@ -662,22 +681,21 @@ class DataPanelHandler(object):
     def onChangeOffset(self, event):
         num = float(self.datapanel.m_yOffset.GetValue())
         channel = self.datapanel.m_offsetChannelChoice.GetStringSelection()
-        self.Data.Data[:, CHANNEL_INDEX[channel]] = self.Data.Data[:, CHANNEL_INDEX[channel]] - num
+        self.Data.offsetHandler(offset_type='y', offset=-num, channel=channel)
 
     def onInteractiveOffsets(self, event):
         val = self.datapanel.m_OffsetSlider.GetValue()
-        num = self.offset_mean(val, 1)
+        num = self.offset_mean(val, 'Reference')
         channel = self.datapanel.m_offsetChannelChoice.GetStringSelection()
-        self.Data.Data[:, CHANNEL_INDEX[channel]] = self.Data.Data[:, CHANNEL_INDEX[channel]] - num
+        self.Data.offsetHandler(offset_type='y', offset=-num, channel=channel)
 
     def onSliderScroll(self, event):
         channel = self.datapanel.m_offsetChannelChoice.GetStringSelection()
-        index = CHANNEL_INDEX[channel]
 
         obj = event.GetEventObject()
         val = obj.GetValue()
-        mean_val = self.offset_mean(val, index)
-        self.update_graph(mean_val, index)
+        mean_val = self.offset_mean(val, channel)
+        self.update_graph(mean_val, channel)
         print(self.axes1)
         self.move_line(val)
         print(str(val))
@@ -691,27 +709,29 @@ class DataPanelHandler(object):
         # self.axes1.set_xbound([0, x[-1] + 1])
         self.figure_canvas.draw()
 
-    def offset_mean(self, val, col_num):
+    def offset_mean(self, val, channel):
         """
-        Determine mean value of col_num column between val to end of the array
+        Determine mean value of channel between val to end of the array
         """
-        col = self.Data.Data[:, col_num]
+        col = self.Data.Data[channel]
         fudge_factor = len(col) / float(self.datapanel.SLIDER_MAX)
         # print(col)
         return np.min(col[int(fudge_factor) * val:])
 
-    def update_graph(self, mean_val, col_num):
-        labels = ['Reference', 'PC', 'PL']
-        colours = ['b', 'r', 'g']
-        data = np.copy(self.Data.Data)
-        data[:, col_num] = self.Data.Data[:, col_num] - mean_val
-        for i, label, colour in zip(data[:, 1:].T, labels, colours):
+    def update_graph(self, mean_val, channel):
+        # only the offset channel is copied
+        data = self.Data.Data
+        time = data[:, 0]
+        for label, colour in zip(data.names, PLOT_COLOURS):
+            values = data[label]
+            if label == channel:
+                values = values - mean_val
 
             self.axes1.plot(
-                data[::1, 0],
-                i[::1],
+                time,
+                values,
                 '.',
                 color=colour,
                 # Label=label
             )
-        del self.axes1.lines[1:4]
+        del self.axes1.lines[1:1 + len(data.names)]
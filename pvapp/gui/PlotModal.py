@@ -1,5 +1,6 @@
 import wx
 from Canvas import CanvasPanel
+from util.Constants import PLOT_COLOURS
 
 
 class PlotModal(wx.Frame):
@@ -14,6 +15,14 @@ class PlotModal(wx.Frame):
 
         self.m_ok_button = wx.Button(parent=self.panel, id=-1, label='Ok')
 
+        # control a measurement series running in the background
+        self.m_pause_button = wx.Button(
+            parent=self.panel, id=-1, label='Pause'
+        )
+        self.m_cancel_button = wx.Button(
+            parent=self.panel, id=-1, label='Cancel'
+        )
+
         self.sizer.Add(
             item=self.Fig1,
             proportion=1,
@@ -22,8 +31,16 @@ class PlotModal(wx.Frame):
 
         self.sizer.AddSpacer((10, 10), 1, wx.EXPAND, 10)
 
+        self.button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        for button in [self.m_pause_button, self.m_cancel_button,
+                       self.m_ok_button]:
+            self.button_sizer.Add(
+                item=button,
+                proportion=1,
+                flag=wx.CENTER | wx.ALL
+            )
         self.sizer.Add(
-            item=self.m_ok_button,
+            item=self.button_sizer,
             proportion=1,
             flag=wx.CENTER | wx.ALL
         )
@@ -40,19 +57,28 @@ class PlotModal(wx.Frame):
     def ok_button(self, evt):
         self.Destroy()
 
+    def set_progress(self, index, total):
+        self.SetTitle('Measurement {0} of {1}'.format(index, total))
+
+    def set_paused(self, paused):
+        self.m_pause_button.SetLabel('Resume' if paused else 'Pause')
+
+    def disable_measurement_controls(self):
+        self.m_pause_button.Disable()
+        self.m_cancel_button.Disable()
+
     def clear_figure(self):
         self.Fig1.clear()
 
     def plot_data(self, data):
-        self.colours = ["r", "g", "b"]
-        # This plots the figure
-        for index, column in enumerate(data):
+        # This plots the figure, a column for each channel
+        for column, colour in zip(data, PLOT_COLOURS):
 
             self.Fig1.draw_points(
                 range(len(column)),
                 column,
                 '.',
-                Color=self.colours[index]
+                Color=colour
             )
 
         self.Fig1.update()
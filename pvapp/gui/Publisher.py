@@ -0,0 +1,10 @@
+import wx
+from wx.lib.pubsub import pub
+
+
+def call_after_publish(topic, **kwargs):
+    """
+    Sends a pubsub message from the wx main loop, so it is safe to publish
+    from a worker thread
+    """
+    wx.CallAfter(pub.sendMessage, topic, **kwargs)
@@ -0,0 +1,101 @@
+import threading
+
+
+class MeasurementExecutor(threading.Thread):
+    """
+    Drains the queue of a MeasurementHandler on a worker thread, so the UI
+    stays responsive while a series of measurements runs.
+
+    Events are reported through publish(topic, **kwargs), which is called
+    on the worker thread; the GUI passes a publisher which forwards them to
+    the wx main loop. The topics are
+
+        measurement.started     total
+        measurement.progress    index, total, data
+        measurement.complete    datasets
+        measurement.cancelled   datasets
+        measurement.error       message
+
+    Pausing takes effect between measurements. Cancelling also aborts the
+    acquisition in progress.
+
+    process(index, total, data), if given, is called with every dataset
+    before its progress event is published, off the UI thread; it is where
+    datasets are saved. With pipelined set, the next experiment is acquired
+    while the previous one is being processed. With burst set, runs of
+    similar experiments are acquired in a single task; this takes
+    precedence over pipelined.
+    """
+
+    def __init__(self, measurement_handler, publish, process=None,
+                 pipelined=False, burst=False):
+        super(MeasurementExecutor, self).__init__()
+        # don't keep the application alive for a half finished series
+        self.daemon = True
+
+        self.measurement_handler = measurement_handler
+        self.publish = publish
+        self.process = process
+        self.pipelined = pipelined
+        self.burst = burst
+        self.datasets = []
+
+        self._cancelled = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+
+    def pause(self):
+        self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def is_paused(self):
+        return not self._resumed.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        self.measurement_handler.abort()
+        # a paused series has to wake up to notice it was cancelled
+        self._resumed.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def _before_measurement(self):
+        self._resumed.wait()
+        return not self._cancelled.is_set()
+
+    def _on_progress(self, index, total, data):
+        if self.process is not None:
+            self.process(index, total, data)
+        self.publish('measurement.progress', index=index, total=total,
+                     data=data)
+
+    def run(self):
+        self.publish(
+            'measurement.started',
+            total=self.measurement_handler.queue_length()
+        )
+        if self.burst:
+            series = self.measurement_handler.burst_series_measurement
+        elif self.pipelined:
+            series = self.measurement_handler.pipelined_series_measurement
+        else:
+            series = self.measurement_handler.series_measurement
+
+        try:
+            self.datasets = series(
+                progress_callback=self._on_progress,
+                before_measurement=self._before_measurement
+            )
+        except Exception as e:
+            self.measurement_handler.clear_queue()
+            self.publish('measurement.error', message=str(e))
+            return
+
+        if self._cancelled.is_set():
+            self.measurement_handler.clear_queue()
+            self.publish('measurement.cancelled', datasets=self.datasets)
+        else:
+            self.publish('measurement.complete', datasets=self.datasets)
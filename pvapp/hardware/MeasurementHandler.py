@@ -1,38 +1,174 @@
 import numpy as np
 import logging
+import Queue
+import threading
+import time
 
 from collections import deque
 
 from hardware.daq import WaveformThread
+from models.Dataset import Dataset
+from models.InputChannel import InputChannel
 from models.LightPulse import LightPulse
+from util.Constants import (
+    AUTO_RANGE_HEADROOM,
+    AUTO_RANGE_SAMPLE_RATE,
+    CHANNELS,
+    INPUT_VOLTAGE_RANGE,
+)
+from util.binning import reduce_bins
+from util.StreamingDecimator import decimate
+from util.Exceptions import MeasurementAborted
+from util.RunningStatistics import RunningStatistics
 
 
 class MeasurementHandler(object):
     """
     Controller to handle IO from NI datacard
+
+    With persistent_tasks the DAQ tasks of a queued experiment are created
+    and committed once, then restarted for every averaging repeat.
+
+    With hardware_averaging all averaging repeats are played back to back
+    in one task and reduced from the single read buffer. The output task
+    is clocked from the input sample clock, so this only keeps the shots
+    aligned when an experiment's input and output sample rates are the
+    same; otherwise its repeats run in tasks of their own.
+
+    backend is the DAQBackend the measurements run on, by default the NI
+    card.
+
+    With raw the DAQ transfers int16 codes. The shots are averaged in
+    codes, and only the averages are scaled to volts.
+
+    With look_ahead the tasks of the next queued experiment are created and
+    configured on a background thread while the current one acquires, so
+    only the waveform upload and start remain between experiments. The
+    time from the end of one experiment's acquisition to the start of the
+    next is recorded in dead_times.
+
+    With auto_range each experiment is preceded by a single pre-shot, at
+    no more than AUTO_RANGE_SAMPLE_RATE, read over the widest input range.
+    Every input is then set to the tightest range which still leaves
+    AUTO_RANGE_HEADROOM over the peak it saw, and the range and peak are
+    kept in the input's settings. The tasks of an experiment can only be
+    configured once it is ranged, so look_ahead has no effect with it.
+
+    Each experiment is binned by its binning setting as it is read, by box
+    averaging or FIR decimation as its decimation setting picks, so only
+    the binned shots are kept, unless keep_raw is set (see
+    WaveformThread).
+
+    acquisition_progress(samples_read, total), if given, is called after
+    every chunk read during an acquisition. abort stops the acquisition in
+    progress part way through, ending the series.
     """
-    def __init__(self):
+    def __init__(self, persistent_tasks=False, hardware_averaging=False,
+                 backend=None, acquisition_progress=None, raw=False,
+                 look_ahead=False, auto_range=False, keep_raw=False):
 
         self._queue = deque()
 
-        self.NUM_CHANNELS = 3.
+        self.persistent_tasks = persistent_tasks
+        self.hardware_averaging = hardware_averaging
+        self.backend = backend
+        self.acquisition_progress = acquisition_progress
+        self.raw = raw
+        self.look_ahead = look_ahead
+        self.auto_range = auto_range
+        self.keep_raw = keep_raw
+
+        # the queued threads whose inputs have been ranged
+        self._ranged = set()
+
+        # (thread, worker, errors) of the experiment being prepared ahead
+        self._prepared = None
+        # when the acquisition of the last experiment ended
+        self._experiment_ended = None
+        # seconds between experiments of the last series
+        self.dead_times = []
+
+        # the thread currently acquiring, so it can be aborted
+        self._current_thread = None
+        self._aborted = False
+
+        # the analog inputs read unless an experiment sets its own
+        self.NUM_CHANNELS = len(CHANNELS)
 
         self._logger = logging.getLogger()
 
     def _run_thread(self, daq_io_thread, metadata):
         """
         Sends a single version of waveform to the specified channel
-        Returns:
+        Returns: a (samples, channels) view of the data read
         """
 
-        daq_io_thread.setup()
-        daq_io_thread.run()
-        daq_io_thread.stop()
+        if not self.persistent_tasks:
+            daq_io_thread.setup()
+            try:
+                self._start_run(daq_io_thread)
+            finally:
+                # a failed read must not leave the tasks allocated
+                daq_io_thread.stop()
+        else:
+            # the waveform stays in the output buffer and every repeat is
+            # read into the same read buffer
+            if not daq_io_thread.committed:
+                daq_io_thread.setup()
+                daq_io_thread.commit()
+            self._start_run(daq_io_thread)
+            # return to the committed state, ready for the next repeat
+            daq_io_thread.stop_tasks()
 
-        return daq_io_thread.Read_Data, daq_io_thread.time
+        if daq_io_thread.aborted:
+            raise MeasurementAborted('The acquisition was aborted')
+        return daq_io_thread.channel_view()
+
+    def _start_run(self, daq_io_thread):
+        if self._experiment_ended is not None:
+            dead_time = time.time() - self._experiment_ended
+            self._experiment_ended = None
+            self.dead_times.append(dead_time)
+            self._logger.debug(
+                'Dead time between measurements: {0:.1f} ms'.format(
+                    dead_time * 1e3)
+            )
+
+        self._current_thread = daq_io_thread
+        try:
+            # an abort may have come in while the tasks were set up
+            if self._aborted:
+                daq_io_thread.abort()
+            daq_io_thread.run()
+        finally:
+            self._current_thread = None
+
+    def abort(self):
+        """
+        Stops the acquisition in progress after its current chunk, and any
+        queued after it, until the queue is cleared
+        """
+        self._aborted = True
+        daq_io_thread = self._current_thread
+        if daq_io_thread is not None:
+            daq_io_thread.abort()
+
+    def _averages_in_hardware(self, metadata):
+        """
+        Whether the repeats of an experiment are played in a single task
+        """
+        # the output is clocked from the input sample clock, so a repeat
+        # only spans a shot of input samples if both rates are the same
+        return (self.hardware_averaging and
+                metadata.sample_rate == metadata.output_sample_rate)
 
     def add_to_queue(self, waveform_array, metadata):
 
+        if self._averages_in_hardware(metadata):
+            repeats = metadata.averaging
+        else:
+            repeats = 1
+
         daq_io_thread = WaveformThread(
             waveform=waveform_array,
             Channel=metadata.channel_name,
@@ -40,49 +176,547 @@ class MeasurementHandler(object):
             input_voltage_range=metadata.input_voltage_range,
             output_voltage_range=metadata.output_voltage_range,
             input_sample_rate=metadata.sample_rate,
-            output_sample_rate=metadata.output_sample_rate
+            output_sample_rate=metadata.output_sample_rate,
+            repeats=repeats,
+            backend=self.backend,
+            raw=self.raw,
+            input_channels=metadata.input_channels,
+            bin_size=metadata.binning,
+            keep_raw=self.keep_raw,
+            decimation=metadata.decimation
         )
+        if self.acquisition_progress is not None:
+            daq_io_thread.add_progress_callback(self.acquisition_progress)
         self._queue.append((daq_io_thread, metadata))
 
+    def queue_length(self):
+        return len(self._queue)
+
     def is_queue_empty(self):
         return True if len(self._queue) == 0 else False
 
     def clear_queue(self):
+        self._discard_prepared()
         self._queue = deque()
+        self._ranged = set()
+        self._aborted = False
 
-    def single_measurement(self):
-        thread_time = None
-        data_set = []
+    def _prepare_next(self):
+        """
+        Starts configuring the tasks of the next queued experiment on a
+        background thread
+        """
+        if not self.look_ahead or not self._queue or self._prepared:
+            return
+        if self.auto_range:
+            # its ranges are only known once it has had its pre-shot
+            return
 
-        element = self._queue.popleft()
+        daq_io_thread = self._queue[0][0]
+        errors = []
+
+        def configure():
+            try:
+                daq_io_thread.configure()
+            except Exception as e:
+                errors.append(e)
+
+        worker = threading.Thread(target=configure)
+        worker.daemon = True
+        worker.start()
+        self._prepared = (daq_io_thread, worker, errors)
+
+    def _wait_for_prepared(self, daq_io_thread):
+        """
+        Waits for daq_io_thread to be configured, if it is being prepared
+        """
+        if self._prepared is None or self._prepared[0] is not daq_io_thread:
+            return
+        prepared, worker, errors = self._prepared
+        self._prepared = None
+        worker.join()
+        if errors:
+            prepared.stop()
+            raise errors[0]
 
+    def _discard_prepared(self):
+        """Clears the tasks of an experiment prepared ahead"""
+        if self._prepared is not None:
+            prepared, worker, errors = self._prepared
+            self._prepared = None
+            worker.join()
+            prepared.stop()
+
+    def _pre_shot_thread(self, daq_io_thread, metadata):
+        """
+        Returns a thread which plays the waveform of a queued experiment
+        once, at no more than AUTO_RANGE_SAMPLE_RATE, and reads every input
+        over the widest range
+        """
+        period = np.empty(daq_io_thread.periodLength)
+        daq_io_thread.copy_period(period)
+
+        # keep the sample of largest magnitude in each block, so the peak
+        # drive survives the lower rate
+        step = int(np.ceil(metadata.output_sample_rate /
+                           AUTO_RANGE_SAMPLE_RATE))
+        num_samples = period.shape[0] // step
+        blocks = period[:num_samples * step].reshape((num_samples, step))
+        waveform = blocks[
+            np.arange(num_samples), np.argmax(np.abs(blocks), axis=1)
+        ]
+        rate = metadata.output_sample_rate / step
+
+        widest = max(INPUT_VOLTAGE_RANGE)
+        return WaveformThread(
+            waveform=waveform,
+            Channel=metadata.channel_name,
+            Time=np.float64((num_samples + 0.5) / rate),
+            input_voltage_range=widest,
+            output_voltage_range=metadata.output_voltage_range,
+            input_sample_rate=rate,
+            output_sample_rate=rate,
+            backend=self.backend,
+            input_channels=[
+                InputChannel(
+                    input_channel.name, input_channel.physical_channel,
+                    input_channel.terminal_config, widest
+                )
+                for input_channel in metadata.input_channels
+            ]
+        )
+
+    def _choose_range(self, peak):
+        """The tightest input range with enough headroom over peak"""
+        for voltage_range in sorted(INPUT_VOLTAGE_RANGE):
+            if peak * AUTO_RANGE_HEADROOM <= voltage_range:
+                return voltage_range
+        return max(INPUT_VOLTAGE_RANGE)
+
+    def _auto_range(self, element):
+        """
+        Runs the pre-shot of a queued experiment and sets the range of each
+        of its inputs from the peaks it read
+        """
+        daq_io_thread, metadata = element
+        if not self.auto_range or daq_io_thread in self._ranged:
+            return
+
+        pre_shot = self._pre_shot_thread(daq_io_thread, metadata)
+        try:
+            pre_shot.setup()
+            self._current_thread = pre_shot
+            try:
+                if self._aborted:
+                    pre_shot.abort()
+                pre_shot.run()
+            finally:
+                self._current_thread = None
+                pre_shot.stop()
+            if pre_shot.aborted:
+                raise MeasurementAborted('The acquisition was aborted')
+            peaks = np.abs(pre_shot.channel_view()).max(axis=0)
+        finally:
+            pre_shot.release_buffers()
+
+        for input_channel, peak in zip(metadata.input_channels, peaks):
+            input_channel.measured_peak = float(peak)
+            input_channel.voltage_range = self._choose_range(peak)
+            self._logger.info('{0}: peak {1:.3f} V, range +/- {2} V'.format(
+                input_channel.name, peak, input_channel.voltage_range
+            ))
+        self._ranged.add(daq_io_thread)
+
+    def _start_series(self):
+        self._experiment_ended = None
+        self.dead_times = []
+
+    def _log_dead_time(self):
+        if self.dead_times:
+            self._logger.info(
+                'Mean dead time between measurements: {0:.1f} ms'.format(
+                    1e3 * np.mean(self.dead_times))
+            )
+
+    def _shots_view(self, read_data, repeats):
+        """
+        Returns a (repeats, samples, channels) view of the (samples,
+        channels) data read from back to back shots
+        """
+        return read_data.reshape((repeats, -1, read_data.shape[1]))
+
+    def _assemble_dataset(self, time_axis, mean, std_error, names=None):
+        """
+        Puts the averaged channels and their standard errors into a single
+        Dataset on time_axis, whose array form has the columns time,
+        channels, standard errors
+        """
+        # the time axis stays as t0 and dt, no time column is stored
+        return Dataset.from_channels(time_axis, mean, std_error, names)
+
+    def _shot_statistics(self, shots):
+        """
+        Returns the mean and standard error of (repeats, samples, channels)
+        shots in one vectorised pass
+        """
+        repeats = shots.shape[0]
+        if repeats > 1:
+            std_error = shots.std(axis=0, ddof=1) / np.sqrt(repeats)
+        else:
+            std_error = np.full(shots.shape[1:], np.nan)
+        return shots.mean(axis=0), std_error
+
+    def _hardware_average(self, element, read_data):
+        """
+        Averages all the repeats acquired in a single task, returning the
+        mean and its standard error
+        """
+        shots = self._shots_view(read_data, element[1].averaging)
+        return self._shot_statistics(shots)
+
+    def _acquire(self, element):
+        """
+        Performs all the averaging repeats of a queued experiment. Returns
+        the read data of the single task with hardware averaging, otherwise
+        the running statistics of the shots.
+        """
         averaging = element[1].averaging
         assert averaging > 0, "Averaging={0}".format(averaging)
 
-        measurement_data, thread_time = self._run_thread(element[0], element[1])
+        self._auto_range(element)
+        self._ranged.discard(element[0])
+        self._wait_for_prepared(element[0])
+        # the next experiment is configured while this one runs
+        self._prepare_next()
+
+        if self._averages_in_hardware(element[1]):
+            read_data = self._run_thread(element[0], element[1])
+            self._experiment_ended = time.time()
+            return read_data
+
+        statistics = None
+        try:
+            for i in range(averaging):
+                thread_data = self._run_thread(element[0], element[1])
+                if statistics is None:
+                    statistics = RunningStatistics(thread_data.shape)
+                statistics.update(thread_data)
+        finally:
+            if self.persistent_tasks:
+                # releases the tasks kept committed across the repeats
+                element[0].stop()
+
+        self._experiment_ended = time.time()
+        return statistics
+
+    def _reduce(self, element, acquired):
+        """
+        Turns what _acquire returned into the dataset of the experiment
+        """
+        if self._averages_in_hardware(element[1]):
+            mean, std_error = self._hardware_average(element, acquired)
+        else:
+            mean, std_error = acquired.mean, acquired.standard_error()
+
+        return self._to_dataset(element[0], element[1], mean, std_error)
+
+    def _to_dataset(self, daq_io_thread, metadata, mean, std_error,
+                    time_axis=None):
+        """
+        Assembles the dataset of averages read by daq_io_thread, on
+        time_axis if given, otherwise on that of the thread
+        """
+        if self.raw:
+            # the scaling is linear, so it applies to the averages as well
+            mean = daq_io_thread.to_volts(mean)
+            std_error = std_error * np.abs(daq_io_thread.scales)
+
+        if time_axis is None:
+            time_axis = daq_io_thread.time_axis(mean.shape[0])
+        return self._assemble_dataset(
+            time_axis, mean, std_error,
+            [input_channel.name for input_channel in metadata.input_channels]
+        )
+
+    def _reduce_and_release(self, element, acquired):
+        """
+        Reduces the acquired data, then hands the read buffers of the
+        experiment back to the pool
+        """
+        try:
+            return self._reduce(element, acquired)
+        finally:
+            element[0].release_buffers()
+
+    def single_measurement(self):
+        element = self._queue.popleft()
+        try:
+            acquired = self._acquire(element)
+        except Exception:
+            element[0].release_buffers()
+            raise
+        return self._reduce_and_release(element, acquired)
+
+    def series_measurement(self, progress_callback=None,
+                           before_measurement=None):
+        """
+        Performs every queued measurement and returns the datasets in queue
+        order. progress_callback(index, total, data) is called after each
+        measurement. before_measurement() is called before each one, and
+        returning False from it ends the series early, as does abort.
+        """
+        dataset_list = []
+        total = len(self._queue)
+        self._start_series()
+
+        for index in range(1, total + 1):
+            if before_measurement is not None and not before_measurement():
+                break
+
+            # each measurement takes the next experiment off the queue
+            try:
+                data = self.single_measurement()
+            except MeasurementAborted:
+                break
+            dataset_list.append(data)
+            self._logger.info('Measurement #{0} complete'.format(index))
+            if progress_callback is not None:
+                progress_callback(index, total, data)
+
+        self._logger.info(
+            'Total: {0} measurements performed'.format(len(dataset_list))
+        )
+        self._log_dead_time()
+        return dataset_list
+
+    def pipelined_series_measurement(self, progress_callback=None,
+                                     before_measurement=None, max_pending=2):
+        """
+        As series_measurement, but each experiment is reduced and passed to
+        progress_callback on a second thread while the next one is being
+        acquired. At most max_pending acquired experiments wait to be
+        processed; beyond that the acquisition blocks until the processing
+        (typically saving and plotting) catches up.
+        """
+        dataset_list = []
+        total = len(self._queue)
+        self._start_series()
+        pending = Queue.Queue(maxsize=max_pending)
+        errors = []
+
+        def process():
+            while True:
+                item = pending.get()
+                if item is None:
+                    return
+
+                index, element, acquired = item
+                if errors:
+                    # keep draining so the acquisition never blocks
+                    element[0].release_buffers()
+                    continue
 
-        if averaging > 1:
-            for i in range(averaging - 1):
-                thread_data, thread_time = self._run_thread(element[0], element[1])
-                measurement_data = np.vstack((thread_data,
-                                              measurement_data))
-                # RunningTotal is weighted by the number of points
-                measurement_data = np.average(measurement_data,
-                                              axis=0,
-                                              weights=(1, i + 1))
+                try:
+                    data = self._reduce_and_release(element, acquired)
+                    dataset_list.append(data)
+                    self._logger.info(
+                        'Measurement #{0} complete'.format(index)
+                    )
+                    if progress_callback is not None:
+                        progress_callback(index, total, data)
+                except Exception as e:
+                    errors.append(e)
 
-        # what are going to be read
+        worker = threading.Thread(target=process)
+        worker.daemon = True
+        worker.start()
 
-        data_set = np.empty((int(measurement_data.shape[0] / self.NUM_CHANNELS), self.NUM_CHANNELS))
+        try:
+            for index in range(1, total + 1):
+                if errors:
+                    break
+                if before_measurement is not None and not before_measurement():
+                    break
 
-        for i in range(int(self.NUM_CHANNELS)):
-            # The data should be outputed one of each other, so divide it
-            # up and roll it out
-            row_length = data_set.shape[0]
-            data_set[:, i] = measurement_data[i * row_length:(i + 1) * row_length]
+                element = self._queue.popleft()
+                try:
+                    acquired = self._acquire(element)
+                except MeasurementAborted:
+                    element[0].release_buffers()
+                    break
+                # blocks while max_pending experiments wait to be processed
+                pending.put((index, element, acquired))
+        finally:
+            pending.put(None)
+            worker.join()
 
-        data_set = np.vstack((thread_time, data_set.T)).T
-        return data_set
+        if errors:
+            raise errors[0]
+
+        self._logger.info(
+            'Total: {0} measurements performed'.format(len(dataset_list))
+        )
+        self._log_dead_time()
+        return dataset_list
+
+    def _burst_key(self, metadata):
+        """Experiments with the same key can be played in the same task"""
+        return (
+            metadata.channel_name,
+            # only what configures the read task, not the measured peaks
+            tuple(
+                (input_channel.name, input_channel.physical_channel,
+                 input_channel.terminal_config, input_channel.voltage_range)
+                for input_channel in metadata.input_channels
+            ),
+            metadata.output_voltage_range,
+            metadata.sample_rate,
+            metadata.output_sample_rate,
+        )
+
+    def _next_burst(self):
+        """
+        Takes the run of experiments at the front of the queue which can
+        share a task off the queue
+        """
+        burst = [self._queue.popleft()]
+        key = self._burst_key(burst[0][1])
+        while self._queue and self._burst_key(self._queue[0][1]) == key:
+            burst.append(self._queue.popleft())
+        return burst
+
+    def _burst_thread(self, burst, dark_time):
+        """
+        Returns a thread which plays every shot of the experiments in burst
+        back to back, with dark_time between experiments, and the sample
+        offset at which each experiment starts
+        """
+        metadata = burst[0][1]
+        gap = int(round(dark_time * metadata.sample_rate))
+
+        offsets = []
+        total = 0
+        for daq_io_thread, metadata in burst:
+            offsets.append(total)
+            total += daq_io_thread.periodLength * metadata.averaging + gap
+
+        waveform = np.zeros(total)
+        for offset, (daq_io_thread, metadata) in zip(offsets, burst):
+            length = daq_io_thread.periodLength
+            for i in range(metadata.averaging):
+                start = offset + i * length
+                daq_io_thread.copy_period(waveform[start:start + length])
+
+        burst_thread = WaveformThread(
+            waveform=waveform,
+            Channel=metadata.channel_name,
+            # half a sample over, so the samples are not rounded down to one
+            # short of total
+            Time=np.float64((total + 0.5) / metadata.sample_rate),
+            input_voltage_range=metadata.input_voltage_range,
+            output_voltage_range=metadata.output_voltage_range,
+            input_sample_rate=metadata.sample_rate,
+            output_sample_rate=metadata.output_sample_rate,
+            backend=self.backend,
+            raw=self.raw,
+            input_channels=metadata.input_channels
+        )
+        if self.acquisition_progress is not None:
+            burst_thread.add_progress_callback(self.acquisition_progress)
+        return burst_thread, offsets
+
+    def _split_burst(self, burst, burst_thread, offsets):
+        """
+        Returns the dataset of each experiment of an acquired burst
+        """
+        read_data = burst_thread.channel_view()
+        dataset_list = []
+        for offset, (daq_io_thread, metadata) in zip(offsets, burst):
+            length = daq_io_thread.periodLength * metadata.averaging
+            shots = self._shots_view(
+                read_data[offset:offset + length], metadata.averaging
+            )
+            if metadata.binning > 1 and metadata.decimation == 'fir':
+                shots = decimate(
+                    shots, metadata.binning, burst_thread.sample_clock_rate,
+                    axis=1
+                )
+            elif metadata.binning > 1:
+                shots = reduce_bins(shots, metadata.binning, axis=1)
+            mean, std_error = self._shot_statistics(shots)
+            dataset_list.append(self._to_dataset(
+                burst_thread, metadata, mean, std_error,
+                burst_thread.time_axis(mean.shape[0], metadata.binning)
+            ))
+        return dataset_list
+
+    def burst_series_measurement(self, progress_callback=None,
+                                 before_measurement=None, dark_time=1e-3):
+        """
+        As series_measurement, but each run of queued experiments with the
+        same channel, ranges and sample rates is acquired in a single task,
+        saving the cost of a task per experiment. Every shot of an
+        experiment is played back to back, and experiments are separated by
+        dark_time seconds with the LED off. before_measurement() is called
+        before each run.
+        """
+        dataset_list = []
+        total = len(self._queue)
+        self._start_series()
+
+        while self._queue:
+            if before_measurement is not None and not before_measurement():
+                break
+
+            # range the whole queue first, so experiments ranged the same
+            # way can share a burst
+            try:
+                for element in self._queue:
+                    self._auto_range(element)
+            except MeasurementAborted:
+                break
+
+            metadata = self._queue[0][1]
+            if metadata.sample_rate != metadata.output_sample_rate:
+                # the offsets are only known if both are on the one clock
+                try:
+                    burst_data = [self.single_measurement()]
+                except MeasurementAborted:
+                    break
+            else:
+                # the experiments of the burst are played in a task of its
+                # own, so any tasks prepared ahead for one are not needed
+                self._discard_prepared()
+                burst = self._next_burst()
+                for daq_io_thread, burst_metadata in burst:
+                    self._ranged.discard(daq_io_thread)
+                burst_thread, offsets = self._burst_thread(burst, dark_time)
+                try:
+                    burst_thread.setup()
+                    try:
+                        self._start_run(burst_thread)
+                    finally:
+                        burst_thread.stop()
+                    if burst_thread.aborted:
+                        break
+                    burst_data = self._split_burst(
+                        burst, burst_thread, offsets
+                    )
+                finally:
+                    burst_thread.release_buffers()
+
+            for data in burst_data:
+                dataset_list.append(data)
+                index = len(dataset_list)
+                self._logger.info('Measurement #{0} complete'.format(index))
+                if progress_callback is not None:
+                    progress_callback(index, total, data)
+
+        self._logger.info(
+            'Total: {0} measurements performed'.format(len(dataset_list))
+        )
+        self._log_dead_time()
+        return dataset_list
 
     def pc_calibration_measurement(self, calibration_settings):
 
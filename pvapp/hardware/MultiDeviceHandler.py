@@ -0,0 +1,223 @@
+import logging
+import Queue
+import threading
+
+from collections import deque
+
+from hardware.MeasurementHandler import MeasurementHandler
+from util.Exceptions import MeasurementAborted
+
+
+class MultiDeviceHandler(object):
+    """
+    Runs a measurement plan across several DAQ devices at once.
+
+    Each backend gets its own MeasurementHandler, and so its own
+    WaveformThreads. Queued experiments are dealt to the devices in turn,
+    and during a series every device works through its share on its own
+    worker thread. The datasets are merged back, and progress is reported,
+    in the order the experiments were queued.
+
+    The other arguments are passed to every device's MeasurementHandler.
+    """
+
+    def __init__(self, backends, persistent_tasks=False,
+                 hardware_averaging=False, acquisition_progress=None,
+                 look_ahead=False, auto_range=False, keep_raw=False):
+        assert len(backends) > 0
+
+        self.handlers = [
+            MeasurementHandler(
+                persistent_tasks=persistent_tasks,
+                hardware_averaging=hardware_averaging,
+                backend=backend,
+                acquisition_progress=acquisition_progress,
+                look_ahead=look_ahead,
+                auto_range=auto_range,
+                keep_raw=keep_raw
+            )
+            for backend in backends
+        ]
+
+        # the device index of each queued experiment, in plan order
+        self._plan = deque()
+        self._next_device = 0
+
+        self._logger = logging.getLogger()
+
+    def add_to_queue(self, waveform_array, metadata):
+        device = self._next_device
+        self.handlers[device].add_to_queue(waveform_array, metadata)
+        self._plan.append(device)
+        self._next_device = (device + 1) % len(self.handlers)
+
+    def queue_length(self):
+        return len(self._plan)
+
+    def is_queue_empty(self):
+        return True if len(self._plan) == 0 else False
+
+    def clear_queue(self):
+        for handler in self.handlers:
+            handler.clear_queue()
+        self._plan = deque()
+        self._next_device = 0
+
+    def abort(self):
+        """Aborts the acquisitions in progress on every device"""
+        for handler in self.handlers:
+            handler.abort()
+
+    def single_measurement(self):
+        device = self._plan.popleft()
+        return self.handlers[device].single_measurement()
+
+    def _run_device(self, device, indices, results, before_measurement,
+                    stopped, burst):
+        """
+        Performs the experiments of a single device, putting (index, data)
+        on results for each one, or (None, error) if one fails
+        """
+        handler = self.handlers[device]
+        try:
+            if burst:
+                def progress(local_index, total, data):
+                    results.put((indices[local_index - 1], data))
+
+                def before():
+                    if stopped.is_set():
+                        return False
+                    return before_measurement is None or before_measurement()
+
+                handler.burst_series_measurement(
+                    progress_callback=progress, before_measurement=before
+                )
+                return
+
+            for index in indices:
+                if stopped.is_set():
+                    break
+                if before_measurement is not None and not before_measurement():
+                    break
+                results.put((index, handler.single_measurement()))
+        except MeasurementAborted:
+            pass
+        except Exception as e:
+            results.put((None, e))
+        finally:
+            results.put(device)
+
+    def series_measurement(self, progress_callback=None,
+                           before_measurement=None, burst=False):
+        """
+        Performs every queued measurement, each device running its own
+        experiments in parallel, and returns the datasets in plan order.
+
+        progress_callback(index, total, data) is called on the calling
+        thread, in plan order, as soon as a dataset and all the ones
+        queued before it are complete. before_measurement() is called by
+        each device before each of its measurements, and returning False
+        from it stops that device. abort stops all of them.
+
+        With burst set each device acquires its experiments as
+        MeasurementHandler.burst_series_measurement does.
+        """
+        total = len(self._plan)
+        shards = [[] for handler in self.handlers]
+        for index, device in enumerate(self._plan, 1):
+            shards[device].append(index)
+        self._plan = deque()
+
+        results = Queue.Queue()
+        stopped = threading.Event()
+        workers = []
+        for device, indices in enumerate(shards):
+            if not indices:
+                continue
+            worker = threading.Thread(
+                target=self._run_device,
+                args=(device, indices, results, before_measurement, stopped,
+                      burst)
+            )
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        completed = {}
+        dataset_list = []
+        errors = []
+        running = len(workers)
+
+        while running:
+            item = results.get()
+            if not isinstance(item, tuple):
+                # a device has finished its share
+                running -= 1
+                continue
+
+            index, data = item
+            if index is None:
+                errors.append(data)
+                # stop the other devices after their current measurement
+                stopped.set()
+                continue
+
+            completed[index] = data
+            # hand on every dataset whose predecessors are all complete
+            while len(dataset_list) + 1 in completed:
+                index = len(dataset_list) + 1
+                data = completed.pop(index)
+                dataset_list.append(data)
+                self._logger.info('Measurement #{0} complete'.format(index))
+                if progress_callback is not None:
+                    progress_callback(index, total, data)
+
+        for worker in workers:
+            worker.join()
+
+        if errors:
+            raise errors[0]
+
+        # a cancelled series can leave gaps, keep what was measured in order
+        for index in sorted(completed):
+            data = completed[index]
+            dataset_list.append(data)
+            self._logger.info('Measurement #{0} complete'.format(index))
+            if progress_callback is not None:
+                progress_callback(index, total, data)
+
+        self._logger.info(
+            'Total: {0} measurements performed'.format(len(dataset_list))
+        )
+        return dataset_list
+
+    def pipelined_series_measurement(self, progress_callback=None,
+                                     before_measurement=None, max_pending=2):
+        """
+        The devices already acquire while the calling thread processes the
+        datasets, so this is the same as series_measurement
+        """
+        return self.series_measurement(
+            progress_callback=progress_callback,
+            before_measurement=before_measurement
+        )
+
+    def burst_series_measurement(self, progress_callback=None,
+                                 before_measurement=None):
+        return self.series_measurement(
+            progress_callback=progress_callback,
+            before_measurement=before_measurement,
+            burst=True
+        )
+
+    def pc_calibration_measurement(self, calibration_settings):
+        return self.handlers[0].pc_calibration_measurement(
+            calibration_settings
+        )
+
+    def as_list(self):
+        experiments = [iter(handler._queue) for handler in self.handlers]
+        experiment_list = []
+        for device in self._plan:
+            experiment_list.append(next(experiments[device])[1].as_dict())
+        return experiment_list
@@ -0,0 +1,222 @@
+import ctypes
+
+from hardware.bindings import (
+    DAQmxLibrary,
+    Task,
+    DAQmx_Val_Cfg_Default,
+    DAQmx_Val_ContSamps,
+    DAQmx_Val_Diff,
+    DAQmx_Val_FiniteSamps,
+    DAQmx_Val_GroupByChannel,
+    DAQmx_Val_GroupByScanNumber,
+    DAQmx_Val_NRSE,
+    DAQmx_Val_PseudoDiff,
+    DAQmx_Val_Rising,
+    DAQmx_Val_RSE,
+    DAQmx_Val_Task_Commit,
+    DAQmx_Val_Volts,
+)
+
+# the DAQmx value of each of Constants.TERMINAL_CONFIGS
+TERMINAL_CONFIG_VALUES = {
+    'Default': DAQmx_Val_Cfg_Default,
+    'Differential': DAQmx_Val_Diff,
+    'RSE': DAQmx_Val_RSE,
+    'NRSE': DAQmx_Val_NRSE,
+    'Pseudodifferential': DAQmx_Val_PseudoDiff,
+}
+
+try:
+    nidaq = ctypes.windll.nicaiu  # load the DLL
+except AttributeError as e:
+    nidaq = None
+    print "DLL not found {0}".format(e)
+except Exception as e:
+    nidaq = None
+    print(e)
+
+
+class DAQBackend(object):
+    """
+    Interface between WaveformThread and a data acquisition device.
+
+    The methods mirror the NI-DAQmx calls the application uses, but take
+    and return plain python values and numpy arrays. Tasks are opaque
+    objects owned by the backend. Failures are raised as RuntimeError.
+    """
+
+    def __init__(self, device_id):
+        # name of the device, used as the prefix of physical channels
+        self.device_id = device_id
+
+    def create_task(self):
+        """Returns a new, empty task"""
+        raise NotImplementedError
+
+    def create_ao_voltage_chan(self, task, physical_channel, min_val,
+                               max_val):
+        raise NotImplementedError
+
+    def create_ai_voltage_chan(self, task, physical_channel, terminal_config,
+                               min_val, max_val):
+        raise NotImplementedError
+
+    def cfg_samp_clk_timing(self, task, source, rate, active_edge,
+                            sample_mode, samples_per_channel):
+        raise NotImplementedError
+
+    def get_samp_clk_rate(self, task):
+        """
+        Returns the rate the sample clock of the task actually runs at, the
+        requested rate coerced to one the device can generate
+        """
+        raise NotImplementedError
+
+    def write_analog_f64(self, task, data, data_layout):
+        """Writes data to the output buffer of the task"""
+        raise NotImplementedError
+
+    def read_analog_f64(self, task, num_samples, timeout, data_layout,
+                        buffer):
+        """
+        Reads num_samples per channel (-1 for all available) into buffer
+        and returns the number of samples per channel actually read
+        """
+        raise NotImplementedError
+
+    def write_binary_i16(self, task, data, data_layout):
+        """Writes int16 DAC codes to the output buffer of the task"""
+        raise NotImplementedError
+
+    def read_binary_i16(self, task, num_samples, timeout, data_layout,
+                        buffer):
+        """
+        As read_analog_f64, but reads the unscaled int16 ADC codes
+        """
+        raise NotImplementedError
+
+    def get_ai_scaling(self, task, channel):
+        """
+        Returns (scale, offset) for the input channel of the task, such
+        that volts = scale * code + offset
+        """
+        raise NotImplementedError
+
+    def get_ao_scaling(self, task, channel):
+        """
+        Returns (scale, offset) for the output channel of the task, such
+        that code = scale * volts + offset
+        """
+        raise NotImplementedError
+
+    def task_control(self, task, action):
+        raise NotImplementedError
+
+    def start_task(self, task):
+        raise NotImplementedError
+
+    def stop_task(self, task):
+        raise NotImplementedError
+
+    def clear_task(self, task):
+        raise NotImplementedError
+
+
+class NIDAQmxBackend(DAQBackend):
+    """
+    Backend for National Instruments cards, calling the nicaiu DLL through
+    the typed bindings. Tasks are bindings.Task objects, and driver errors
+    are raised as DAQmxError.
+    """
+
+    def __init__(self, device_id="Dev3"):
+        super(NIDAQmxBackend, self).__init__(device_id)
+        self._library = None
+
+    @property
+    def library(self):
+        # bound on first use, so a backend can be made without the driver
+        if self._library is None:
+            if nidaq is None:
+                raise RuntimeError('The NI-DAQmx driver is not installed')
+            self._library = DAQmxLibrary(nidaq)
+        return self._library
+
+    def create_task(self):
+        # creates a task, which must be later cleared
+        return Task(self.library)
+
+    def create_ao_voltage_chan(self, task, physical_channel, min_val,
+                               max_val):
+        # Creates channel(s) to generate voltage and adds the channel(s) to
+        # the task
+        task.create_ao_voltage_chan(physical_channel, min_val, max_val)
+
+    def create_ai_voltage_chan(self, task, physical_channel, terminal_config,
+                               min_val, max_val):
+        # creates an analog input voltage channel
+        task.create_ai_voltage_chan(
+            physical_channel, terminal_config, min_val, max_val
+        )
+
+    def cfg_samp_clk_timing(self, task, source, rate, active_edge,
+                            sample_mode, samples_per_channel):
+        # Your device uses a sample clock to control the rate at which samples
+        # are acquired and generated. This sample clock sets the time interval
+        #  between samples. Each tick of this clock initiates the acquisition
+        # or generation of one sample per channel.
+        # This function sets the source of the sample clock, the rate of the
+        # sample clock, and the number of samples to acquire or generate
+        task.cfg_samp_clk_timing(
+            source, rate, active_edge, sample_mode, samples_per_channel
+        )
+
+    def get_samp_clk_rate(self, task):
+        return task.samp_clk_rate()
+
+    def write_analog_f64(self, task, data, data_layout):
+        # The NI-DAQmx Write Function moves samples from the
+        # Application Development Environment (ADE) Memory to the PC Buffer
+        # in RAM.
+        task.write_analog_f64(data, data_layout)
+
+    def read_analog_f64(self, task, num_samples, timeout, data_layout,
+                        buffer):
+        # reads samples from the specified acquisition task.
+        return task.read_analog_f64(num_samples, timeout, data_layout, buffer)
+
+    def write_binary_i16(self, task, data, data_layout):
+        task.write_binary_i16(data, data_layout)
+
+    def read_binary_i16(self, task, num_samples, timeout, data_layout,
+                        buffer):
+        return task.read_binary_i16(num_samples, timeout, data_layout, buffer)
+
+    def get_ai_scaling(self, task, channel):
+        # the higher order terms of the calibration are negligible, within
+        # a code over the whole range
+        coefficients = task.ai_scaling_coefficients(channel)
+        return coefficients[1], coefficients[0]
+
+    def get_ao_scaling(self, task, channel):
+        coefficients = task.ao_scaling_coefficients(channel)
+        return coefficients[1], coefficients[0]
+
+    def task_control(self, task, action):
+        task.control(action)
+
+    def start_task(self, task):
+        # Transitions the task from the committed state to the running state,
+        # which begins measurement or generation.
+        task.start()
+
+    def stop_task(self, task):
+        # Stops the task and returns it to the state it was in before you
+        # called DAQmxStartTask
+        task.stop()
+
+    def clear_task(self, task):
+        # clears the specified task. If the task is currently running, the
+        # function first stops thetask and then releases all of its
+        # resources.
+        task.close()
@@ -0,0 +1,311 @@
+"""
+Typed ctypes bindings for the parts of the NI-DAQmx C API the application
+uses.
+
+The prototypes follow NI-DAQ\\DAQmx ANSI C Dev\\include\\NIDAQmx.h. They are
+declared once, when a library is bound, so ctypes converts the arguments
+itself and rejects ones of the wrong type, and every status code is checked
+as the function returns. Negative codes (errors) are raised as
+DAQmxError; positive ones (warnings) are logged.
+"""
+import ctypes
+import logging
+import threading
+
+from util.Exceptions import DAQmxError
+
+
+##############################
+# the typedefs, sized as in NIDAQmx.h whatever the platform
+int16 = ctypes.c_int16
+int32 = ctypes.c_int32
+uInt32 = ctypes.c_uint32
+uInt64 = ctypes.c_uint64
+float64 = ctypes.c_double
+bool32 = uInt32
+
+# a pointer, so 64 bits wide on 64 bit python
+TaskHandle = ctypes.c_void_p
+
+# Constants associated with NI-DAQmx
+DAQmx_Val_Cfg_Default = -1
+DAQmx_Val_Diff = 10106
+DAQmx_Val_RSE = 10083
+DAQmx_Val_NRSE = 10078
+DAQmx_Val_PseudoDiff = 12529
+DAQmx_Val_Volts = 10348
+DAQmx_Val_Rising = 10280
+DAQmx_Val_FiniteSamps = 10178
+DAQmx_Val_ContSamps = 10123
+DAQmx_Val_Task_Commit = 3
+
+# all the samples of one channel, then all of the next
+DAQmx_Val_GroupByChannel = 0
+# one sample from each channel at a time (interleaved)
+DAQmx_Val_GroupByScanNumber = 1
+
+# the number of calibration coefficients read for a channel
+NUM_SCALING_COEFFICIENTS = 4
+
+_write_args = [
+    TaskHandle,
+    int32,  # number of samples per channel
+    bool32,  # autostart
+    float64,  # timeout
+    bool32,  # data layout
+    ctypes.c_void_p,  # write array
+    ctypes.POINTER(int32),  # samples per channel written
+    ctypes.POINTER(bool32),  # reserved
+]
+
+_read_args = [
+    TaskHandle,
+    int32,  # number of samples per channel, -1 for all available
+    float64,  # timeout
+    bool32,  # data layout
+    ctypes.c_void_p,  # read array
+    uInt32,  # size of the read array in samples
+    ctypes.POINTER(int32),  # samples per channel read
+    ctypes.POINTER(bool32),  # reserved
+]
+
+_scaling_args = [
+    TaskHandle,
+    ctypes.c_char_p,  # channel
+    ctypes.POINTER(float64),  # coefficients
+    uInt32,  # size of the coefficient array
+]
+
+# name: argument types, all the functions return an int32 status code
+PROTOTYPES = {
+    'DAQmxCreateTask': [ctypes.c_char_p, ctypes.POINTER(TaskHandle)],
+    'DAQmxStartTask': [TaskHandle],
+    'DAQmxStopTask': [TaskHandle],
+    'DAQmxClearTask': [TaskHandle],
+    'DAQmxTaskControl': [TaskHandle, int32],
+    'DAQmxCreateAOVoltageChan': [
+        TaskHandle,
+        ctypes.c_char_p,  # physical channel
+        ctypes.c_char_p,  # name to assign
+        float64,  # minimum value
+        float64,  # maximum value
+        int32,  # units
+        ctypes.c_char_p,  # custom scale name
+    ],
+    'DAQmxCreateAIVoltageChan': [
+        TaskHandle,
+        ctypes.c_char_p,  # physical channel
+        ctypes.c_char_p,  # name to assign
+        int32,  # terminal configuration
+        float64,  # minimum value
+        float64,  # maximum value
+        int32,  # units
+        ctypes.c_char_p,  # custom scale name
+    ],
+    'DAQmxCfgSampClkTiming': [
+        TaskHandle,
+        ctypes.c_char_p,  # source
+        float64,  # rate
+        int32,  # active edge
+        int32,  # sample mode
+        uInt64,  # samples per channel
+    ],
+    'DAQmxWriteAnalogF64': _write_args,
+    'DAQmxWriteBinaryI16': _write_args,
+    'DAQmxReadAnalogF64': _read_args,
+    'DAQmxReadBinaryI16': _read_args,
+    'DAQmxGetSampClkRate': [TaskHandle, ctypes.POINTER(float64)],
+    'DAQmxGetAIDevScalingCoeff': _scaling_args,
+    'DAQmxGetAODevScalingCoeff': _scaling_args,
+}
+
+
+class DAQmxLibrary(object):
+    """
+    The NI-DAQmx functions of library (the loaded nicaiu DLL), with their
+    prototypes declared and their status codes checked.
+
+    A library written in python, as used by the tests, is called through a
+    wrapper which checks its status codes in the same way.
+    """
+
+    ERROR_BUFFER_SIZE = 2048
+
+    def __init__(self, library):
+        self._library = library
+
+        # the buffer messages are written into, shared by all the calls
+        self._error_buffer = ctypes.create_string_buffer(
+            self.ERROR_BUFFER_SIZE
+        )
+        self._error_lock = threading.Lock()
+
+        self._get_error_string = self._declare(
+            'DAQmxGetErrorString', [int32, ctypes.c_char_p, uInt32],
+            check=False
+        )
+
+        for name, argtypes in PROTOTYPES.items():
+            function = self._declare(name, argtypes)
+            if function is not None:
+                setattr(self, name, function)
+
+    def _declare(self, name, argtypes, check=True):
+        function = getattr(self._library, name, None)
+        if function is None:
+            return None
+
+        def errcheck(status, function, arguments):
+            if status < 0:
+                self.raise_error(status, name)
+            elif status > 0:
+                logging.getLogger().warning(self.message(status, name))
+            return status
+
+        if isinstance(function, ctypes._CFuncPtr):
+            function.argtypes = argtypes
+            function.restype = int32
+            if check:
+                function.errcheck = errcheck
+            return function
+
+        if not check:
+            return function
+
+        def checked(*args):
+            return errcheck(function(*args), function, args)
+        return checked
+
+    def error_string(self, status):
+        """The driver's description of status"""
+        if self._get_error_string is None:
+            return ''
+        with self._error_lock:
+            self._get_error_string(
+                status, self._error_buffer, self.ERROR_BUFFER_SIZE
+            )
+            return self._error_buffer.value
+
+    def message(self, status, function_name):
+        kind = 'error' if status < 0 else 'warning'
+        return '{0} generated {1} {2}: {3}'.format(
+            function_name, kind, status, repr(self.error_string(status))
+        )
+
+    def raise_error(self, status, function_name):
+        raise DAQmxError(status, self.message(status, function_name))
+
+
+class Task(object):
+    """
+    An NI-DAQmx task. It is cleared by close, or on leaving a with block:
+
+        with Task(library) as task:
+            task.create_ai_voltage_chan(...)
+    """
+
+    def __init__(self, library, name=""):
+        self.library = library
+        self.handle = TaskHandle(0)
+        library.DAQmxCreateTask(name, ctypes.byref(self.handle))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Clears the task, if it has not been cleared already"""
+        if self.handle is not None:
+            handle, self.handle = self.handle, None
+            self.library.DAQmxClearTask(handle)
+
+    def create_ao_voltage_chan(self, physical_channel, min_val, max_val):
+        self.library.DAQmxCreateAOVoltageChan(
+            self.handle, physical_channel, "", min_val, max_val,
+            DAQmx_Val_Volts, None
+        )
+
+    def create_ai_voltage_chan(self, physical_channel, terminal_config,
+                               min_val, max_val):
+        self.library.DAQmxCreateAIVoltageChan(
+            self.handle, physical_channel, "", terminal_config, min_val,
+            max_val, DAQmx_Val_Volts, None
+        )
+
+    def cfg_samp_clk_timing(self, source, rate, active_edge, sample_mode,
+                            samples_per_channel):
+        self.library.DAQmxCfgSampClkTiming(
+            self.handle, source, rate, active_edge, sample_mode,
+            samples_per_channel
+        )
+
+    def samp_clk_rate(self):
+        """The rate of the sample clock, as coerced by the driver"""
+        rate = float64()
+        self.library.DAQmxGetSampClkRate(self.handle, ctypes.byref(rate))
+        return rate.value
+
+    def _write(self, function, data, data_layout):
+        # the samples are written without starting the task, so a start is
+        # still required
+        function(
+            self.handle, data.shape[0], 0, -1, data_layout,
+            data.ctypes.data, None, None
+        )
+
+    def _read(self, function, num_samples, timeout, data_layout, buffer):
+        read = int32()
+        function(
+            self.handle, num_samples, timeout, data_layout,
+            buffer.ctypes.data, buffer.shape[0], ctypes.byref(read), None
+        )
+        return read.value
+
+    def write_analog_f64(self, data, data_layout):
+        self._write(self.library.DAQmxWriteAnalogF64, data, data_layout)
+
+    def write_binary_i16(self, data, data_layout):
+        self._write(self.library.DAQmxWriteBinaryI16, data, data_layout)
+
+    def read_analog_f64(self, num_samples, timeout, data_layout, buffer):
+        """Returns the number of samples per channel read"""
+        return self._read(
+            self.library.DAQmxReadAnalogF64, num_samples, timeout,
+            data_layout, buffer
+        )
+
+    def read_binary_i16(self, num_samples, timeout, data_layout, buffer):
+        """Returns the number of samples per channel read"""
+        return self._read(
+            self.library.DAQmxReadBinaryI16, num_samples, timeout,
+            data_layout, buffer
+        )
+
+    def _scaling_coefficients(self, function, channel):
+        # the calibration polynomial of the channel, lowest order first
+        coefficients = (float64 * NUM_SCALING_COEFFICIENTS)()
+        function(
+            self.handle, channel, coefficients, NUM_SCALING_COEFFICIENTS
+        )
+        return list(coefficients)
+
+    def ai_scaling_coefficients(self, channel):
+        return self._scaling_coefficients(
+            self.library.DAQmxGetAIDevScalingCoeff, channel
+        )
+
+    def ao_scaling_coefficients(self, channel):
+        return self._scaling_coefficients(
+            self.library.DAQmxGetAODevScalingCoeff, channel
+        )
+
+    def control(self, action):
+        self.library.DAQmxTaskControl(self.handle, action)
+
+    def start(self):
+        self.library.DAQmxStartTask(self.handle)
+
+    def stop(self):
+        self.library.DAQmxStopTask(self.handle)
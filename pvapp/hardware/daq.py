@@ -1,41 +1,19 @@
-import ctypes
 import threading
 import numpy as np
 
 from util.Constants import (
     MAX_OUTPUT_SAMPLE_RATE,
     MAX_INPUT_SAMPLE_RATE,
-    CHANNELS
+    CHANNELS,
+    DECIMATION_METHODS
 )
-
-try:
-    nidaq = ctypes.windll.nicaiu  # load the DLL
-except AttributeError as e:
-    print "DLL not found {0}".format(e)
-except e:
-    print(e)
-
-##############################
-# Setup some typedefs and constants
-# to correspond with values in NI-DAQ driver files located
-# NI-DAQ\DAQmx ANSI C Dev\include\NIDAQmx.h
-# the typedefs
-int32 = ctypes.c_long
-uInt32 = ctypes.c_ulong
-uInt64 = ctypes.c_ulonglong
-float64 = ctypes.c_double
-
-# alias for reasons (???)
-TaskHandle = uInt32
-
-# converted to ctype floats for use with the DLL
-# DAQmx_OutPutSampleRate = float64(MAX_OUTPUT_SAMPLE_RATE)
-DAQmx_InputSampleRate = float64(MAX_INPUT_SAMPLE_RATE)
-
-
-# Constants associated with NI-DAQmx
-DAQmx_Val_Cfg_Default = int32(-1)
-DAQmax_Channels_Number = len(CHANNELS)
+from hardware import backend as daqmx
+from hardware.backend import NIDAQmxBackend, TERMINAL_CONFIG_VALUES
+from models.InputChannel import InputChannel
+from util.BufferPool import shared_pool
+from util.StreamingBinner import StreamingBinner
+from util.StreamingDecimator import StreamingDecimator
+from util.TimeAxis import TimeAxis
 
 
 class WaveformThread(threading.Thread):
@@ -46,24 +24,79 @@ class WaveformThread(threading.Thread):
     which to play it.
     This will play an arbitrary-length waveform file.
 
+    In continuous mode the waveform is regenerated until the thread is
+    stopped, and the input is read in fixed size chunks into a preallocated
+    ring buffer. Each chunk is handed to the registered consumers as a
+    (samples, channels) view as soon as it has been read, so only
+    ring_size chunks are ever held in memory.
+
+    In finite mode the samples are read chunk_size samples per channel at a
+    time, straight into the read buffer. Each chunk is passed to the
+    consumers and the progress callbacks as it arrives, and clearing
+    running (see abort) ends the acquisition after the current chunk.
+
+    With repeats > 1 the waveform is played that many times back to back in
+    a single finite task, and the read buffer holds all the shots, sample
+    aligned, one after the other.
+
+    data_layout picks how the driver arranges the channels in the read
+    buffer. Either way channel_view exposes it as a (samples, channels)
+    array without copying; grouping by scan number (interleaved) makes that
+    view C contiguous.
+
+    The inputs read are given by input_channels, a list of InputChannel,
+    each with its own terminal configuration and voltage range. Without it
+    every channel of CHANNELS is read, from the input of the same number,
+    over input_voltage_range.
+
+    With bin_size > 1 a finite acquisition is averaged in bins of bin_size
+    samples as each chunk is read (see StreamingBinner), and channel_view
+    gives the binned shots. The read buffer then only holds a chunk,
+    unless keep_raw is set, in which case every sample is still kept in it
+    as well, and channel_view(thread.Read_Data) gives them. With
+    decimation 'fir' the samples are low pass filtered before being
+    decimated by bin_size instead (see StreamingDecimator), so noise above
+    the new Nyquist frequency is not aliased into the bins.
+
+    All calls to the hardware go through backend, by default the NI-DAQmx
+    driver for the card named Dev3.
+
+    With raw set the waveform is written as int16 DAC codes and the inputs
+    are read as int16 ADC codes, a quarter of the size of volts. The read
+    buffer then holds codes, and to_volts converts them with the per
+    channel scales and offsets of the card, once they are needed.
+
+    The write and read arrays come from buffer_pool, by default one shared
+    by all threads. The write array goes back as soon as the waveform has
+    been written; the read array is kept, and reused by every shot, until
+    release_buffers is called once its data is no longer needed.
     """
 
-    DAQmx_Val_Volts = 10348
-    DAQmx_Val_Rising = 10280
-    DAQmx_Val_FiniteSamps = 10178
-    DAQmx_Val_ContSamps = 10123
-    DAQmx_Val_GroupByChannel = 0
+    DAQmx_Val_Rising = daqmx.DAQmx_Val_Rising
+    DAQmx_Val_FiniteSamps = daqmx.DAQmx_Val_FiniteSamps
+    DAQmx_Val_ContSamps = daqmx.DAQmx_Val_ContSamps
+    DAQmx_Val_Task_Commit = daqmx.DAQmx_Val_Task_Commit
 
-    DAQmx_Val_Diff = int32(-1)
-
-    # this places the points one at a time from each channel, I think
-    DAQmx_Val_GroupByScanNumber = 0
+    DAQmx_Val_GroupByChannel = daqmx.DAQmx_Val_GroupByChannel
+    DAQmx_Val_GroupByScanNumber = daqmx.DAQmx_Val_GroupByScanNumber
 
     def __init__(self, waveform, Channel, Time,
                  input_voltage_range,
                  output_voltage_range,
                  output_sample_rate,
-                 input_sample_rate):
+                 input_sample_rate,
+                 continuous=False,
+                 chunk_size=10000,
+                 ring_size=8,
+                 repeats=1,
+                 data_layout=DAQmx_Val_GroupByScanNumber,
+                 backend=None,
+                 buffer_pool=None,
+                 raw=False,
+                 input_channels=None,
+                 bin_size=1,
+                 keep_raw=False,
+                 decimation='box'):
 
         print("Channel: ", Channel)
         assert isinstance(waveform, np.ndarray)
@@ -72,15 +105,30 @@ class WaveformThread(threading.Thread):
         assert isinstance(Time, np.float64)
         assert output_sample_rate <= MAX_OUTPUT_SAMPLE_RATE
         assert input_sample_rate <= MAX_INPUT_SAMPLE_RATE
-
-        self.DEVICE_ID = "Dev3/"
+        assert chunk_size > 0
+        assert ring_size > 1
+        assert repeats > 0
+        assert bin_size > 0
+        assert bin_size == 1 or not continuous
+        assert decimation in DECIMATION_METHODS
+        assert data_layout in [self.DAQmx_Val_GroupByChannel,
+                               self.DAQmx_Val_GroupByScanNumber]
+
+        if backend is None:
+            backend = NIDAQmxBackend()
+        self.backend = backend
+        self.DEVICE_ID = backend.device_id + "/"
+
+        if buffer_pool is None:
+            buffer_pool = shared_pool
+        self.buffer_pool = buffer_pool
 
         self.running = True
 
         self.periodLength = int((Time * output_sample_rate).item())
 
-        self.sampleRate = float64(output_sample_rate)  # output sample rate
-        self.input_sample_rate = float64(input_sample_rate)
+        self.sampleRate = output_sample_rate  # output sample rate
+        self.input_sample_rate = input_sample_rate
 
         #
         self.Time = Time
@@ -90,30 +138,202 @@ class WaveformThread(threading.Thread):
 
         # this controls the input voltage range. (+-10,+-5, +-2,+-1)
         self.InputVoltageRange = input_voltage_range
-        self.OutputVoltageRange = output_voltage_range
-
-        # These are IDs for the the read and write tasks
-        self.taskHandle_Write = TaskHandle(0)
-        self.taskHandle_Read = TaskHandle(1)
 
-        self.Write_data = np.zeros((self.periodLength,), dtype=np.float64)
+        # the analog inputs, read in this order
+        if input_channels is None:
+            input_channels = [
+                InputChannel(name, 'ai{0}'.format(i),
+                             voltage_range=input_voltage_range)
+                for i, name in enumerate(CHANNELS)
+            ]
+        self.input_channels = list(input_channels)
+        self.num_channels = len(self.input_channels)
+        self.channel_names = [
+            input_channel.name for input_channel in self.input_channels
+        ]
+        self.OutputVoltageRange = output_voltage_range
 
-        # BUG: this doesn't copy the waveform exactly
-        # several trailing numbers are truncated.
+        # continuous acquisition settings, chunk_size is per channel
+        self.continuous = continuous
+        self.chunk_size = int(chunk_size)
+        self.ring_size = int(ring_size)
+        self.consumers = []
+        self.progress_callbacks = []
+        self.chunks_read = 0
+
+        # set when a finite acquisition was stopped before it completed
+        self.aborted = False
+
+        # set once the tasks have been configured, and then committed, so
+        # they can be started without being recreated
+        self.configured = False
+        self.committed = False
+
+        # number of back to back periods played within the one task
+        self.repeats = int(repeats)
+        # samples written for each period: a single period is followed by
+        # a sample of its own turning the LED off, back to back periods
+        # have to stay periodLength apart
+        self.write_length = self.periodLength
+        if self.repeats == 1 and not continuous:
+            self.write_length += 1
+
+        # arrangement of the channels in the read buffer
+        self.data_layout = data_layout
+
+        # samples averaged into each one kept, and whether every sample is
+        # kept as well
+        self.bin_size = int(bin_size)
+        self.keep_raw = keep_raw or self.bin_size == 1
+        self.decimation = decimation
+        self.binner = None
+
+        # transfer int16 codes rather than volts
+        self.raw = raw
+        self.sample_dtype = np.int16 if raw else np.float64
+        # volts = scales * code + offsets, per input channel
+        self.scales = None
+        self.offsets = None
+
+        # The read and write tasks, created by the backend in setup
+        self.taskHandle_Write = None
+        self.taskHandle_Read = None
+
+        # samples per channel read by the last read call
+        self.samples_read = 0
+
+        # the input sample rate, as coerced by the driver in Setup_Read
+        self.sample_clock_rate = None
+
+        # copied into a buffer from the pool when it is written
         assert self.periodLength
         print("Len periodLength: ", self.periodLength)
         print("len waveform.shape: ", waveform.shape)
-        for i in range(self.periodLength - 1):
-            self.Write_data[i] = waveform[i]
-        # self.Write_data = np.copy(waveform)
+        self.waveform = waveform
+        self.Write_data = None
 
-        # Note: this ensures that the DAQ the LED is not on after the last
-        # part of the waveform has been played.
-        self.Write_data[int(self.periodLength) - 1] = 0
+        # The read buffer, or the ring buffer in continuous mode
+        self.Read_Data = None
+        self.ring_buffer = None
 
     def setup(self):
+        self.running = True
+        if not self.configured:
+            self.configure()
+        self.load()
+
+    def configure(self):
+        """
+        Creates the tasks, configures their channels and timing and prepares
+        the buffers. This reserves nothing on the card, so it can be done
+        while the tasks of another thread are running.
+        """
         self.Setup_Write()
         self.Setup_Read(self.Time, self.input_sample_rate)
+        self.configured = True
+
+    def load(self):
+        """
+        Writes the waveform to the output buffer, which reserves the output
+        channel
+        """
+        if self.raw:
+            print('DAQmxWriteBinaryI16')
+            self._write_codes()
+        else:
+            print('DAQmxWriteAnalogF64')
+            self.backend.write_analog_f64(
+                self.taskHandle_Write,
+                self.Write_data,
+                self.DAQmx_Val_GroupByChannel
+            )
+        # the driver has its own copy of the samples now
+        self.buffer_pool.release(self.Write_data)
+        self.Write_data = None
+
+    def commit(self):
+        """
+        Reserves the hardware and programs the tasks, so that restarting
+        them only costs a DAQmxStartTask call
+        """
+        self.backend.task_control(
+            self.taskHandle_Write, self.DAQmx_Val_Task_Commit
+        )
+        self.backend.task_control(
+            self.taskHandle_Read, self.DAQmx_Val_Task_Commit
+        )
+        self.committed = True
+
+    def copy_period(self, out):
+        """
+        Copies one period of the waveform, as it is played, into out, an
+        array of periodLength samples
+        """
+        length = min(self.periodLength, self.waveform.shape[0])
+        out[:length] = self.waveform[:length]
+        # a short waveform is padded with the LED off
+        out[length:] = 0
+
+    def _fill_write_data(self):
+        """
+        Copies one period of the waveform into a write buffer from the pool
+        """
+        self.Write_data = self.buffer_pool.acquire(self.write_length)
+        self.copy_period(self.Write_data[:self.periodLength])
+        # Note: this ensures that the DAQ the LED is not on after the last
+        # part of the waveform has been played. Periods played back to back
+        # have no room for an extra sample, so theirs replaces the last
+        # sample of the period, on purpose.
+        if self.write_length > self.periodLength:
+            self.Write_data[self.periodLength:] = 0
+        else:
+            self.Write_data[-1] = 0
+
+    def _write_codes(self):
+        """
+        Converts the write buffer to DAC codes and writes them
+        """
+        scale, offset = self.backend.get_ao_scaling(
+            self.taskHandle_Write, self.DEVICE_ID + self.Channel
+        )
+        codes = self.buffer_pool.acquire(self.write_length, np.int16)
+        volts = self.Write_data
+        volts *= scale
+        volts += offset
+        np.rint(volts, out=volts)
+        np.clip(volts, -2 ** 15, 2 ** 15 - 1, out=volts)
+        codes[:] = volts
+
+        self.backend.write_binary_i16(
+            self.taskHandle_Write,
+            codes,
+            self.DAQmx_Val_GroupByChannel
+        )
+        self.buffer_pool.release(codes)
+
+    def _pooled_buffer(self, current, length):
+        """
+        Returns current if it already holds length samples, otherwise gives
+        it back to the pool and takes one of the right length
+        """
+        if current is not None:
+            if (current.shape[0] == length and
+                    current.dtype == self.sample_dtype):
+                return current
+            self.buffer_pool.release(current)
+        return self.buffer_pool.acquire(length, self.sample_dtype)
+
+    def release_buffers(self):
+        """
+        Gives the read buffers back to the pool. Anything returned by run or
+        channel_view is invalid afterwards.
+        """
+        if self.Read_Data is not None:
+            self.buffer_pool.release(self.Read_Data)
+            self.Read_Data = None
+        if self.ring_buffer is not None:
+            self.buffer_pool.release(self.ring_buffer.reshape(-1))
+            self.ring_buffer = None
 
     def Setup_Write(self):
         print('Waveform: Setup_Write')
@@ -124,82 +344,71 @@ class WaveformThread(threading.Thread):
         print('DAQmxCreateTask')
 
         # creates a task, which must be later cleared
-        # returns a taskHandle object
-        self.CHK(nidaq.DAQmxCreateTask(
-            "",
-            ctypes.byref(self.taskHandle_Write)
-        ))
+        self.taskHandle_Write = self.backend.create_task()
 
         print('DAQmxCreateAOVoltageChan')
-        # Creates channel(s) to generate voltage and adds the channel(s) to
-        # the task you specify with taskHandle.
-        self.CHK(nidaq.DAQmxCreateAOVoltageChan(
+        self.backend.create_ao_voltage_chan(
             self.taskHandle_Write,
             self.DEVICE_ID + self.Channel,
-            "",
-            float64(-self.OutputVoltageRange),
-            float64(self.OutputVoltageRange),
-            self.DAQmx_Val_Volts,
-            None
-        ))
+            -self.OutputVoltageRange,
+            self.OutputVoltageRange
+        )
         print("OutputVoltageRange: ", self.OutputVoltageRange)
+        self._fill_write_data()
         print(np.max(self.Write_data))
 
         print("Sample rate :", self.sampleRate)
         print('DAQmxCfgSampClkTiming')
-        # Your device uses a sample clock to control the rate at which samples
-        # are acquired and generated. This sample clock sets the time interval
-        #  between samples. Each tick of this clock initiates the acquisition
-        # or generation of one sample per channel.
-        # This function sets the source of the sample clock, the rate of the
-        # sample clock, and the number of samples to acquire or generate
-        self.CHK(nidaq.DAQmxCfgSampClkTiming(
+        # the output is clocked from the input sample clock, so the two
+        # stay sample aligned
+        self.backend.cfg_samp_clk_timing(
             self.taskHandle_Write,
             "/" + self.DEVICE_ID + "ai/SampleClock",
             self.sampleRate,   # samples per channel
             self.DAQmx_Val_Rising,   # active edge
-            self.DAQmx_Val_FiniteSamps,
-            uInt64(self.periodLength)
-        ))
-
-        print('DAQmxWriteAnalogF64')
-        # The NI-DAQmx Write Function moves samples from the
-        # Application Development Environment (ADE) Memory to the PC Buffer
-        # in RAM.
-        self.CHK(nidaq.DAQmxWriteAnalogF64(
-            self.taskHandle_Write,  # TaskHandel
-            int32(self.periodLength),  # num of samples per channel
-            0,  # autostart, if not done, a NI-DAQmx Start function is required
-            float64(-1),  # Timeout
-            self.DAQmx_Val_GroupByChannel,  # Data layout
-            self.Write_data.ctypes.data,  # write array
-            None,  # samplers per channel written
-            None
-        ))  # reserved
+            self._sample_mode(),
+            # the output buffer is regenerated for each repeat
+            self.write_length * self.repeats
+        )
         threading.Thread.__init__(self)
         print('Finish Setup_Write')
 
     def Setup_Read(self, Time, input_sample_rate):
         print('Waveform: Setup_Read')
 
-        self.max_num_samples = int(np.float32(input_sample_rate) * 3 * Time)
-        self.CHK(nidaq.DAQmxCreateTask("", ctypes.byref(self.taskHandle_Read)))
+        self.samples_per_shot = int(np.float32(input_sample_rate) * Time)
+        if self.continuous:
+            # in continuous mode this only sizes the driver's buffer
+            samples_per_channel = self.chunk_size * self.ring_size
+        else:
+            samples_per_channel = self.samples_per_shot * self.repeats
+        self.max_num_samples = samples_per_channel * self.num_channels
+        self.taskHandle_Read = self.backend.create_task()
 
         print('DAQmxCreateAIVoltageChan')
-        # creates an analog input voltage channel
-        self.CHK(nidaq.DAQmxCreateAIVoltageChan(
-            self.taskHandle_Read,
-            self.DEVICE_ID + "ai0:2",
-            "",
-            self.DAQmx_Val_Diff,  # this is the rise type
-            float64(-self.InputVoltageRange),
-            float64(self.InputVoltageRange),
-            self.DAQmx_Val_Volts,
-            None
-        ))
+        # creates an analog input voltage channel for each input, in the
+        # order they are read
+        for input_channel in self.input_channels:
+            self.backend.create_ai_voltage_chan(
+                self.taskHandle_Read,
+                self.DEVICE_ID + input_channel.physical_channel,
+                TERMINAL_CONFIG_VALUES[input_channel.terminal_config],
+                -input_channel.voltage_range,
+                input_channel.voltage_range
+            )
+        if self.raw:
+            scaling = np.array([
+                self.backend.get_ai_scaling(
+                    self.taskHandle_Read,
+                    self.DEVICE_ID + input_channel.physical_channel
+                )
+                for input_channel in self.input_channels
+            ])
+            self.scales = scaling[:, 0]
+            self.offsets = scaling[:, 1]
 
         print('DAQmxCfgSampClkTiming')
-        self.CHK(nidaq.DAQmxCfgSampClkTiming(
+        self.backend.cfg_samp_clk_timing(
             self.taskHandle_Read,
             "",
             # "/Dev3/ao/SampleClock",
@@ -207,88 +416,293 @@ class WaveformThread(threading.Thread):
             # "Dev3/"+self.Channel+"/SampleClock"- doesn't work,
             input_sample_rate,
             self.DAQmx_Val_Rising,
-            self.DAQmx_Val_FiniteSamps,
-            uInt64(self.max_num_samples)
-        ))
-
-        self.Read_Data = np.zeros((self.max_num_samples,), dtype=np.float64)
-        self.read = int32()
-
-    def CHK(self, err):
-        """a simple error checking routine"""
-        if err < 0:
-            buf_size = 100
-            buf = ctypes.create_string_buffer('\000' * buf_size)
-            # Converts the error number returned
-            # by an NI-DAQmx function into a meaningful error message.
-            nidaq.DAQmxGetErrorString(err, ctypes.byref(buf), buf_size)
-            raise RuntimeError(
-                'nidaq call failed with error %d: %s' % (err, repr(buf.value))
-            )
-        if err > 0:
-            buf_size = 100
-            buf = ctypes.create_string_buffer('\000' * buf_size)
-            # Converts the error number returned
-            # by an NI-DAQmx function into a meaningful error message.
-            nidaq.DAQmxGetErrorString(err, ctypes.byref(buf), buf_size)
-            raise RuntimeError(
-                'nidaq generated warning %d: %s' % (err, repr(buf.value))
-            )
+            self._sample_mode(),
+            samples_per_channel
+        )
+        # the card can only divide its timebase, so the rate it runs at may
+        # differ slightly from the one requested
+        self.sample_clock_rate = self.backend.get_samp_clk_rate(
+            self.taskHandle_Read
+        )
+
+        # the buffers of a previous shot are reused, reads overwrite them
+        if self.continuous:
+            chunk_length = self.num_channels * self.chunk_size
+            ring = None
+            if self.ring_buffer is not None:
+                ring = self.ring_buffer.reshape(-1)
+            self.ring_buffer = self._pooled_buffer(
+                ring, self.ring_size * chunk_length
+            ).reshape((self.ring_size, chunk_length))
+        else:
+            read_length = self.max_num_samples
+            if not self.keep_raw:
+                # only the chunk being read is ever held
+                read_length = self.num_channels * min(
+                    self.chunk_size, samples_per_channel
+                )
+            self.Read_Data = self._pooled_buffer(self.Read_Data, read_length)
+            if self.bin_size > 1 and self.decimation == 'fir':
+                self.binner = StreamingDecimator(
+                    self.bin_size, self.sample_clock_rate, self.num_channels,
+                    self.samples_per_shot, self.repeats
+                )
+            elif self.bin_size > 1:
+                self.binner = StreamingBinner(
+                    self.bin_size, self.num_channels, self.samples_per_shot,
+                    self.repeats
+                )
+        self.samples_read = 0
+
+    def _sample_mode(self):
+        if self.continuous:
+            return self.DAQmx_Val_ContSamps
+        return self.DAQmx_Val_FiniteSamps
+
+    def add_consumer(self, consumer):
+        """
+        Registers a callable which is passed every chunk read, as a
+        (samples, channels) view. In continuous mode the chunk is a view into
+        the ring buffer, so it is only valid until the ring wraps around;
+        consumers must copy what they keep.
+        """
+        self.consumers.append(consumer)
+
+    def add_progress_callback(self, callback):
+        """
+        Registers a callable which is passed the number of samples per
+        channel read so far and the total expected, after every chunk of a
+        finite acquisition
+        """
+        self.progress_callbacks.append(callback)
+
+    def abort(self):
+        """
+        Asks a running acquisition to stop once its current chunk is read.
+        The tasks are left for stop to clear.
+        """
+        self.running = False
 
     def run(self):
 
         # Transitions the task from the committed state to the running state,
         # which begins measurement or generation.
-        self.CHK(nidaq.DAQmxStartTask(self.taskHandle_Write))
-        self.CHK(nidaq.DAQmxStartTask(self.taskHandle_Read))
+        self.backend.start_task(self.taskHandle_Write)
+        self.backend.start_task(self.taskHandle_Read)
+
+        if self.continuous:
+            return self._read_continuous()
+
+        return self._read_finite()
+
+    def time_axis(self, num_samples=None, bin_size=None):
+        """
+        The TimeAxis of num_samples samples (by default those of a shot
+        read) at the rate of the sample clock, or of bins of bin_size
+        samples (by default the thread's own), each timed at the mean time
+        of its samples
+        """
+        if bin_size is None:
+            bin_size = self.bin_size
+        if num_samples is None:
+            if self.binner is not None and bin_size == self.bin_size:
+                num_samples = self.binner.num_bins // self.repeats
+            else:
+                num_samples = self.samples_read // self.repeats // bin_size
+        dt = 1. / self.sample_clock_rate
+        return TimeAxis((bin_size - 1) * dt / 2., bin_size * dt, num_samples)
+
+    @property
+    def time(self):
+        """
+        The time of each sample in a shot, as an implicit TimeAxis
+        """
+        return self.time_axis()
+
+    def _read_samples(self, *args):
+        if self.raw:
+            return self.backend.read_binary_i16(*args)
+        return self.backend.read_analog_f64(*args)
+
+    def to_volts(self, data=None):
+        """
+        Returns data (by default the channel_view of the read buffer) in
+        volts. data is a (..., channels) array of codes when raw is set;
+        otherwise it is already in volts and returned unchanged.
+        """
+        if data is None:
+            data = self.channel_view()
+        if not self.raw:
+            return data
+        volts = data * self.scales
+        volts += self.offsets
+        return volts
+
+    def channel_view(self, data=None):
+        """
+        Returns the samples read into data (by default the read buffer) as a
+        (samples, channels) view, trimmed to the samples actually read.
+        When binning, the default is the bins completed so far instead.
+        """
+        if data is None:
+            if self.binner is not None:
+                return self.binner.result()
+            data = self.Read_Data
+        if self.data_layout == self.DAQmx_Val_GroupByScanNumber:
+            data = data[:self.num_channels * self.samples_read]
+            return data.reshape((-1, self.num_channels))
+        # each channel fills its own row, however much of it was read
+        data = data.reshape((self.num_channels, -1))
+        return data[:, :self.samples_read].T
+
+    def _read_finite(self):
+        """
+        Reads all the shots chunk_size samples per channel at a time,
+        checking running between chunks
+        """
+        total = self.samples_per_shot * self.repeats
+        self.samples_read = 0
+        self.chunks_read = 0
+        self.aborted = False
+        # allow for twice the time it takes to acquire a chunk
+        timeout = max(10.0, 2. * self.chunk_size / self.input_sample_rate)
+        if self.binner is not None:
+            self.binner.reset()
+
+        if self.data_layout == self.DAQmx_Val_GroupByChannel:
+            if self.keep_raw:
+                # each read groups its own chunk by channel, so it is read
+                # aside and copied into the rows of the read buffer
+                channels = self.Read_Data.reshape((self.num_channels, -1))
+                scratch = np.empty(
+                    (self.num_channels * min(self.chunk_size, total),),
+                    dtype=self.sample_dtype
+                )
+            else:
+                # the read buffer only holds the chunk being read
+                scratch = self.Read_Data
+
+        while self.samples_read < total:
+            if not self.running:
+                self.aborted = True
+                break
+
+            start = self.samples_read
+            num_samples = min(self.chunk_size, total - start)
+            # without keep_raw every chunk is read into the same place
+            offset = start if self.keep_raw else 0
+            if self.data_layout == self.DAQmx_Val_GroupByScanNumber:
+                buffer = self.Read_Data[
+                    self.num_channels * offset:
+                    self.num_channels * (offset + num_samples)
+                ]
+            else:
+                buffer = scratch[:self.num_channels * num_samples]
+
+            read = self._read_samples(
+                self.taskHandle_Read,
+                num_samples,
+                timeout,
+                self.data_layout,
+                buffer
+            )
 
-        # reads samples from the specified acquisition task.
-        self.CHK(nidaq.DAQmxReadAnalogF64(
-            # Task handle
-            self.taskHandle_Read,
-            # numSamples per channel, -1 reads as many samples as possible
-            -1,
-            # Timeout in seconds
-            float64(10.0),
-            self.DAQmx_Val_GroupByScanNumber,
-            # read array
-            self.Read_Data.ctypes.data,
-            # samples per channel
-            self.max_num_samples,
-            # The actual number of samples read per channel (its an output)
-            ctypes.byref(self.read),
-            None
-        ))  # reserved for future use, pass none to this
-        # toc = time.clock()
-        # print self.Time
-        self.time = np.linspace(0, self.Time, self.read.value)
-        # print self.time[0]
+            if self.data_layout == self.DAQmx_Val_GroupByScanNumber:
+                chunk = buffer[:self.num_channels * read].reshape(
+                    (-1, self.num_channels)
+                )
+            elif self.keep_raw:
+                chunk = channels[:, start:start + read]
+                chunk[:] = buffer.reshape(
+                    (self.num_channels, num_samples)
+                )[:, :read]
+                chunk = chunk.T
+            else:
+                chunk = buffer.reshape(
+                    (self.num_channels, num_samples)
+                )[:, :read].T
+
+            self.samples_read += read
+            self.chunks_read += 1
+            if self.binner is not None:
+                self.binner.update(chunk)
+            for consumer in self.consumers:
+                consumer(chunk)
+            for callback in self.progress_callbacks:
+                callback(self.samples_read, total)
 
         return self.Read_Data
 
+    def _read_continuous(self):
+        """
+        Reads chunk_size samples per channel at a time until the thread is
+        stopped, cycling through the slots of the ring buffer.
+        """
+        self.chunks_read = 0
+        # allow for twice the time it takes to acquire a chunk
+        timeout = max(10.0, 2. * self.chunk_size / self.input_sample_rate)
+
+        while self.running:
+            slot = self.ring_buffer[self.chunks_read % self.ring_size]
+            self.samples_read = self._read_samples(
+                self.taskHandle_Read,
+                self.chunk_size,
+                timeout,
+                self.data_layout,
+                slot
+            )
+            chunk = self.channel_view(slot)
+            self.chunks_read += 1
+            for consumer in self.consumers:
+                consumer(chunk)
+
+        return self.ring_buffer
+
+    def stop_tasks(self):
+        """
+        Stops both tasks, returning them to the committed state so they can
+        be started again
+        """
+        self.backend.stop_task(self.taskHandle_Write)
+        self.backend.stop_task(self.taskHandle_Read)
+
     def stop(self):
         self.running = False
-        if self.taskHandle_Write.value != 0:
-            # Stops the task and returns it to the state it was in before you
-            # called DAQmxStartTask
-            nidaq.DAQmxStopTask(self.taskHandle_Write)
-            # clears the specified task. If the task is currently running, the
-            # function first stops thetask and then releases all of its
-            # resources.
-            nidaq.DAQmxClearTask(self.taskHandle_Write)
-
-        if self.taskHandle_Read.value != 0:
-            # Stops the task and returns it to the state it was in before you
-            # called DAQmxStartTask
-            nidaq.DAQmxStopTask(self.taskHandle_Read)
-            # clears the specified task. If the task is currently running, the
-            # function first stops thetask and then releases all of its
+        if (self.continuous and self.is_alive() and
+                threading.current_thread() is not self):
+            # let the read loop finish its chunk before clearing the tasks
+            self.join()
+        self.configured = False
+        self.committed = False
+        if self.Write_data is not None:
+            # configured, but never loaded
+            self.buffer_pool.release(self.Write_data)
+            self.Write_data = None
+        write_task, self.taskHandle_Write = self.taskHandle_Write, None
+        read_task, self.taskHandle_Read = self.taskHandle_Read, None
+        # the read task is cleared even if the write task fails to be
+        try:
+            self._stop_and_clear(write_task)
+        finally:
+            self._stop_and_clear(read_task)
+
+    def _stop_and_clear(self, task):
+        if task is None:
+            return
+        try:
+            self.backend.stop_task(task)
+        finally:
+            # clears the specified task. If the task is currently running,
+            # the function first stops thetask and then releases all of its
             # resources.
-            nidaq.DAQmxClearTask(self.taskHandle_Read)
-        # show()
+            self.backend.clear_task(task)
 
     def clear(self):
-        # clears the specified task. If the task is currently running, the
-        # function first stops thetask and then releases all of its resources.
-        nidaq.DAQmxClearTask(self.taskHandle_Write)
-        nidaq.DAQmxClearTask(self.taskHandle_Read)
+        write_task, self.taskHandle_Write = self.taskHandle_Write, None
+        read_task, self.taskHandle_Read = self.taskHandle_Read, None
+        try:
+            if write_task is not None:
+                self.backend.clear_task(write_task)
+        finally:
+            if read_task is not None:
+                self.backend.clear_task(read_task)
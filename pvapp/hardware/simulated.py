@@ -0,0 +1,335 @@
+import re
+import time
+
+import numpy as np
+from scipy.signal import lfilter
+
+from hardware.backend import (
+    DAQBackend,
+    DAQmx_Val_ContSamps,
+    DAQmx_Val_GroupByScanNumber,
+    DAQmx_Val_Task_Commit,
+)
+from util.Constants import (
+    MAX_INPUT_SAMPLE_RATE,
+    MAX_OUTPUT_SAMPLE_RATE,
+)
+
+
+class SimulatedTask(object):
+    """State of a single task on a SimulatedDevice"""
+
+    def __init__(self):
+        self.channels = []
+        self.ranges = []
+        self.terminal_configs = []
+        self.clock_source = ""
+        self.rate = None
+        self.sample_mode = None
+        self.samples_per_channel = 0
+        self.data = None
+        self.committed = False
+        self.running = False
+
+        # acquisition state, reset every time the task is started
+        self.position = 0
+        self.start_time = None
+        self.filter_state = None
+
+    def is_output(self):
+        return len(self.channels) > 0 and '/ao' in self.channels[0]
+
+
+class SimulatedDevice(DAQBackend):
+    """
+    In-process model of the tester: an ao channel drives the LED, whose
+    light is seen by the reference photodiode (ai0), and generates carriers
+    in the sample seen as photoconductance (ai1) and photoluminescence
+    (ai2).
+
+    The light follows the drive voltage through the LED driver's response
+    time, and the excess carriers follow the light with the effective
+    lifetime of the sample. Every input channel has gaussian noise, is
+    clipped to its input range and quantised by a 16 bit converter, whose
+    codes can be read directly with read_binary_i16.
+
+    The sample clock is derived from a 100 MHz timebase, so requested rates
+    are coerced as on the card. With realtime set, reads block until the
+    requested samples would have been acquired and each driver call costs
+    call_latency seconds, so timings measured against the simulation are
+    close to those on the rig.
+    """
+
+    TIMEBASE = 100e6
+    RESOLUTION_BITS = 16
+
+    def __init__(self, device_id="Sim1", realtime=True, call_latency=2e-4,
+                 noise=1e-3, led_time_constant=5e-6, lifetime=1e-4,
+                 reference_gain=1.0, pc_gain=0.5, pl_gain=0.05, pc_dark=0.1,
+                 seed=None):
+        super(SimulatedDevice, self).__init__(device_id)
+
+        self.realtime = realtime
+        self.call_latency = call_latency
+
+        # volts rms on every input channel
+        self.noise = noise
+        self.led_time_constant = led_time_constant
+        self.lifetime = lifetime
+
+        self.reference_gain = reference_gain
+        self.pc_gain = pc_gain
+        self.pl_gain = pl_gain
+        self.pc_dark = pc_dark
+
+        self.random = np.random.RandomState(seed)
+        self.tasks = []
+
+    def _call(self):
+        if self.realtime and self.call_latency:
+            time.sleep(self.call_latency)
+
+    def _expand_channels(self, physical_channel):
+        """
+        Turns a channel list such as "Dev1/ai0:2, Dev1/ai4" into the
+        individual channel names
+        """
+        channels = []
+        for name in physical_channel.split(','):
+            name = name.strip()
+            match = re.match(r'^(.+)/(ai|ao)(\d+)(?::(\d+))?$', name)
+            if match is None:
+                raise RuntimeError(
+                    'Invalid physical channel: {0}'.format(name)
+                )
+            device, kind, first, last = match.groups()
+            if device != self.device_id:
+                raise RuntimeError(
+                    'Device {0} is not {1}'.format(device, self.device_id)
+                )
+            last = first if last is None else last
+            for i in range(int(first), int(last) + 1):
+                channels.append('{0}/{1}{2}'.format(device, kind, i))
+        return channels
+
+    def _coerce_rate(self, rate):
+        """The rate the sample clock can actually produce"""
+        divisor = max(1, int(round(self.TIMEBASE / rate)))
+        return self.TIMEBASE / divisor
+
+    def _output_task(self):
+        for task in self.tasks:
+            if task.is_output() and task.running:
+                return task
+        return None
+
+    def create_task(self):
+        self._call()
+        task = SimulatedTask()
+        self.tasks.append(task)
+        return task
+
+    def create_ao_voltage_chan(self, task, physical_channel, min_val,
+                               max_val):
+        self._call()
+        for channel in self._expand_channels(physical_channel):
+            task.channels.append(channel)
+            task.ranges.append((min_val, max_val))
+
+    def create_ai_voltage_chan(self, task, physical_channel, terminal_config,
+                               min_val, max_val):
+        self._call()
+        for channel in self._expand_channels(physical_channel):
+            task.channels.append(channel)
+            task.ranges.append((min_val, max_val))
+            task.terminal_configs.append(terminal_config)
+
+    def cfg_samp_clk_timing(self, task, source, rate, active_edge,
+                            sample_mode, samples_per_channel):
+        self._call()
+        max_rate = MAX_OUTPUT_SAMPLE_RATE if task.is_output() else (
+            MAX_INPUT_SAMPLE_RATE
+        )
+        if rate > max_rate:
+            raise RuntimeError(
+                'Sample rate {0} exceeds the maximum of {1}'.format(
+                    rate, max_rate)
+            )
+        task.clock_source = source
+        task.rate = self._coerce_rate(rate)
+        task.sample_mode = sample_mode
+        task.samples_per_channel = int(samples_per_channel)
+
+    def get_samp_clk_rate(self, task):
+        self._call()
+        return task.rate
+
+    def write_analog_f64(self, task, data, data_layout):
+        self._call()
+        low, high = task.ranges[0]
+        # the output saturates at the limits of its range
+        task.data = np.clip(data, low, high)
+
+    def write_binary_i16(self, task, data, data_layout):
+        self._call()
+        scale, offset = self.get_ao_scaling(task, task.channels[0])
+        task.data = (data - offset) / scale
+
+    def _lsb(self, value_range):
+        low, high = value_range
+        return float(high - low) / 2 ** self.RESOLUTION_BITS
+
+    def get_ai_scaling(self, task, channel):
+        return self._lsb(task.ranges[task.channels.index(channel)]), 0.
+
+    def get_ao_scaling(self, task, channel):
+        return 1. / self._lsb(task.ranges[task.channels.index(channel)]), 0.
+
+    def task_control(self, task, action):
+        self._call()
+        if action == DAQmx_Val_Task_Commit:
+            task.committed = True
+
+    def start_task(self, task):
+        self._call()
+        if task.is_output() and task.data is None:
+            raise RuntimeError('No samples written to the output task')
+        task.running = True
+        task.position = 0
+        task.filter_state = None
+        task.start_time = time.time()
+
+    def stop_task(self, task):
+        self._call()
+        task.running = False
+
+    def clear_task(self, task):
+        self._call()
+        task.running = False
+        if task in self.tasks:
+            self.tasks.remove(task)
+
+    def _drive(self, ai_task, start, num_samples):
+        """
+        The output voltage at each of the input samples
+        """
+        ao_task = self._output_task()
+        if ao_task is None:
+            return np.zeros(num_samples)
+
+        index = np.arange(start, start + num_samples)
+        if 'ai/SampleClock' not in ao_task.clock_source:
+            # generated on its own clock, so map the sample times across
+            index = (index * ao_task.rate / ai_task.rate).astype(np.int64)
+
+        period = ao_task.data.shape[0]
+        if ao_task.sample_mode == DAQmx_Val_ContSamps:
+            # the buffer is regenerated for as long as the task runs
+            return ao_task.data[index % period]
+
+        # a finite generation holds its last sample once it is done
+        index = np.minimum(index, ao_task.samples_per_channel - 1)
+        return ao_task.data[index % period]
+
+    def _signals(self, task, drive):
+        """
+        Models the reference, PC and PL voltages produced by the drive
+        """
+        dt = 1. / task.rate
+        if task.filter_state is None:
+            task.filter_state = [np.zeros(1), np.zeros(1)]
+
+        # the LED lights up on negative drive voltages
+        light = np.clip(-drive, 0, None)
+        decay = np.exp(-dt / self.led_time_constant)
+        light, task.filter_state[0] = lfilter(
+            [1 - decay], [1, -decay], light, zi=task.filter_state[0]
+        )
+
+        decay = np.exp(-dt / self.lifetime)
+        carriers, task.filter_state[1] = lfilter(
+            [1 - decay], [1, -decay], light, zi=task.filter_state[1]
+        )
+
+        reference = self.reference_gain * light
+        pc = self.pc_dark + self.pc_gain * carriers
+        # radiative recombination goes with the square of the carriers
+        pl = -self.pl_gain * carriers * (1 + carriers)
+        return [reference, pc, pl]
+
+    def _codes(self, signal, value_range):
+        """The ADC codes of the noisy signal"""
+        signal = signal + self.random.normal(0, self.noise, signal.shape)
+        limit = 2 ** (self.RESOLUTION_BITS - 1)
+        codes = np.round(signal / self._lsb(value_range))
+        return np.clip(codes, -limit, limit - 1)
+
+    def _digitise(self, signal, value_range):
+        low, high = value_range
+        signal = signal + self.random.normal(0, self.noise, signal.shape)
+        lsb = self._lsb(value_range)
+        signal = np.round(signal / lsb) * lsb
+        return np.clip(signal, low, high)
+
+    def read_analog_f64(self, task, num_samples, timeout, data_layout,
+                        buffer):
+        return self._read(
+            task, num_samples, timeout, data_layout, buffer, self._digitise
+        )
+
+    def read_binary_i16(self, task, num_samples, timeout, data_layout,
+                        buffer):
+        return self._read(
+            task, num_samples, timeout, data_layout, buffer, self._codes
+        )
+
+    def _read(self, task, num_samples, timeout, data_layout, buffer,
+              convert):
+        self._call()
+        if not task.running:
+            raise RuntimeError('The task has not been started')
+
+        num_channels = len(task.channels)
+        available = buffer.shape[0] // num_channels
+        if task.sample_mode != DAQmx_Val_ContSamps:
+            remaining = task.samples_per_channel - task.position
+            if num_samples > remaining:
+                raise RuntimeError(
+                    'Attempted to read samples that will never be acquired'
+                )
+            if num_samples < 0:
+                num_samples = remaining
+        elif num_samples < 0:
+            num_samples = available
+
+        if num_samples > available:
+            raise RuntimeError('The read buffer is too small')
+
+        if self.realtime:
+            # wait until the samples would have been acquired
+            done = task.start_time + (task.position + num_samples) / task.rate
+            wait = done - time.time()
+            if wait > timeout:
+                time.sleep(timeout)
+                raise RuntimeError('Timed out waiting for samples')
+            if wait > 0:
+                time.sleep(wait)
+
+        drive = self._drive(task, task.position, num_samples)
+        signals = self._signals(task, drive)
+
+        data = buffer[:num_samples * num_channels]
+        if data_layout == DAQmx_Val_GroupByScanNumber:
+            data = data.reshape((num_samples, num_channels)).T
+        else:
+            data = data.reshape((num_channels, num_samples))
+
+        for i, channel in enumerate(task.channels):
+            index = int(channel.rsplit('ai', 1)[1])
+            signal = signals[index] if index < len(signals) else (
+                np.zeros(num_samples)
+            )
+            data[i] = convert(signal, task.ranges[i])
+
+        task.position += num_samples
+        return num_samples
@@ -0,0 +1,319 @@
+import numpy as np
+
+from util.binning import reduce_bins, reduce_errors
+from util.Constants import CHANNELS
+from util.StreamingDecimator import decimate, decimate_errors
+from util.TimeAxis import TimeAxis
+
+
+def _default_names(num_columns):
+    # the configured channels, unless there are too few or too many columns
+    if num_columns in (len(CHANNELS), 2 * len(CHANNELS)):
+        return CHANNELS
+    return ['Channel {0}'.format(i) for i in range(num_columns)]
+
+
+def _read_only(array):
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+class Dataset(object):
+    """
+    A measured dataset: its time axis, kept as a TimeAxis (t0 and dt), and
+    the samples of its named channels.
+
+    The samples are stored channel-major, as a (columns, samples) array:
+    one row per channel, in the order of names, followed by a row with the
+    standard error of each channel when the dataset has them. Every channel
+    is contiguous, and dataset['PC'] is a view of it.
+
+    It can also be used where a (samples, 1 + columns) array, with the time
+    in column 0, was used before. Indexing with a pair works in those
+    column numbers, np.asarray builds that array, and slicing the samples
+    gives another Dataset. The time column is only computed when it is
+    read.
+
+    copy_on_write gives a dataset sharing the samples instead of copying
+    them, through read-only views. Its shared channels cannot be changed
+    in place; assigning to one copies just that channel first. values then
+    restacks the channels into a new array the first time it is read. The
+    dataset copied from is left as it was, writable, so it must not be
+    changed in place while the copy is in use.
+    """
+
+    def __init__(self, time, values, names=None):
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[np.newaxis, :]
+        if names is None:
+            names = _default_names(values.shape[0])
+        names = list(names)
+        assert values.shape[0] in (len(names), 2 * len(names))
+        assert len(time) == values.shape[1]
+
+        self.time = time
+        self.names = names
+        # the (columns, samples) array the rows are views of, None once a
+        # row has been replaced
+        self._values = values
+        self._rows = list(values)
+
+    @classmethod
+    def _from_rows(cls, time, rows, names):
+        dataset = cls.__new__(cls)
+        dataset.time = time
+        dataset.names = list(names)
+        dataset._values = None
+        dataset._rows = list(rows)
+        return dataset
+
+    @classmethod
+    def from_array(cls, data, names=None):
+        """
+        The Dataset of a (samples, 1 + columns) array whose evenly spaced
+        time is in column 0
+        """
+        if isinstance(data, Dataset):
+            return data
+        data = np.asarray(data, dtype=np.float64)
+        num_samples = data.shape[0]
+        t0 = data[0, 0] if num_samples else 0.
+        dt = 0.
+        if num_samples > 1:
+            dt = (data[-1, 0] - data[0, 0]) / (num_samples - 1)
+        return cls(
+            TimeAxis(t0, dt, num_samples),
+            np.ascontiguousarray(data[:, 1:].T),
+            names
+        )
+
+    @classmethod
+    def from_channels(cls, time, mean, std_error=None, names=None):
+        """
+        The Dataset of (samples, channels) arrays of the channel values and,
+        optionally, their standard errors
+        """
+        num_channels = mean.shape[1]
+        num_columns = num_channels if std_error is None else 2 * num_channels
+        values = np.empty((num_columns, mean.shape[0]))
+        values[:num_channels] = mean.T
+        if std_error is not None:
+            values[num_channels:] = std_error.T
+        return cls(time, values, names)
+
+    @property
+    def values(self):
+        """The (columns, samples) array of every row"""
+        if self._values is None:
+            self._values = np.array(self._rows)
+            self._rows = list(self._values)
+        return self._values
+
+    @property
+    def t0(self):
+        return self.time.t0
+
+    @property
+    def dt(self):
+        return self.time.dt
+
+    @property
+    def has_errors(self):
+        return len(self._rows) > len(self.names)
+
+    @property
+    def shape(self):
+        return (len(self.time), 1 + len(self._rows))
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def dtype(self):
+        return self._rows[0].dtype
+
+    def __len__(self):
+        return len(self.time)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def channel_index(self, name):
+        """The row of the values of the channel called name"""
+        try:
+            return self.names.index(name)
+        except ValueError:
+            raise KeyError('No channel called {0!r}'.format(name))
+
+    def error(self, name):
+        """The standard error of a channel, None if it has none"""
+        if not self.has_errors:
+            return None
+        return self._rows[len(self.names) + self.channel_index(name)]
+
+    def __array__(self, dtype=None):
+        data = np.empty(self.shape, dtype=dtype or self.dtype)
+        data[:, 0] = self.time
+        for column, row in enumerate(self._rows, 1):
+            data[:, column] = row
+        return data
+
+    def _column(self, rows, column):
+        # column of the array form, for the given rows
+        if column < 0:
+            column += self.shape[1]
+        if column == 0:
+            if isinstance(rows, slice):
+                return np.asarray(self.time[rows])
+            return self.time[rows]
+        return self._rows[column - 1][rows]
+
+    def _writable_row(self, row, keep=True):
+        # the row, first replaced by a copy of its own if it is shared, or
+        # by an uninitialised one if its samples are about to be replaced
+        # anyway
+        if not self._rows[row].flags.writeable:
+            if keep:
+                self._rows[row] = self._rows[row].copy()
+            else:
+                self._rows[row] = np.empty_like(self._rows[row])
+            self._values = None
+        return self._rows[row]
+
+    def __getitem__(self, index):
+        if isinstance(index, basestring):
+            return self._rows[self.channel_index(index)]
+
+        if isinstance(index, slice):
+            if self._values is not None:
+                return Dataset(
+                    self.time[index], self._values[:, index], self.names
+                )
+            return Dataset._from_rows(
+                self.time[index], [row[index] for row in self._rows],
+                self.names
+            )
+
+        if isinstance(index, tuple) and len(index) == 2:
+            rows, columns = index
+            if isinstance(columns, (int, long, np.integer)):
+                return self._column(rows, columns)
+            if isinstance(rows, slice) and isinstance(columns, slice):
+                start, stop, step = columns.indices(self.shape[1])
+                if start > 0 and step > 0:
+                    # only measured columns, so a view of them
+                    return self.values[start - 1:stop - 1:step, rows].T
+
+        return np.asarray(self)[index]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, basestring):
+            row = self._writable_row(self.channel_index(index), keep=False)
+            row[...] = value
+            return
+
+        if isinstance(index, tuple) and len(index) == 2:
+            rows, column = index
+            if isinstance(column, (int, long, np.integer)):
+                if column < 0:
+                    column += self.shape[1]
+                if column > 0:
+                    self._writable_row(column - 1)[rows] = value
+                    return
+        raise TypeError(
+            'Only the measured columns of a Dataset can be assigned to'
+        )
+
+    def copy(self):
+        return Dataset(self.time, np.array(self._rows), self.names)
+
+    def copy_on_write(self):
+        """
+        A copy sharing the samples of this dataset, until it assigns to a
+        channel
+        """
+        if self._values is not None:
+            return Dataset(self.time, _read_only(self._values), self.names)
+        return Dataset._from_rows(
+            self.time, [_read_only(row) for row in self._rows], self.names
+        )
+
+    def crop(self, start=None, stop=None):
+        """The samples from index start up to stop"""
+        return self[start:stop]
+
+    def crop_time(self, start_time=None, end_time=None):
+        """
+        The samples with start_time < t < end_time, found from t0 and dt
+        rather than by searching the times
+        """
+        start, stop = 0, len(self)
+        if self.dt > 0:
+            if start_time is not None:
+                start = int(np.floor((start_time - self.t0) / self.dt)) + 1
+            if end_time is not None:
+                stop = int(np.ceil((end_time - self.t0) / self.dt))
+        start = min(max(start, 0), len(self))
+        stop = min(max(stop, start), len(self))
+        return self[start:stop]
+
+    def bin(self, bin_size, keep_tail=False, method='mean'):
+        """
+        Reduces every bin_size successive samples to one, by their mean,
+        median or sum (see binning.reduce_bins), and their standard errors
+        to that of the bin (see binning.reduce_errors). Each bin is timed at
+        the mean time of its samples; a shorter last bin, kept with
+        keep_tail, is timed as if it were full.
+        """
+        if bin_size == 1:
+            return self
+        num_channels = len(self.names)
+        values = reduce_bins(
+            self.values[:num_channels], bin_size, axis=1,
+            keep_tail=keep_tail, method=method
+        )
+        if self.has_errors:
+            errors = reduce_errors(
+                self.values[num_channels:], bin_size, axis=1,
+                keep_tail=keep_tail, method=method
+            )
+            values = np.concatenate((values, errors))
+        time = TimeAxis(
+            self.t0 + (bin_size - 1) * self.dt / 2.,
+            self.dt * bin_size,
+            values.shape[1]
+        )
+        return Dataset(time, values, self.names)
+
+    def decimate(self, factor, taps_per_phase=9):
+        """
+        Low pass filters the samples and keeps one in every factor (see
+        StreamingDecimator.decimate), timed as the bins of bin(factor). The
+        standard errors are filtered as those of independent samples (see
+        StreamingDecimator.decimate_errors).
+        """
+        if factor == 1:
+            return self
+        num_channels = len(self.names)
+        values = decimate(
+            self.values[:num_channels], factor, 1. / self.dt, axis=1,
+            taps_per_phase=taps_per_phase
+        )
+        if self.has_errors:
+            errors = decimate_errors(
+                self.values[num_channels:], factor, 1. / self.dt, axis=1,
+                taps_per_phase=taps_per_phase
+            )
+            values = np.concatenate((values, errors))
+        time = TimeAxis(
+            self.t0 + (factor - 1) * self.dt / 2.,
+            self.dt * factor,
+            values.shape[1]
+        )
+        return Dataset(time, np.ascontiguousarray(values), self.names)
+
+    def __repr__(self):
+        return 'Dataset({0!r}, channels={1!r})'.format(self.time, self.names)
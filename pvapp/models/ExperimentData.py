@@ -1,49 +1,147 @@
 import numpy as np
 import scipy
 
-from util.Constants import (
-    CHANNEL_INDEX,
-)
+from models.Dataset import Dataset
 
 from test.utils import make_sin_data
 
 
+def _invert(data, channel):
+    data = data.copy_on_write()
+    data[channel] = np.negative(data[channel])
+    return data
+
+
+def _offset(data, channel, offset):
+    data = data.copy_on_write()
+    data[channel] = data[channel] + offset
+    return data
+
+
+def _crop(data, start_time, end_time):
+    return data.crop_time(start_time, end_time)
+
+
+def _bin(data, bin_size):
+    return data.bin(bin_size)
+
+
+def _decimate(data, factor):
+    return data.decimate(factor)
+
+
+# the transforms an operation can name, each returns a new Dataset and
+# leaves the one it is given as it was. Those that change a channel share
+# the rest with it (see Dataset.copy_on_write).
+TRANSFORMS = {
+    'invert': _invert,
+    'offset': _offset,
+    'crop': _crop,
+    'bin': _bin,
+    'decimate': _decimate,
+}
+
+
 class ExperimentData(object):
-    """docstring for ExperimentData"""
+    """
+    The raw data of a measurement, and the transforms applied to it.
+
+    The transforms are kept as an ordered list of operations, (name,
+    arguments...) tuples of TRANSFORMS, rather than applied to the data
+    straight away. Data evaluates them when it is asked for, and memoises
+    the results of the last two stages, the ones undo and replace_last
+    can reach: after the last operation is changed or undone only that
+    stage is recomputed, and reverting just clears the list. Undoing
+    further back recomputes from the raw data.
+
+    RawData shares the samples of the dataset it was given rather than
+    copying them, and is never written to.
+    """
     def __init__(self, data=None, metadata=None):
         super(ExperimentData, self).__init__()
 
         # make secondary dataset
-        data = make_sin_data(duration=100)
+        data = Dataset.from_array(make_sin_data(duration=100))
 
-        self.Data = data
-        self.RawData = data
+        self.RawData = data.copy_on_write()
         self.metadata = metadata
+        self.operations = []
+        # (operation, result) of each stage evaluated so far, the result
+        # None once it is no longer memoised
+        self._stages = []
+
+    @property
+    def Data(self):
+        """The raw data with every operation applied"""
+        # the stages still matching the operations, and the last of them
+        # with a memoised result
+        start, data = 0, self.RawData
+        matched = 0
+        for stage, operation in zip(self._stages, self.operations):
+            if stage[0] != operation:
+                break
+            matched += 1
+            if stage[1] is not None:
+                start, data = matched, stage[1]
+        stages = self._stages[:start]
+
+        for operation in self.operations[start:]:
+            data = TRANSFORMS[operation[0]](data, *operation[1:])
+            stages.append((operation, data))
+
+        # only the last two stages are kept
+        for i in range(len(stages) - 2):
+            stages[i] = (stages[i][0], None)
+        self._stages = stages
+        return data
 
     def isDataEmpty(self):
-        return self.Data is None
+        return self.RawData is None
 
     def updateRawData(self, data):
-        self.Data = data
-        self.RawData = np.copy(data)
+        self.RawData = Dataset.from_array(data).copy_on_write()
+        self.revertData()
+
+    def apply(self, name, *args):
+        """Appends the operation name(*args) to the transforms"""
+        assert name in TRANSFORMS
+        self.operations.append((name,) + args)
+
+    def replace_last(self, name, *args):
+        """
+        Changes the arguments of the last operation if it is a name one,
+        and otherwise appends it
+        """
+        if self.operations and self.operations[-1][0] == name:
+            self.operations.pop()
+        self.apply(name, *args)
+
+    def undo(self):
+        """Drops the last operation"""
+        if self.operations:
+            self.operations.pop()
 
     def revertData(self):
-        self.Data = np.copy(self.RawData)
+        del self.operations[:]
+        del self._stages[:]
 
     def invertHandler(self, channel):
-        self.Data[:, CHANNEL_INDEX[channel]] *= -1
+        if self.operations and self.operations[-1] == ('invert', channel):
+            # inverting twice cancels out
+            self.operations.pop()
+        else:
+            self.apply('invert', channel)
         self.metadata.inverted_channels[channel] = not self.metadata.inverted_channels[channel]
 
     def offsetHandler(self, offset_type=None, offset=None, channel=None):
         if offset_type == 'y':
-            index = CHANNEL_INDEX[channel]
-            self.Data[:, index] = self.Data[:, index] + offset
+            self.apply('offset', channel, offset)
         elif offset_type == 'start_x':
-            self.Data = self.Data[self.Data[:, 0] > offset, :]
+            self.apply('crop', offset, None)
         elif offset_type == 'end_x':
             # so this isn't cumulative
-            offset = self.RawData[-1, 0] - offset
-            self.Data = self.Data[self.Data[:, 0] < offset, :]
+            offset = self.RawData.time[-1] - offset
+            self.apply('crop', None, offset)
 
     def fftOperator(self, channel_name, total_duration):
         # get FFT of data
@@ -51,7 +149,7 @@ class ExperimentData(object):
         # frequency spectrum data
         t = scipy.linspace(0, total_duration, self.metadata.sample_rate)
 
-        signal = self.Data[:, CHANNEL_INDEX[channel_name]]
+        signal = self.Data[channel_name]
         FFT = abs(scipy.fft(signal))
 
         # returns DFT sample frequencies
@@ -65,4 +163,8 @@ class ExperimentData(object):
         return np.vstack((pos_freqs, FFT_transf)).T
 
     def binHandler(self, bin_size):
-        self.Data = utils.bin_data(self.Data, bin_size)
+        # binning again picks a new bin size rather than binning the bins
+        self.replace_last('bin', bin_size)
+
+    def decimateHandler(self, factor):
+        self.replace_last('decimate', factor)
@@ -1,5 +1,7 @@
+from InputChannel import InputChannel
 from PCCalibrationData import PCCalibrationData
 from util.Constants import (
+    CHANNELS,
     OUTPUTS,
     LOW_VOLTAGE_LIMIT,
     HIGH_VOLTAGE_LIMIT,
@@ -7,6 +9,7 @@ from util.Constants import (
     HIGH_HARDWARE_CONST,
     LOW_HARDWARE_CONST,
     MAX_INPUT_SAMPLE_RATE,
+    DECIMATION_METHODS,
 )
 
 
@@ -15,7 +18,8 @@ class ExperimentSettings(object):
 
     def __init__(self, waveform='Sin', duration=1, amplitude=0.5,
                  offset_before=1, offset_after=10, sample_rate=1.2e3,
-                 channel=1, binning=1, averaging=1):
+                 channel=1, binning=1, averaging=1, input_channels=None,
+                 decimation='box'):
 
         self.waveform = waveform
 
@@ -30,6 +34,9 @@ class ExperimentSettings(object):
 
         self.binning = binning
         self.averaging = averaging
+        # how the samples of a bin are reduced, see DECIMATION_METHODS
+        assert decimation in DECIMATION_METHODS
+        self.decimation = decimation
 
         # what follows are hardward settings
         self.threshold = 150.0
@@ -41,7 +48,18 @@ class ExperimentSettings(object):
             'PC': False,
             'PL': True
         }
-        self.input_voltage_range = 10.0
+        # the analog inputs read, by default every channel in CHANNELS on
+        # the input of the same number, all over +/- 10 V
+        if input_channels is None:
+            input_channels = [
+                InputChannel(name, 'ai{0}'.format(i))
+                for i, name in enumerate(CHANNELS)
+            ]
+        self.input_channels = [
+            InputChannel.from_dict(input_channel)
+            if isinstance(input_channel, dict) else input_channel
+            for input_channel in input_channels
+        ]
         self.output_voltage_range = 10.0  # volts
 
         self._voltage_threshold = 150.0
@@ -91,6 +109,20 @@ class ExperimentSettings(object):
         else:
             self._voltage_threshold = v_threshold
 
+    @property
+    def input_voltage_range(self):
+        """The widest range of the inputs"""
+        return max(
+            input_channel.voltage_range
+            for input_channel in self.input_channels
+        )
+
+    @input_voltage_range.setter
+    def input_voltage_range(self, voltage_range):
+        """Sets the range of every input"""
+        for input_channel in self.input_channels:
+            input_channel.voltage_range = voltage_range
+
     @property
     def sample_rate(self):
         return self._sample_rate
@@ -115,7 +147,13 @@ class ExperimentSettings(object):
             "channel": self.channel,
 
             "binning": self.binning,
-            "averaging": self.averaging
+            "averaging": self.averaging,
+            "decimation": self.decimation,
+
+            "input_channels": [
+                input_channel.as_dict()
+                for input_channel in self.input_channels
+            ]
         }
 
     def get_total_time(self):
@@ -0,0 +1,50 @@
+from util.Constants import (
+    INPUT_VOLTAGE_RANGE,
+    TERMINAL_CONFIGS,
+)
+from util.Exceptions import PVInputError
+
+
+class InputChannel(object):
+    """
+    An analog input read during an experiment: the channel it is stored
+    as, the physical input of the card (such as 'ai1'), how that input is
+    wired and the +/- voltage range it is digitised over.
+
+    measured_peak is the largest voltage seen by the pre-shot the range
+    was chosen from, if it was chosen automatically.
+    """
+
+    def __init__(self, name, physical_channel, terminal_config='Default',
+                 voltage_range=10.0, measured_peak=None):
+
+        if terminal_config not in TERMINAL_CONFIGS:
+            raise PVInputError(
+                "Unknown terminal configuration: {0}".format(terminal_config)
+            )
+        if voltage_range not in INPUT_VOLTAGE_RANGE:
+            raise PVInputError(
+                "Unsupported input voltage range: {0}".format(voltage_range)
+            )
+
+        self.name = name
+        self.physical_channel = physical_channel
+        self.terminal_config = terminal_config
+        self.voltage_range = voltage_range
+        self.measured_peak = measured_peak
+
+    @classmethod
+    def from_dict(cls, settings):
+        return cls(**settings)
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "physical_channel": self.physical_channel,
+            "terminal_config": self.terminal_config,
+            "voltage_range": self.voltage_range,
+            "measured_peak": self.measured_peak
+        }
+
+    def __repr__(self):
+        return "{0}".format(self.as_dict())
@@ -1,5 +1,4 @@
 import numpy as np
-from util.Constants import CHANNEL_INDEX
 
 
 class PCCalibrationData(object):
@@ -9,8 +8,8 @@ class PCCalibrationData(object):
         self.calibration_std = None
 
     def update_data(self, data):
-            self.pc_calibration_mean = np.mean(data[:, CHANNEL_INDEX['PC']])
-            self.pc_calibration_std = np.std(data[:, CHANNEL_INDEX['PC']])
+            self.pc_calibration_mean = np.mean(data['PC'])
+            self.pc_calibration_std = np.std(data['PC'])
 
     def as_dict(self):
         return {
@@ -4,7 +4,11 @@ import time
 
 from gui.view1 import View1
 from gui.PlotModal import PlotModal
+from gui.Publisher import call_after_publish
+from hardware.MeasurementExecutor import MeasurementExecutor
 from hardware.MeasurementHandler import MeasurementHandler
+from hardware.MultiDeviceHandler import MultiDeviceHandler
+from hardware.backend import NIDAQmxBackend
 
 from models.ExperimentSettings import ExperimentSettings
 from models.LightPulse import LightPulse
@@ -15,6 +19,9 @@ from models.Wafer import Wafer
 from util.utils import load_metadata, save_metadata
 from util.utils import save_data
 from util.Exceptions import PVInputError
+from util.Constants import DAQ_DEVICES
+
+from wx.lib.pubsub import pub
 
 
 class Controller(object):
@@ -43,7 +50,16 @@ class Controller(object):
         self.uploaded = False
 
         # the hardware interface
-        self.measurement_handler = MeasurementHandler()
+        if len(DAQ_DEVICES) > 1:
+            self.measurement_handler = MultiDeviceHandler(
+                [NIDAQmxBackend(device) for device in DAQ_DEVICES],
+                look_ahead=True
+            )
+        else:
+            self.measurement_handler = MeasurementHandler(
+                backend=NIDAQmxBackend(DAQ_DEVICES[0]),
+                look_ahead=True
+            )
 
         # settings
         self.temperature_settings = None
@@ -51,6 +67,10 @@ class Controller(object):
         # data sets
         self.pc_calibration_data = PCCalibrationData()
 
+        # runs the queued measurements off the UI thread
+        self.executor = None
+        self._set_subscriptions()
+
     def data_output_dir(self, event):
         """
         Select a different directory to save experimental results
@@ -147,7 +167,7 @@ class Controller(object):
             self.view1.disable_all_settings_inputs()
             self.view1.show_info_modal(
                 "{0} experiment settings uploaded successfully!".format(
-                    len(self.measurement_handler._queue)
+                    self.measurement_handler.queue_length()
                 )
             )
             self.uploaded = True
@@ -211,32 +231,71 @@ class Controller(object):
             if self.measurement_handler.is_queue_empty():
                 raise(PVInputError("No measurements loaded."))
 
-            # Do the actual measurements
-            # TODO: refactor in separate method
-
-            dataset_list = []
-            total_measurements = 0
+            # Do the actual measurements, in the background so the UI
+            # stays responsive. Results arrive as measurement.* messages.
             self.PlotModal = PlotModal(self.app)
+            self.PlotModal.m_pause_button.Bind(
+                wx.EVT_BUTTON, self.pause_measurement
+            )
+            self.PlotModal.m_cancel_button.Bind(
+                wx.EVT_BUTTON, self.cancel_measurement
+            )
             self.PlotModal.Show()
-            while not self.measurement_handler.is_queue_empty():
-
-                single_dataset = self.measurement_handler.single_measurement()
-                dataset_list.append(single_dataset)
-                total_measurements = total_measurements + 1
-                ts = int(time.time())
-                dataset_name = (
-                    str(total_measurements) +
-                    self.wafer_settings.id +
-                    str(ts)
-                )
-                save_data(single_dataset, dataset_name, self.data_dir)
 
-                # print single_dataset.shape
-                self.PlotModal.plot_data([x for x in single_dataset[:,1:].T])
+            # datasets are saved on the executor's threads, while the
+            # next experiment is already being acquired
+            self.executor = MeasurementExecutor(
+                self.measurement_handler,
+                call_after_publish,
+                process=self._save_dataset,
+                pipelined=True
+            )
+            self.executor.start()
 
         except PVInputError as e:
             self.view1.show_error_modal(str(e))
 
+    def pause_measurement(self, event):
+        """
+        Pause or resume the measurement series after the current measurement
+        """
+        if self.executor is None:
+            return
+        if self.executor.is_paused():
+            self.executor.resume()
+        else:
+            self.executor.pause()
+        self.PlotModal.set_paused(self.executor.is_paused())
+
+    def cancel_measurement(self, event):
+        """
+        Abandon the measurement series after the current measurement
+        """
+        if self.executor is not None:
+            self.executor.cancel()
+
+    def _save_dataset(self, index, total, data):
+        ts = int(time.time())
+        dataset_name = (
+            str(index) +
+            self.wafer_settings.id +
+            str(ts)
+        )
+        save_data(data, dataset_name, self.data_dir)
+
+    def _on_measurement_progress(self, index, total, data):
+        self.PlotModal.set_progress(index, total)
+        self.PlotModal.plot_data([data[name] for name in data.names])
+
+    def _on_measurement_finished(self, datasets):
+        self.PlotModal.disable_measurement_controls()
+        self.executor = None
+
+    def _on_measurement_error(self, message):
+        self.PlotModal.disable_measurement_controls()
+        self.executor = None
+        self.view1.show_error_modal(message)
+
     def calibrate_pc(self, event):
         """"
         Perform and calibrate the PC measurement
@@ -279,6 +338,15 @@ class Controller(object):
             wx.EVT_BUTTON, self.show_calibration_const
         )
 
+    def _set_subscriptions(self):
+        """
+        Listen for the progress of measurements running in the background
+        """
+        pub.subscribe(self._on_measurement_progress, 'measurement.progress')
+        pub.subscribe(self._on_measurement_finished, 'measurement.complete')
+        pub.subscribe(self._on_measurement_finished, 'measurement.cancelled')
+        pub.subscribe(self._on_measurement_error, 'measurement.error')
+
     def _parse_experiment_settings(self, config):
         measurement_list = []
         experiments_list = config["experiment_settings"]
@@ -0,0 +1,115 @@
+import ctypes
+import unittest
+
+from mock import patch
+
+from hardware.bindings import (
+    DAQmxLibrary,
+    Task,
+    DAQmx_Val_Task_Commit,
+    int32,
+    TaskHandle,
+)
+from test.utils import FakeNIDAQ
+from util.Exceptions import DAQmxError
+
+
+class CLibrary(object):
+    """A library of C function pointers which record their calls"""
+
+    def __init__(self, status=0):
+        self.calls = []
+
+        def task_control(handle, action):
+            self.calls.append(('DAQmxTaskControl', handle, action))
+            return status
+
+        def get_error_string(code, buffer, size):
+            ctypes.memmove(buffer, 'Device not found', 17)
+            return 0
+
+        prototype = ctypes.CFUNCTYPE(ctypes.c_int32, TaskHandle, int32)
+        self.DAQmxTaskControl = prototype(task_control)
+        prototype = ctypes.CFUNCTYPE(
+            ctypes.c_int32, int32, ctypes.c_void_p, ctypes.c_uint32
+        )
+        self.DAQmxGetErrorString = prototype(get_error_string)
+
+
+class DAQmxLibraryTest(unittest.TestCase):
+
+    def test_prototypes_are_declared(self):
+        library = DAQmxLibrary(CLibrary())
+
+        self.assertEqual(library.DAQmxTaskControl.argtypes,
+                         [TaskHandle, int32])
+        self.assertIs(library.DAQmxTaskControl.restype, int32)
+
+    def test_arguments_are_type_checked(self):
+        c_library = CLibrary()
+        library = DAQmxLibrary(c_library)
+
+        with self.assertRaises(ctypes.ArgumentError):
+            library.DAQmxTaskControl(TaskHandle(1), 'commit')
+        library.DAQmxTaskControl(TaskHandle(1), DAQmx_Val_Task_Commit)
+        self.assertEqual(c_library.calls, [('DAQmxTaskControl', 1, 3)])
+
+    def test_errors_are_raised(self):
+        library = DAQmxLibrary(CLibrary(status=-200220))
+
+        with self.assertRaises(DAQmxError) as context:
+            library.DAQmxTaskControl(TaskHandle(1), DAQmx_Val_Task_Commit)
+        self.assertEqual(context.exception.code, -200220)
+        self.assertIn('DAQmxTaskControl', str(context.exception))
+        self.assertIn('Device not found', str(context.exception))
+
+    def test_warnings_are_logged(self):
+        library = DAQmxLibrary(CLibrary(status=200010))
+
+        with patch('hardware.bindings.logging') as logging:
+            status = library.DAQmxTaskControl(
+                TaskHandle(1), DAQmx_Val_Task_Commit
+            )
+        self.assertEqual(status, 200010)
+        message = logging.getLogger().warning.call_args[0][0]
+        self.assertIn('warning 200010', message)
+
+    def test_closing_a_task_ignores_warnings(self):
+        fake_nidaq = FakeNIDAQ()
+        fake_nidaq.DAQmxClearTask = lambda handle: 200010
+        task = Task(DAQmxLibrary(fake_nidaq))
+
+        task.close()
+        self.assertIsNone(task.handle)
+
+    def test_python_library_status_is_checked(self):
+        fake_nidaq = FakeNIDAQ()
+        fake_nidaq.DAQmxStartTask = lambda handle: -50103
+        library = DAQmxLibrary(fake_nidaq)
+
+        with self.assertRaises(DAQmxError):
+            library.DAQmxStartTask(TaskHandle(1))
+
+
+class TaskTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake_nidaq = FakeNIDAQ()
+        self.library = DAQmxLibrary(self.fake_nidaq)
+
+    def test_task_is_cleared_by_with_block(self):
+        with Task(self.library) as task:
+            self.assertEqual(task.handle.value, 1)
+            task.start()
+
+        self.assertIsNone(task.handle)
+        self.assertEqual(self.fake_nidaq.calls, [
+            'DAQmxCreateTask', 'DAQmxStartTask', 'DAQmxClearTask'
+        ])
+
+    def test_task_is_cleared_once(self):
+        task = Task(self.library)
+        task.close()
+        task.close()
+
+        self.assertEqual(self.fake_nidaq.calls.count('DAQmxClearTask'), 1)
@@ -0,0 +1,113 @@
+import unittest
+import numpy as np
+
+from models.Dataset import Dataset
+from util.binning import log_bin, log_bin_edges, reduce_bins, reduce_errors
+from util.TimeAxis import TimeAxis
+from util.utils import bin_data, log_bin_data
+
+
+class ReduceBinsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = np.arange(20, dtype=np.float64).reshape(10, 2)
+
+    def test_matches_a_loop_over_the_bins(self):
+        expected = np.array([
+            np.mean(self.data[i * 3:(i + 1) * 3], axis=0) for i in range(3)
+        ])
+
+        np.testing.assert_array_equal(bin_data(self.data, 3), expected)
+
+    def test_keeps_the_tail(self):
+        binned = bin_data(self.data, 3, keep_tail=True)
+
+        self.assertEqual(binned.shape, (4, 2))
+        np.testing.assert_array_equal(binned[-1], self.data[-1])
+
+    def test_reductions(self):
+        data = np.array([1., 2., 9., 4., 4., 4.])
+
+        np.testing.assert_array_equal(
+            reduce_bins(data, 3, method='median'), [2., 4.]
+        )
+        np.testing.assert_array_equal(
+            reduce_bins(data, 3, method='sum'), [12., 12.]
+        )
+        with self.assertRaises(ValueError):
+            reduce_bins(data, 3, method='mode')
+
+    def test_errors_are_combined_in_quadrature(self):
+        errors = np.ones(10)
+
+        np.testing.assert_allclose(reduce_errors(errors, 4), [0.5, 0.5])
+        np.testing.assert_allclose(
+            reduce_errors(errors, 4, method='sum'), [2., 2.]
+        )
+        # the tail bin has two samples
+        np.testing.assert_allclose(
+            reduce_errors(errors, 4, keep_tail=True),
+            [0.5, 0.5, np.sqrt(0.5)]
+        )
+
+    def test_dataset_errors_are_binned_in_quadrature(self):
+        mean = np.arange(16, dtype=np.float64).reshape(8, 2)
+        dataset = Dataset.from_channels(
+            TimeAxis(0., 1., 8), mean, np.ones((8, 2)), ['PC', 'PL']
+        )
+        binned = dataset.bin(4)
+
+        np.testing.assert_allclose(binned['PL'], [4., 12.])
+        np.testing.assert_allclose(binned.error('PL'), [0.5, 0.5])
+        np.testing.assert_allclose(
+            dataset.bin(4, method='sum').error('PC'), [2., 2.]
+        )
+
+    def test_along_the_samples_of_a_dataset(self):
+        dataset = Dataset(TimeAxis(0., 1., 10), self.data.T.copy())
+        binned = bin_data(dataset, 4, keep_tail=True, method='sum')
+
+        self.assertEqual((binned.t0, binned.dt, len(binned)), (1.5, 4., 3))
+        np.testing.assert_array_equal(
+            binned[:, 1:], bin_data(self.data, 4, keep_tail=True,
+                                    method='sum')
+        )
+
+
+class LogBinTest(unittest.TestCase):
+
+    def setUp(self):
+        self.times = np.arange(-10, 1000) * 1e-3
+        self.values = np.exp(-self.times / 0.1)
+
+    def test_edges(self):
+        np.testing.assert_allclose(
+            log_bin_edges(1e-3, 1., 3), [1e-3, 1e-2, 1e-1, 1.]
+        )
+
+    def test_bins_between_positive_times(self):
+        bin_times, binned = log_bin(self.times, self.values, 3, t_end=0.999)
+
+        # the first bin holds 1 to 9 ms
+        self.assertAlmostEqual(bin_times[0], 5e-3)
+        self.assertAlmostEqual(binned[0], np.mean(self.values[11:20]))
+        self.assertEqual(len(bin_times), 3)
+        self.assertTrue(np.all(np.diff(np.log10(bin_times)) > 0.5))
+
+    def test_empty_bins_are_left_out(self):
+        bin_times, binned = log_bin(self.times, self.values, 60, t_end=0.999)
+
+        self.assertLess(len(bin_times), 60)
+        self.assertTrue(np.all(np.diff(bin_times) > 0))
+        self.assertEqual(binned.shape, bin_times.shape)
+
+    def test_log_bin_data(self):
+        data = np.column_stack((self.times, self.values, 2 * self.values))
+        binned = log_bin_data(data, 10, method='median')
+
+        self.assertEqual(binned.shape[1], 3)
+        np.testing.assert_allclose(binned[:, 2], 2 * binned[:, 1])
+        np.testing.assert_allclose(
+            log_bin_data(Dataset.from_array(data), 10, method='median'),
+            binned
+        )
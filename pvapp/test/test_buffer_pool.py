@@ -0,0 +1,43 @@
+import unittest
+import numpy as np
+
+from util.BufferPool import BufferPool
+
+
+class BufferPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = BufferPool(max_free=2)
+
+    def test_arrays_are_aligned(self):
+        for length in [1, 3, 1000]:
+            for dtype in [np.float64, np.int16]:
+                array = self.pool.acquire(length, dtype)
+                self.assertEqual(array.shape, (length,))
+                self.assertEqual(array.dtype, dtype)
+                self.assertEqual(array.ctypes.data % BufferPool.ALIGNMENT, 0)
+
+    def test_released_arrays_are_reused(self):
+        array = self.pool.acquire(100)
+        self.pool.release(array)
+
+        self.assertIs(self.pool.acquire(100), array)
+        self.assertEqual(self.pool.allocations, 1)
+
+    def test_arrays_are_keyed_by_length_and_dtype(self):
+        array = self.pool.acquire(100)
+        self.pool.release(array)
+
+        self.assertIsNot(self.pool.acquire(101), array)
+        self.assertIsNot(self.pool.acquire(100, np.int16), array)
+        self.assertEqual(self.pool.allocations, 3)
+
+    def test_keeps_at_most_max_free(self):
+        arrays = [self.pool.acquire(10) for i in range(3)]
+        for array in arrays + arrays:
+            self.pool.release(array)
+
+        acquired = [self.pool.acquire(10) for i in range(3)]
+        self.assertEqual(self.pool.allocations, 4)
+        # released twice, but only handed out once
+        self.assertIsNot(acquired[0], acquired[1])
@@ -0,0 +1,154 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from models.Dataset import Dataset
+from util.TimeAxis import TimeAxis
+from util.utils import bin_data, load_data, save_data
+
+
+class DatasetTest(unittest.TestCase):
+
+    def setUp(self):
+        # (samples, channels), as in the array form
+        self.samples = np.arange(24, dtype=np.float64).reshape(8, 3)
+        self.dataset = Dataset(
+            TimeAxis(1., 0.5, 8), self.samples.T.copy(),
+            ['Reference', 'PC', 'PL']
+        )
+
+    def test_array_form_has_the_time_column(self):
+        data = np.asarray(self.dataset)
+
+        self.assertEqual(self.dataset.shape, (8, 4))
+        self.assertEqual(data.shape, (8, 4))
+        np.testing.assert_array_equal(data[:, 0], 1. + 0.5 * np.arange(8))
+        np.testing.assert_array_equal(data[:, 1:], self.samples)
+
+    def test_indexing_uses_array_columns(self):
+        np.testing.assert_array_equal(
+            self.dataset[:, 0], 1. + 0.5 * np.arange(8)
+        )
+        np.testing.assert_array_equal(self.dataset[:, 2], self.samples[:, 1])
+        np.testing.assert_array_equal(self.dataset[::2, 0], [1., 2., 3., 4.])
+        self.assertEqual(self.dataset[-1, 0], 4.5)
+
+        # the measured columns are views, not copies
+        self.assertTrue(np.may_share_memory(
+            self.dataset[:, 1:4], self.dataset.values
+        ))
+        np.testing.assert_array_equal(self.dataset[:, 1:4], self.samples)
+
+    def test_channels_are_contiguous_named_views(self):
+        pc = self.dataset['PC']
+
+        self.assertTrue(pc.flags['C_CONTIGUOUS'])
+        np.testing.assert_array_equal(pc, self.samples[:, 1])
+        self.assertIsNone(self.dataset.error('PC'))
+        with self.assertRaises(KeyError):
+            self.dataset['Temperature']
+
+    def test_assigns_measured_columns(self):
+        self.dataset['Reference'] *= -1
+        np.testing.assert_array_equal(
+            self.dataset.values[0], -3 * np.arange(8)
+        )
+        self.dataset[:, 2] = 0
+        self.assertFalse(self.dataset['PC'].any())
+        with self.assertRaises(TypeError):
+            self.dataset[:, 0] = 0
+
+    def test_copy_on_write_copies_only_the_channel_assigned(self):
+        shared = self.dataset.copy_on_write()
+
+        self.assertTrue(np.may_share_memory(
+            shared.values, self.dataset.values
+        ))
+        with self.assertRaises(ValueError):
+            shared['PC'] *= -1
+
+        # the dataset copied from can still be written
+        self.assertTrue(self.dataset['PC'].flags.writeable)
+
+        shared['PC'] = -shared['PC']
+        np.testing.assert_array_equal(shared['PC'], -self.samples[:, 1])
+        np.testing.assert_array_equal(self.dataset['PC'], self.samples[:, 1])
+        self.assertTrue(np.may_share_memory(shared['PL'], self.dataset['PL']))
+        self.assertFalse(np.may_share_memory(shared['PC'], self.dataset['PC']))
+
+        # the channels are stacked again when needed, as a copy
+        np.testing.assert_array_equal(shared[2:4].values[1],
+                                      -self.samples[2:4, 1])
+        np.testing.assert_array_equal(np.asarray(shared)[:, 3],
+                                      self.samples[:, 2])
+        self.assertFalse(np.may_share_memory(
+            shared.values, self.dataset.values
+        ))
+
+    def test_any_number_of_channels(self):
+        names = ['Reference', 'PC', 'PL', 'Temperature']
+        mean = np.random.rand(5, 4)
+        std_error = np.random.rand(5, 4)
+        dataset = Dataset.from_channels(
+            TimeAxis(0., 1., 5), mean, std_error, names
+        )
+
+        self.assertEqual(dataset.shape, (5, 9))
+        np.testing.assert_array_equal(dataset['Temperature'], mean[:, 3])
+        np.testing.assert_array_equal(
+            dataset.error('Temperature'), std_error[:, 3]
+        )
+
+    def test_crop_moves_t0(self):
+        cropped = self.dataset.crop_time(start_time=2., end_time=4.)
+
+        self.assertEqual((cropped.t0, cropped.dt), (2.5, 0.5))
+        np.testing.assert_array_equal(
+            np.asarray(cropped),
+            np.asarray(self.dataset)[(self.dataset[:, 0] > 2.) &
+                                     (self.dataset[:, 0] < 4.)]
+        )
+
+    def test_bin_matches_bin_data(self):
+        binned = self.dataset.bin(3)
+
+        self.assertEqual((binned.t0, binned.dt, len(binned)), (1.5, 1.5, 2))
+        np.testing.assert_allclose(
+            np.asarray(binned), bin_data(np.asarray(self.dataset), 3)
+        )
+
+
+class DatasetFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dataset = Dataset.from_channels(
+            TimeAxis(0., 1e-3, 5), np.random.rand(5, 4), np.random.rand(5, 4),
+            ['Reference', 'PC', 'PL', 'Temperature']
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_saved_without_time_column(self):
+        save_data(self.dataset, 'dataset', self.directory)
+        path = os.path.join(self.directory, 'dataset.tsv')
+
+        self.assertEqual(np.loadtxt(path).shape, (5, 8))
+
+        loaded = load_data(path)
+        self.assertEqual(loaded.time, self.dataset.time)
+        self.assertEqual(loaded.names, self.dataset.names)
+        np.testing.assert_allclose(loaded.values, self.dataset.values)
+
+    def test_loads_files_with_time_column(self):
+        dataset = Dataset(TimeAxis(0., 1e-3, 5), np.random.rand(3, 5))
+        path = os.path.join(self.directory, 'legacy.tsv')
+        save_data(np.asarray(dataset), 'legacy', self.directory)
+
+        loaded = load_data(path)
+        self.assertAlmostEqual(loaded.dt, 1e-3)
+        self.assertEqual(loaded.names, ['Reference', 'PC', 'PL'])
+        np.testing.assert_allclose(np.asarray(loaded), np.asarray(dataset))
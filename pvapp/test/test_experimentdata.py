@@ -0,0 +1,92 @@
+import unittest
+import numpy as np
+
+from mock import patch
+
+from models.Dataset import Dataset
+from models.ExperimentData import ExperimentData
+from models.ExperimentSettings import ExperimentSettings
+from util.TimeAxis import TimeAxis
+
+
+class ExperimentDataTest(unittest.TestCase):
+
+    def setUp(self):
+        values = np.random.RandomState(0).rand(3, 100)
+        self.raw = Dataset(TimeAxis(0., 0.1, 100), values)
+        self.data = ExperimentData(metadata=ExperimentSettings())
+        self.data.updateRawData(self.raw)
+
+    def test_transforms_leave_the_raw_data(self):
+        self.data.invertHandler('PC')
+        self.data.offsetHandler(offset_type='y', offset=1., channel='PL')
+        self.data.binHandler(4)
+
+        np.testing.assert_array_equal(self.data.RawData.values,
+                                      self.raw.values)
+        np.testing.assert_allclose(
+            self.data.Data['PC'], -self.raw.bin(4)['PC']
+        )
+        np.testing.assert_allclose(
+            self.data.Data['PL'], self.raw.bin(4)['PL'] + 1.
+        )
+
+    def test_untouched_channels_share_the_raw_data(self):
+        self.assertTrue(np.may_share_memory(self.data.RawData.values,
+                                            self.raw.values))
+        # the caller's dataset is left writable
+        self.raw['PC'] *= 1
+
+        self.data.invertHandler('PC')
+        inverted = self.data.Data
+
+        self.assertTrue(np.may_share_memory(inverted['PL'], self.raw['PL']))
+        self.assertFalse(np.may_share_memory(inverted['PC'], self.raw['PC']))
+
+    def test_revert_and_undo(self):
+        self.data.offsetHandler(offset_type='start_x', offset=2.)
+        self.data.binHandler(4)
+        # the samples after t = 2 s
+        self.assertEqual(len(self.data.Data), 19)
+
+        self.data.undo()
+        self.assertEqual(len(self.data.Data), 79)
+        self.data.revertData()
+        self.assertIs(self.data.Data, self.data.RawData)
+
+    def test_inverting_twice_cancels(self):
+        self.data.invertHandler('PL')
+        self.data.invertHandler('PL')
+
+        self.assertEqual(self.data.operations, [])
+        self.assertTrue(self.data.metadata.inverted_channels['PL'])
+
+    def test_only_the_last_two_stages_are_kept(self):
+        for offset in [1., 2., 3., 4.]:
+            self.data.offsetHandler(offset_type='y', offset=offset,
+                                    channel='PL')
+            self.data.Data
+
+        kept = [result for operation, result in self.data._stages]
+        self.assertEqual(kept[:2], [None, None])
+        np.testing.assert_allclose(kept[3]['PL'], self.raw['PL'] + 10.)
+
+        # undoing past the kept stages recomputes from the raw data
+        self.data.undo()
+        self.data.undo()
+        np.testing.assert_allclose(self.data.Data['PL'], self.raw['PL'] + 3.)
+
+    def test_only_the_changed_stage_is_recomputed(self):
+        self.data.invertHandler('PC')
+        inverted = self.data.Data
+        self.data.binHandler(2)
+        self.data.Data
+
+        with patch.object(Dataset, 'copy_on_write') as copy:
+            self.data.binHandler(5)
+            binned = self.data.Data
+
+        # the inversion was not redone, and binning again rebins it
+        self.assertFalse(copy.called)
+        self.assertEqual(len(binned), 20)
+        np.testing.assert_allclose(binned['PC'], inverted.bin(5)['PC'])
@@ -1,6 +1,8 @@
 import unittest
 import numpy as np
 from models.ExperimentSettings import ExperimentSettings
+from models.InputChannel import InputChannel
+from util.Exceptions import PVInputError
 
 
 class ExperimentSettingsTest(unittest.TestCase):
@@ -71,3 +73,25 @@ class ExperimentSettingsTest(unittest.TestCase):
         self.assertEqual(self.meta_data.sample_rate, 1.2e6)
 
 
+
+    def test_input_channels_from_dicts(self):
+        settings = ExperimentSettings(
+            input_channels=self.meta_data.as_dict()['input_channels']
+        )
+        settings.input_channels[2].voltage_range = 2
+
+        self.assertEqual(
+            [c.physical_channel for c in settings.input_channels],
+            ['ai0', 'ai1', 'ai2']
+        )
+        self.assertEqual(settings.input_voltage_range, 10)
+
+        settings.input_voltage_range = 5
+        self.assertEqual(
+            [c.voltage_range for c in settings.input_channels], [5, 5, 5]
+        )
+
+    def test_unsupported_input_range(self):
+        self.assertRaises(
+            PVInputError, InputChannel, 'PL', 'ai2', 'Default', 3
+        )
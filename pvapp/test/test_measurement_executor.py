@@ -0,0 +1,125 @@
+import unittest
+
+from mock import patch
+import numpy as np
+
+from hardware.MeasurementExecutor import MeasurementExecutor
+from hardware.MeasurementHandler import MeasurementHandler
+from models.ExperimentSettings import ExperimentSettings
+from models.LightPulse import LightPulse
+
+
+@patch("hardware.MeasurementHandler.WaveformThread", autospec=True)
+class MeasurementExecutorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = ExperimentSettings()
+        self.lp = LightPulse(self.settings)
+        self.messages = []
+
+    def publish(self, topic, **kwargs):
+        self.messages.append((topic, kwargs))
+
+    def make_handler(self, num_measurements):
+        handler = MeasurementHandler()
+        for i in range(num_measurements):
+            handler.add_to_queue(self.lp.create_waveform(), self.settings)
+
+        def single_measurement():
+            handler._queue.popleft()
+            return np.array([[0., 1., 2., 3.]])
+
+        handler.single_measurement = single_measurement
+        # the pipelined series runs the two stages separately
+        handler._acquire = lambda element: np.array([[0., 1., 2., 3.]])
+        handler._reduce = lambda element, acquired: acquired
+        return handler
+
+    def topics(self):
+        return [topic for topic, kwargs in self.messages]
+
+    def test_runs_queue_on_worker_thread(self, mock_waveform_thread):
+        handler = self.make_handler(3)
+        executor = MeasurementExecutor(handler, self.publish)
+        executor.start()
+        executor.join(5)
+
+        self.assertFalse(executor.is_alive())
+        self.assertEqual(self.topics(), [
+            'measurement.started',
+            'measurement.progress',
+            'measurement.progress',
+            'measurement.progress',
+            'measurement.complete'
+        ])
+        self.assertEqual(self.messages[0][1], {'total': 3})
+        self.assertEqual(self.messages[3][1]['index'], 3)
+        self.assertEqual(len(self.messages[-1][1]['datasets']), 3)
+        self.assertTrue(handler.is_queue_empty())
+
+    def test_cancel_stops_between_measurements(self, mock_waveform_thread):
+        handler = self.make_handler(3)
+        executor = MeasurementExecutor(handler, self.publish)
+
+        def publish(topic, **kwargs):
+            self.publish(topic, **kwargs)
+            if topic == 'measurement.progress':
+                executor.cancel()
+
+        executor.publish = publish
+        executor.start()
+        executor.join(5)
+
+        self.assertEqual(self.topics(), [
+            'measurement.started',
+            'measurement.progress',
+            'measurement.cancelled'
+        ])
+        self.assertTrue(handler.is_queue_empty())
+
+    def test_pause_holds_the_series(self, mock_waveform_thread):
+        handler = self.make_handler(2)
+        executor = MeasurementExecutor(handler, self.publish)
+        executor.pause()
+        executor.start()
+
+        executor.join(0.1)
+        self.assertTrue(executor.is_alive())
+        self.assertEqual(self.topics(), ['measurement.started'])
+
+        executor.resume()
+        executor.join(5)
+        self.assertEqual(self.topics()[-1], 'measurement.complete')
+
+    def test_pipelined_series_processes_each_dataset(self,
+                                                     mock_waveform_thread):
+        handler = self.make_handler(3)
+        processed = []
+
+        def process(index, total, data):
+            processed.append(index)
+            self.assertEqual(len(self.topics()), index)
+
+        executor = MeasurementExecutor(handler, self.publish,
+                                       process=process, pipelined=True)
+        executor.start()
+        executor.join(5)
+
+        self.assertEqual(processed, [1, 2, 3])
+        self.assertEqual(self.topics()[-1], 'measurement.complete')
+
+    def test_errors_are_published(self, mock_waveform_thread):
+        handler = self.make_handler(1)
+
+        def single_measurement():
+            raise RuntimeError('nidaq call failed')
+
+        handler.single_measurement = single_measurement
+        executor = MeasurementExecutor(handler, self.publish)
+        executor.start()
+        executor.join(5)
+
+        self.assertEqual(self.messages[-1],
+                         ('measurement.error',
+                          {'message': 'nidaq call failed'}))
+        self.assertTrue(handler.is_queue_empty())
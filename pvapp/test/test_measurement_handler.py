@@ -1,3 +1,4 @@
+import threading
 import unittest
 
 from mock import patch
@@ -8,6 +9,16 @@ from hardware.MeasurementHandler import MeasurementHandler
 from models.ExperimentSettings import ExperimentSettings
 
 from testfixtures import log_capture
+from test.utils import FakeNIDAQ
+from util.Exceptions import DAQmxError
+from util.TimeAxis import TimeAxis
+
+
+def sample_at_one_hertz(mock_waveform_thread):
+    """Gives the datasets of the mocked threads a time step of 1 s"""
+    mock_waveform_thread.return_value.time_axis.side_effect = (
+        lambda num_samples: TimeAxis(0, 1, num_samples)
+    )
 
 
 @patch("hardware.MeasurementHandler.WaveformThread", autospec=True)
@@ -28,35 +39,40 @@ class MeasurementHandlerTest(unittest.TestCase):
         # handler._run_thread()
 
     def test_single_measurement_no_averaging(self, mock_waveform_thread):
+        sample_at_one_hertz(mock_waveform_thread)
 
         handler = MeasurementHandler()
         handler.add_to_queue(self.lp.create_waveform(), self.settings)
-        return_tuple = (np.array([1, 2, 3, 4, 5, 6]), np.array([0, 1]))
+        read_data = np.array([[1, 3, 5], [2, 4, 6]])
 
         with patch.object(handler, '_run_thread',
-                          return_value=return_tuple) as method:
+                          return_value=read_data) as method:
             test_dataset = handler.single_measurement()
             self.assertEqual(1, method.call_count)
+            # a single shot has no standard error
+            nan = np.nan
             np.testing.assert_array_equal(
                 test_dataset,
-                np.array([[0, 1, 3, 5], [1, 2, 4, 6]])
+                np.array([[0, 1, 3, 5, nan, nan, nan],
+                          [1, 2, 4, 6, nan, nan, nan]])
             )
 
         self.assertEqual(len(handler._queue), 0)
 
     def test_single_measurement_with_averaging(self, mock_waveform_thread):
+        sample_at_one_hertz(mock_waveform_thread)
         # setup
         settings = ExperimentSettings()
         settings.averaging = 2
         handler = MeasurementHandler()
-        return_tuple = [
-            (np.array([2, 3, 4, 5, 6, 7]), np.array([0, 1])),
-            (np.array([3, 4, 5, 6, 7, 8]), np.array([0, 1])),
+        read_data = [
+            np.array([[2, 4, 6], [3, 5, 7]]),
+            np.array([[3, 5, 7], [4, 6, 8]]),
         ]
 
         handler.add_to_queue(self.lp.create_waveform(), settings)
 
-        with patch.object(handler, '_run_thread', side_effect=return_tuple) as method:
+        with patch.object(handler, '_run_thread', side_effect=read_data) as method:
             # perform
             test_dataset = handler.single_measurement()
 
@@ -64,11 +80,35 @@ class MeasurementHandlerTest(unittest.TestCase):
             self.assertEqual(2, method.call_count)
             np.testing.assert_array_equal(
                 test_dataset,
-                np.array([[0, 2.5, 4.5, 6.5], [1, 3.5, 5.5, 7.5]])
+                np.array([[0, 2.5, 4.5, 6.5, 0.5, 0.5, 0.5],
+                          [1, 3.5, 5.5, 7.5, 0.5, 0.5, 0.5]])
             )
 
         self.assertEqual(len(handler._queue), 0)
 
+    def test_single_measurement_hardware_averaging(self, mock_waveform_thread):
+        sample_at_one_hertz(mock_waveform_thread)
+        settings = ExperimentSettings()
+        settings.averaging = 2
+        handler = MeasurementHandler(hardware_averaging=True)
+        handler.add_to_queue(self.lp.create_waveform(), settings)
+
+        # two shots of two samples, one after the other
+        read_data = np.array([[2, 4, 6], [3, 5, 7], [4, 6, 8], [5, 7, 9]])
+
+        with patch.object(handler, '_run_thread',
+                          return_value=read_data) as method:
+            test_dataset = handler.single_measurement()
+
+            self.assertEqual(1, method.call_count)
+            np.testing.assert_array_equal(
+                test_dataset,
+                np.array([[0, 3, 5, 7, 1, 1, 1], [1, 4, 6, 8, 1, 1, 1]])
+            )
+
+        self.assertEqual(
+            mock_waveform_thread.call_args[1]['repeats'], 2
+        )
 
     def test_add_to_queue(self, mock_waveform_thread):
         handler = MeasurementHandler()
@@ -150,3 +190,212 @@ class MeasurementHandlerTest(unittest.TestCase):
             ('root', 'INFO', 'Measurement #3 complete'),
             ('root', 'INFO', 'Total: 3 measurements performed'),
         )
+
+
+class MeasurementHandlerPersistentTaskTest(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = ExperimentSettings()
+        self.settings.channel_name = 'ao1'
+        self.lp = LightPulse(self.settings)
+        self.fake_nidaq = FakeNIDAQ()
+        patcher = patch("hardware.backend.nidaq", self.fake_nidaq, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_tasks_are_created_once_for_all_repeats(self):
+        handler = MeasurementHandler(persistent_tasks=True)
+        handler.add_to_queue(self.lp.create_waveform(), self.settings)
+        daq_io_thread, metadata = handler._queue[0]
+
+        buffers = []
+        for i in range(3):
+            data = handler._run_thread(daq_io_thread, metadata)
+            buffers.append(data)
+        daq_io_thread.stop()
+
+        calls = self.fake_nidaq.calls
+        self.assertEqual(calls.count('DAQmxCreateTask'), 2)
+        self.assertEqual(calls.count('DAQmxWriteAnalogF64'), 1)
+        self.assertEqual(calls.count('DAQmxTaskControl'), 2)
+        self.assertEqual(calls.count('DAQmxStartTask'), 6)
+        self.assertEqual(calls.count('DAQmxClearTask'), 2)
+        # every repeat is read into the same buffer
+        self.assertTrue(np.may_share_memory(buffers[0], buffers[1]))
+
+    def test_tasks_are_recreated_without_persistence(self):
+        handler = MeasurementHandler()
+        handler.add_to_queue(self.lp.create_waveform(), self.settings)
+        daq_io_thread, metadata = handler._queue[0]
+
+        for i in range(3):
+            handler._run_thread(daq_io_thread, metadata)
+
+        self.assertEqual(self.fake_nidaq.calls.count('DAQmxCreateTask'), 6)
+
+    def test_tasks_are_cleared_when_a_read_fails(self):
+        # a read timing out
+        self.fake_nidaq.DAQmxReadAnalogF64 = lambda *args: -200284
+        handler = MeasurementHandler()
+        handler.add_to_queue(self.lp.create_waveform(), self.settings)
+        daq_io_thread, metadata = handler._queue[0]
+
+        with self.assertRaises(DAQmxError):
+            handler._run_thread(daq_io_thread, metadata)
+        self.assertEqual(self.fake_nidaq.calls.count('DAQmxClearTask'), 2)
+        self.assertIsNone(daq_io_thread.taskHandle_Read)
+        self.assertIsNone(daq_io_thread.taskHandle_Write)
+
+    def test_repeats_are_read_in_one_task(self):
+        self.settings.averaging = 4
+        handler = MeasurementHandler(hardware_averaging=True)
+        handler.add_to_queue(self.lp.create_waveform(), self.settings)
+        daq_io_thread, metadata = handler._queue[0]
+
+        data = handler._run_thread(daq_io_thread, metadata)
+
+        calls = self.fake_nidaq.calls
+        self.assertEqual(calls.count('DAQmxCreateTask'), 2)
+        self.assertEqual(calls.count('DAQmxReadAnalogF64'), 1)
+        samples = daq_io_thread.samples_per_shot
+        self.assertEqual(self.fake_nidaq.sample_counts,
+                         [daq_io_thread.periodLength * 4, samples * 4])
+        self.assertEqual(data.shape, (4 * samples, 3))
+        self.assertEqual(daq_io_thread.time.shape, (samples,))
+
+        shots = handler._shots_view(data, 4)
+        self.assertEqual(shots.shape, (4, samples, 3))
+        self.assertTrue(np.may_share_memory(shots, data))
+        # the fake counts samples, so shot k starts k shots further on
+        np.testing.assert_array_equal(shots[:, 0, 0],
+                                      np.arange(4) * samples)
+
+
+@patch("hardware.MeasurementHandler.WaveformThread", autospec=True)
+class MeasurementHandlerPipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = ExperimentSettings()
+        self.lp = LightPulse(self.settings)
+        self.handler = MeasurementHandler()
+        self.acquired = []
+
+        def acquire(element):
+            self.acquired.append(element)
+            return len(self.acquired)
+
+        self.handler._acquire = acquire
+        self.handler._reduce = lambda element, acquired: acquired
+
+    def fill_queue(self, num_measurements):
+        for i in range(num_measurements):
+            self.handler.add_to_queue(self.lp.create_waveform(), self.settings)
+
+    def test_results_are_in_queue_order(self, mock_waveform_thread):
+        self.fill_queue(5)
+        progress = []
+
+        def progress_callback(index, total, data):
+            progress.append((index, total, data))
+
+        datasets = self.handler.pipelined_series_measurement(
+            progress_callback=progress_callback
+        )
+
+        self.assertEqual(datasets, [1, 2, 3, 4, 5])
+        self.assertEqual(progress[0], (1, 5, 1))
+        self.assertEqual(progress[-1], (5, 5, 5))
+        self.assertTrue(self.handler.is_queue_empty())
+
+    def test_acquisition_overlaps_processing(self, mock_waveform_thread):
+        self.fill_queue(2)
+        next_acquired = threading.Event()
+        acquire = self.handler._acquire
+
+        def acquire_and_signal(element):
+            result = acquire(element)
+            if result == 2:
+                next_acquired.set()
+            return result
+
+        self.handler._acquire = acquire_and_signal
+        overlapped = []
+
+        def progress_callback(index, total, data):
+            if index == 1:
+                # the second experiment is acquired while this one saves
+                overlapped.append(next_acquired.wait(5))
+
+        self.handler.pipelined_series_measurement(
+            progress_callback=progress_callback
+        )
+        self.assertEqual(overlapped, [True])
+
+    def test_slow_processing_holds_back_acquisition(self, mock_waveform_thread):
+        self.fill_queue(6)
+        release = threading.Event()
+        acquired_while_blocked = []
+
+        def progress_callback(index, total, data):
+            if index == 1:
+                # give the acquisition time to run as far ahead as it can
+                release.wait(0.2)
+                acquired_while_blocked.append(len(self.acquired))
+
+        datasets = self.handler.pipelined_series_measurement(
+            progress_callback=progress_callback, max_pending=2
+        )
+
+        # one being processed, two pending and one waiting to be queued
+        self.assertEqual(acquired_while_blocked, [4])
+        self.assertEqual(len(datasets), 6)
+
+    def test_processing_errors_are_raised(self, mock_waveform_thread):
+        self.fill_queue(3)
+
+        def progress_callback(index, total, data):
+            raise IOError('disk full')
+
+        self.assertRaises(
+            IOError,
+            self.handler.pipelined_series_measurement,
+            progress_callback=progress_callback
+        )
+
+
+class MeasurementHandlerAbortTest(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = ExperimentSettings()
+        self.settings.channel_name = 'ao1'
+        self.lp = LightPulse(self.settings)
+        self.fake_nidaq = FakeNIDAQ()
+        patcher = patch("hardware.backend.nidaq", self.fake_nidaq, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_abort_ends_the_series(self):
+        progress = []
+
+        def acquisition_progress(read, total):
+            progress.append(read)
+            # abort part way through the second measurement
+            if len(progress) == 4:
+                handler.abort()
+
+        handler = MeasurementHandler(acquisition_progress=acquisition_progress)
+        for i in range(3):
+            handler.add_to_queue(self.lp.create_waveform(), self.settings)
+        for daq_io_thread, metadata in handler._queue:
+            # three chunks per measurement
+            daq_io_thread.chunk_size = 500
+
+        datasets = handler.series_measurement()
+
+        self.assertEqual(len(datasets), 1)
+        self.assertEqual(self.fake_nidaq.calls.count('DAQmxClearTask'), 4)
+
+        # clearing the queue readies the handler for the next series
+        handler.clear_queue()
+        handler.add_to_queue(self.lp.create_waveform(), self.settings)
+        self.assertEqual(len(handler.series_measurement()), 1)
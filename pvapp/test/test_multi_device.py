@@ -0,0 +1,123 @@
+import threading
+import unittest
+
+from hardware.MultiDeviceHandler import MultiDeviceHandler
+from hardware.simulated import SimulatedDevice
+from models.ExperimentSettings import ExperimentSettings
+from models.LightPulse import LightPulse
+
+
+class MultiDeviceHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = ExperimentSettings(channel='High (2A/V)')
+        self.devices = [
+            SimulatedDevice(device_id='Sim1', realtime=False, seed=0),
+            # the second tester has a sample with twice the signal
+            SimulatedDevice(device_id='Sim2', realtime=False, seed=1,
+                            pc_gain=1.0),
+        ]
+        self.handler = MultiDeviceHandler(self.devices)
+
+    def queue(self, num_measurements):
+        for i in range(num_measurements):
+            self.handler.add_to_queue(
+                LightPulse(self.settings).create_waveform(), self.settings
+            )
+
+    def test_plan_is_dealt_to_the_devices_in_turn(self):
+        self.queue(5)
+
+        self.assertEqual(self.handler.queue_length(), 5)
+        self.assertEqual(self.handler.handlers[0].queue_length(), 3)
+        self.assertEqual(self.handler.handlers[1].queue_length(), 2)
+        self.assertEqual(len(self.handler.as_list()), 5)
+
+    def test_series_is_merged_in_plan_order(self):
+        self.queue(4)
+        threads = set()
+        progress_calls = []
+
+        def progress(index, total, data):
+            progress_calls.append(index)
+            threads.add(threading.current_thread())
+
+        datasets = self.handler.series_measurement(progress_callback=progress)
+
+        self.assertEqual(progress_calls, [1, 2, 3, 4])
+        self.assertEqual(threads, set([threading.current_thread()]))
+        self.assertTrue(self.handler.is_queue_empty())
+
+        # odd measurements ran on Sim1, even ones on Sim2
+        peak_pc = [data[:, 2].max() for data in datasets]
+        self.assertLess(peak_pc[0], peak_pc[1])
+        self.assertLess(peak_pc[2], peak_pc[3])
+        self.assertAlmostEqual(peak_pc[0], peak_pc[2], places=2)
+
+    def test_devices_acquire_in_parallel(self):
+        running = []
+        overlapped = []
+        lock = threading.Lock()
+
+        for handler in self.handler.handlers:
+            original = handler.single_measurement
+
+            def single_measurement(original=original):
+                with lock:
+                    running.append(1)
+                    overlapped.append(len(running))
+                try:
+                    # leave time for the other device to start
+                    threading.Event().wait(0.05)
+                    return original()
+                finally:
+                    with lock:
+                        running.pop()
+
+            handler.single_measurement = single_measurement
+
+        self.queue(2)
+        datasets = self.handler.series_measurement()
+
+        self.assertEqual(len(datasets), 2)
+        self.assertEqual(max(overlapped), 2)
+
+    def test_failing_device_raises_and_stops_the_series(self):
+        self.queue(4)
+
+        def fail():
+            raise RuntimeError('Device Sim2 is not responding')
+
+        self.handler.handlers[1].single_measurement = fail
+
+        with self.assertRaises(RuntimeError):
+            self.handler.series_measurement()
+
+    def test_stopped_series_keeps_plan_order(self):
+        self.queue(4)
+        calls = []
+        lock = threading.Lock()
+
+        def before_measurement():
+            with lock:
+                calls.append(1)
+                return len(calls) <= 3
+
+        datasets = self.handler.series_measurement(
+            before_measurement=before_measurement
+        )
+
+        self.assertEqual(len(datasets), 3)
+
+    def test_burst_series_is_merged_in_plan_order(self):
+        self.queue(5)
+        progress_calls = []
+
+        datasets = self.handler.burst_series_measurement(
+            progress_callback=lambda i, total, data: progress_calls.append(i)
+        )
+
+        self.assertEqual(progress_calls, [1, 2, 3, 4, 5])
+        peak_pc = [data[:, 2].max() for data in datasets]
+        self.assertLess(peak_pc[0], peak_pc[1])
+        self.assertLess(peak_pc[2], peak_pc[3])
@@ -0,0 +1,40 @@
+import unittest
+import numpy as np
+
+from util.RunningStatistics import RunningStatistics
+
+
+class RunningStatisticsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.shots = np.random.RandomState(0).normal(size=(20, 50))
+
+    def test_matches_batch_statistics(self):
+        stats = RunningStatistics(50)
+        for shot in self.shots:
+            stats.update(shot)
+
+        self.assertEqual(stats.count, 20)
+        np.testing.assert_allclose(stats.mean, self.shots.mean(axis=0))
+        np.testing.assert_allclose(
+            stats.variance(), self.shots.var(axis=0, ddof=1)
+        )
+        np.testing.assert_allclose(
+            stats.standard_error(),
+            self.shots.std(axis=0, ddof=1) / np.sqrt(20)
+        )
+
+    def test_updates_in_place(self):
+        stats = RunningStatistics(50)
+        mean = stats.mean
+        for shot in self.shots:
+            stats.update(shot)
+
+        self.assertIs(stats.mean, mean)
+
+    def test_single_sample_has_no_variance(self):
+        stats = RunningStatistics(3)
+        stats.update(np.array([1., 2., 3.]))
+
+        np.testing.assert_array_equal(stats.mean, [1, 2, 3])
+        self.assertTrue(np.all(np.isnan(stats.standard_error())))
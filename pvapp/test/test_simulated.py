@@ -0,0 +1,407 @@
+import time
+import unittest
+import numpy as np
+
+from mock import patch
+
+from hardware.daq import WaveformThread
+from hardware.MeasurementHandler import MeasurementHandler
+from hardware.simulated import SimulatedDevice
+from models.ExperimentSettings import ExperimentSettings
+from models.LightPulse import LightPulse
+from util.StreamingDecimator import decimate
+from util.utils import bin_data
+
+
+class SimulatedDeviceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = ExperimentSettings(channel='High (2A/V)')
+        self.waveform = LightPulse(self.settings).create_waveform()
+        self.device = SimulatedDevice(realtime=False, seed=0)
+
+    def make_thread(self, **kwargs):
+        thread_kwargs = dict(
+            waveform=self.waveform,
+            Channel='ao1',
+            Time=np.float64(1.011),
+            input_voltage_range=10,
+            output_voltage_range=self.settings.output_voltage_range,
+            input_sample_rate=self.settings.sample_rate,
+            output_sample_rate=self.settings.output_sample_rate,
+            backend=self.device
+        )
+        thread_kwargs.update(kwargs)
+        return WaveformThread(**thread_kwargs)
+
+    def acquire(self, thread):
+        thread.setup()
+        thread.run()
+        thread.stop()
+        return thread.channel_view()
+
+    def test_reference_follows_the_light(self):
+        data = self.acquire(self.make_thread())
+
+        self.assertEqual(data.shape, (1213, 3))
+        drive = self.waveform[:data.shape[0]]
+        correlation = np.corrcoef(-drive, data[:, 0])[0, 1]
+        self.assertGreater(correlation, 0.99)
+
+        # carriers raise the conductance and give (inverted) luminescence
+        peak = np.argmax(data[:, 0])
+        self.assertGreater(data[peak, 1], self.device.pc_dark)
+        self.assertLess(data[peak, 2], 0)
+
+        self.assertEqual(self.device.tasks, [])
+
+    def test_inputs_are_clipped_to_range(self):
+        self.device.reference_gain = 100.
+        data = self.acquire(self.make_thread(input_voltage_range=1))
+
+        self.assertEqual(np.max(data[:, 0]), 1.)
+
+    def test_inputs_are_quantised(self):
+        self.device.noise = 0.
+        data = self.acquire(self.make_thread(input_voltage_range=1))
+
+        lsb = 2. / 2 ** 16
+        np.testing.assert_allclose(data / lsb, np.round(data / lsb))
+
+    def test_each_input_has_its_own_range(self):
+        self.device.noise = 0.
+        self.settings.input_channels[2].voltage_range = 1
+        self.settings.input_channels[2].terminal_config = 'RSE'
+        handler = MeasurementHandler(backend=self.device)
+        handler.add_to_queue(self.waveform, self.settings)
+        daq_io_thread = handler._queue[0][0]
+
+        daq_io_thread.setup()
+        task = daq_io_thread.taskHandle_Read
+        self.assertEqual(task.ranges, [(-10, 10), (-10, 10), (-1, 1)])
+        self.assertEqual(task.terminal_configs[2], 10083)
+        daq_io_thread.run()
+        daq_io_thread.stop()
+
+        # the PL input is quantised to the LSB of its own range
+        lsb = 2. / 2 ** 16
+        pl = daq_io_thread.channel_view()[:, 2]
+        np.testing.assert_allclose(pl / lsb, np.round(pl / lsb))
+        self.assertEqual(
+            self.settings.as_dict()['input_channels'][2]['voltage_range'], 1
+        )
+
+    def test_auto_range_picks_the_tightest_safe_range(self):
+        self.device.reference_gain = 6.
+        handler = MeasurementHandler(backend=self.device, auto_range=True)
+        handler.add_to_queue(self.waveform, self.settings)
+
+        data_set = handler.single_measurement()
+
+        ranges = [c.voltage_range for c in self.settings.input_channels]
+        self.assertEqual(ranges, [5, 1, 1])
+        for input_channel in self.settings.input_channels:
+            self.assertLess(
+                input_channel.measured_peak * 1.2, input_channel.voltage_range
+            )
+            # nothing was clipped
+            self.assertLess(
+                np.abs(data_set[input_channel.name]).max(),
+                input_channel.voltage_range
+            )
+        self.assertEqual(self.device.tasks, [])
+
+    def test_binned_while_acquiring(self):
+        self.device.noise = 0.
+        data = self.acquire(self.make_thread())
+
+        thread = self.make_thread(bin_size=10, chunk_size=64)
+        binned = self.acquire(thread)
+
+        np.testing.assert_allclose(binned, bin_data(data, 10))
+        # only a chunk of the stream was ever held
+        self.assertEqual(thread.Read_Data.shape, (3 * 64,))
+        self.assertEqual(len(thread.time_axis()), binned.shape[0])
+        self.assertAlmostEqual(thread.time_axis().dt, 10 / 1200.)
+
+    def test_decimated_while_acquiring(self):
+        self.device.noise = 0.
+        data = self.acquire(self.make_thread())
+
+        thread = self.make_thread(bin_size=10, chunk_size=64,
+                                  decimation='fir')
+        decimated = self.acquire(thread)
+
+        np.testing.assert_allclose(
+            decimated, decimate(data, 10, thread.sample_clock_rate)
+        )
+        self.assertEqual(len(thread.time_axis()), decimated.shape[0])
+
+    def test_binned_measurements(self):
+        self.device.noise = 0.
+        settings = [
+            ExperimentSettings(channel='High (2A/V)', averaging=2,
+                               binning=binning)
+            for binning in [1, 8]
+        ]
+        measured = []
+        for kwargs in [{}, {'hardware_averaging': True}]:
+            handler = MeasurementHandler(backend=self.device, **kwargs)
+            for series in ['series_measurement', 'burst_series_measurement']:
+                for metadata in settings:
+                    handler.add_to_queue(self.waveform, metadata)
+                measured.append(getattr(handler, series)())
+
+        for unbinned, binned in measured:
+            self.assertEqual(binned.dt, 8 * unbinned.dt)
+            # the standard errors too
+            np.testing.assert_allclose(
+                binned, bin_data(unbinned, 8), atol=1e-12
+            )
+
+    def test_decimated_measurements(self):
+        self.device.noise = 0.
+        settings = [
+            ExperimentSettings(channel='High (2A/V)', averaging=2,
+                               binning=binning, decimation='fir')
+            for binning in [1, 8]
+        ]
+        handler = MeasurementHandler(backend=self.device)
+        for series in ['series_measurement', 'burst_series_measurement']:
+            for metadata in settings:
+                handler.add_to_queue(self.waveform, metadata)
+            unbinned, decimated = getattr(handler, series)()
+
+            self.assertEqual(decimated.dt, 8 * unbinned.dt)
+            np.testing.assert_allclose(
+                decimated, unbinned.decimate(8), atol=1e-12
+            )
+
+    def test_sample_rate_is_coerced(self):
+        task = self.device.create_task()
+        self.device.create_ai_voltage_chan(task, 'Sim1/ai0:2', -1, -10, 10)
+        self.device.cfg_samp_clk_timing(task, '', 1.2e6, 0, 0, 100)
+
+        self.assertEqual(len(task.channels), 3)
+        self.assertEqual(task.rate, 100e6 / 83)
+
+    def test_unknown_device_is_an_error(self):
+        task = self.device.create_task()
+
+        self.assertRaises(
+            RuntimeError,
+            self.device.create_ai_voltage_chan, task, 'Dev3/ai0:2', -1, -10, 10
+        )
+
+    def test_realtime_reads_take_the_acquisition_time(self):
+        device = SimulatedDevice(realtime=True, call_latency=0)
+        settings = ExperimentSettings(duration=0.1, offset_after=0,
+                                      offset_before=0, sample_rate=1e4)
+        settings.output_sample_rate = 1e4
+        thread = WaveformThread(
+            waveform=LightPulse(settings).create_waveform(),
+            Channel='ao1',
+            Time=np.float64(0.1),
+            input_voltage_range=10,
+            output_voltage_range=10,
+            input_sample_rate=1e4,
+            output_sample_rate=1e4,
+            backend=device
+        )
+        thread.setup()
+        started = time.time()
+        thread.run()
+        elapsed = time.time() - started
+        thread.stop()
+
+        self.assertGreaterEqual(elapsed, 0.09)
+        self.assertEqual(thread.samples_read, 1000)
+
+    def test_measurement_handler_uses_the_backend(self):
+        self.settings.averaging = 3
+        handler = MeasurementHandler(backend=self.device)
+        handler.add_to_queue(self.waveform, self.settings)
+
+        data_set = handler.single_measurement()
+
+        self.assertEqual(data_set.shape, (1200, 7))
+        self.assertTrue(np.all(data_set[:, 4:] < 0.01))
+
+    def test_raw_reads_match_volts(self):
+        data = self.acquire(self.make_thread())
+
+        self.device = SimulatedDevice(realtime=False, seed=0)
+        thread = self.make_thread(raw=True)
+        codes = self.acquire(thread)
+
+        self.assertEqual(codes.dtype, np.int16)
+        self.assertEqual(codes.nbytes * 4, data.nbytes)
+        # the waveform is quantised to DAC codes on the way out
+        np.testing.assert_allclose(thread.to_volts(codes), data, atol=1e-3)
+
+    def test_raw_measurement_is_scaled_after_averaging(self):
+        self.settings.averaging = 3
+        data_sets = []
+        for raw in [False, True]:
+            for hardware_averaging in [False, True]:
+                device = SimulatedDevice(realtime=False, seed=0)
+                handler = MeasurementHandler(
+                    backend=device, raw=raw,
+                    hardware_averaging=hardware_averaging
+                )
+                handler.add_to_queue(self.waveform, self.settings)
+                data_sets.append(handler.single_measurement())
+
+        np.testing.assert_allclose(data_sets[2], data_sets[0], atol=1e-3)
+        np.testing.assert_allclose(data_sets[3], data_sets[1], atol=1e-3)
+
+    def test_hardware_averaging_with_differing_sample_rates(self):
+        self.device.noise = 0.
+        self.settings.averaging = 3
+        self.settings.sample_rate = 2.4e3
+        data_sets = []
+        for hardware_averaging in [False, True]:
+            handler = MeasurementHandler(
+                backend=self.device, hardware_averaging=hardware_averaging
+            )
+            handler.add_to_queue(self.waveform, self.settings)
+            # the output can't be kept in step over repeats in one task
+            self.assertEqual(handler._queue[0][0].repeats, 1)
+            data_sets.append(handler.single_measurement())
+
+        np.testing.assert_allclose(data_sets[1], data_sets[0], atol=1e-12)
+
+    def test_burst_matches_separate_measurements(self):
+        self.device.noise = 0.
+        settings = []
+        for amplitude, averaging in [(0.5, 2), (1., 1), (0.25, 3)]:
+            experiment = ExperimentSettings(
+                channel='High (2A/V)', amplitude=amplitude,
+                averaging=averaging
+            )
+            settings.append(experiment)
+
+        def queue(handler):
+            for experiment in settings:
+                handler.add_to_queue(
+                    LightPulse(experiment).create_waveform(), experiment
+                )
+
+        handler = MeasurementHandler(backend=self.device)
+        queue(handler)
+        separate = handler.series_measurement()
+
+        handler = MeasurementHandler(backend=self.device)
+        queue(handler)
+        progress = []
+        with patch.object(self.device, 'create_task',
+                          wraps=self.device.create_task) as create_task:
+            burst = handler.burst_series_measurement(
+                progress_callback=lambda i, total, data: progress.append(i)
+            )
+
+        # one write and one read task for the whole queue
+        self.assertEqual(create_task.call_count, 2)
+        self.assertEqual(progress, [1, 2, 3])
+        self.assertTrue(handler.is_queue_empty())
+        for burst_data, separate_data in zip(burst, separate):
+            self.assertEqual(burst_data.shape, separate_data.shape)
+            np.testing.assert_allclose(
+                burst_data[:, :4], separate_data[:, :4], atol=1e-3
+            )
+
+    def test_look_ahead_reduces_dead_time(self):
+        settings = ExperimentSettings(
+            channel='High (2A/V)', duration=0.02, offset_before=0,
+            offset_after=0, sample_rate=2e4
+        )
+        settings.output_sample_rate = 2e4
+        waveform = LightPulse(settings).create_waveform()
+
+        mean_dead_time = []
+        for look_ahead in [False, True]:
+            # every driver call takes 5 ms, as setting up the tasks can
+            device = SimulatedDevice(realtime=True, call_latency=5e-3)
+            handler = MeasurementHandler(backend=device,
+                                         look_ahead=look_ahead)
+            for i in range(4):
+                handler.add_to_queue(waveform, settings)
+
+            datasets = handler.series_measurement()
+
+            self.assertEqual(len(datasets), 4)
+            self.assertEqual(len(handler.dead_times), 3)
+            self.assertEqual(device.tasks, [])
+            mean_dead_time.append(np.mean(handler.dead_times))
+
+        # the six calls configuring the tasks are taken off the dead time
+        self.assertLess(mean_dead_time[1], mean_dead_time[0] - 0.015)
+
+    def test_clearing_the_queue_clears_tasks_prepared_ahead(self):
+        handler = MeasurementHandler(backend=self.device, look_ahead=True)
+        for i in range(3):
+            handler.add_to_queue(self.waveform, self.settings)
+
+        calls = []
+
+        def before_measurement():
+            calls.append(1)
+            return len(calls) == 1
+
+        handler.series_measurement(before_measurement=before_measurement)
+        # the second experiment was being prepared when the series stopped
+        self.assertIsNotNone(handler._prepared)
+
+        handler.clear_queue()
+        self.assertEqual(self.device.tasks, [])
+
+    def test_auto_ranged_experiments_share_a_burst(self):
+        handler = MeasurementHandler(backend=self.device, auto_range=True)
+        for i in range(4):
+            handler.add_to_queue(
+                self.waveform, ExperimentSettings(channel='High (2A/V)')
+            )
+
+        with patch.object(handler, '_burst_thread',
+                          wraps=handler._burst_thread) as burst_thread:
+            datasets = handler.burst_series_measurement()
+
+        self.assertEqual(len(datasets), 4)
+        self.assertEqual(burst_thread.call_count, 1)
+        self.assertEqual(len(burst_thread.call_args[0][0]), 4)
+        self.assertEqual(self.device.tasks, [])
+
+    def test_burst_discards_tasks_prepared_ahead(self):
+        # measured on its own, as its input and output rates differ
+        single = ExperimentSettings(channel='High (2A/V)', sample_rate=2.4e3)
+        handler = MeasurementHandler(backend=self.device, look_ahead=True)
+        handler.add_to_queue(LightPulse(single).create_waveform(), single)
+        handler.add_to_queue(self.waveform, self.settings)
+        handler.dead_times = [10.]
+
+        datasets = handler.burst_series_measurement()
+
+        self.assertEqual(len(datasets), 2)
+        self.assertIsNone(handler._prepared)
+        self.assertEqual(self.device.tasks, [])
+        self.assertNotIn(10., handler.dead_times)
+
+    def test_time_axis_follows_the_coerced_clock(self):
+        # 100 MHz / 3e5 Hz is not a whole number of ticks
+        self.settings.sample_rate = 3e5
+        self.settings.output_sample_rate = 3e5
+        thread = self.make_thread(
+            Time=np.float64(0.01),
+            input_sample_rate=3e5,
+            output_sample_rate=3e5
+        )
+        self.acquire(thread)
+
+        self.assertEqual(thread.sample_clock_rate, 100e6 / 333)
+        self.assertEqual(thread.time.dt, 333 / 100e6)
+        self.assertEqual(len(thread.time), 3000)
+
+        handler = MeasurementHandler(backend=self.device)
+        handler.add_to_queue(self.waveform, self.settings)
+        data_set = handler.single_measurement()
+        np.testing.assert_allclose(np.diff(data_set[:, 0]), 333 / 100e6)
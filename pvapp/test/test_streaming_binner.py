@@ -0,0 +1,56 @@
+import unittest
+import numpy as np
+
+from util.StreamingBinner import StreamingBinner
+from util.utils import bin_data
+
+
+class StreamingBinnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = np.random.RandomState(0).rand(2 * 103, 3)
+
+    def feed(self, binner, chunk_sizes):
+        start = 0
+        for size in chunk_sizes:
+            binner.update(self.stream[start:start + size])
+            start += size
+        self.assertEqual(start, self.stream.shape[0])
+
+    def expected(self, bin_size):
+        # each period is binned on its own
+        return np.concatenate([
+            bin_data(self.stream[:103], bin_size),
+            bin_data(self.stream[103:], bin_size)
+        ])
+
+    def test_bins_carry_across_chunks(self):
+        binner = StreamingBinner(10, 3, period=103, num_periods=2)
+        self.feed(binner, [7, 13, 1, 90, 5, 90])
+
+        self.assertEqual(binner.num_bins, 20)
+        np.testing.assert_allclose(binner.result(), self.expected(10))
+
+    def test_chunk_per_sample(self):
+        binner = StreamingBinner(4, 3, period=103, num_periods=2)
+        self.feed(binner, [1] * self.stream.shape[0])
+
+        np.testing.assert_allclose(binner.result(), self.expected(4))
+
+    def test_reset_starts_a_new_stream(self):
+        binner = StreamingBinner(10, 3, period=103, num_periods=2)
+        self.feed(binner, [50, 156])
+        binner.reset()
+        self.feed(binner, [206])
+
+        np.testing.assert_allclose(binner.result(), self.expected(10))
+
+    def test_int16_chunks(self):
+        codes = np.arange(-20, 20, dtype=np.int16).reshape(20, 2)
+        binner = StreamingBinner(4, 2, period=20)
+        binner.update(codes[:3])
+        binner.update(codes[3:])
+
+        np.testing.assert_allclose(
+            binner.result(), bin_data(codes.astype(np.float64), 4)
+        )
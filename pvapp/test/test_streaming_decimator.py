@@ -0,0 +1,108 @@
+import unittest
+import numpy as np
+
+from models.Dataset import Dataset
+from util.StreamingDecimator import (
+    StreamingDecimator,
+    decimate,
+    decimate_errors,
+    filter_bank,
+)
+from util.TimeAxis import TimeAxis
+from util.utils import bin_data
+
+
+class StreamingDecimatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = np.random.RandomState(0).rand(2 * 503, 3)
+
+    def feed(self, decimator, chunk_sizes):
+        start = 0
+        for size in chunk_sizes:
+            decimator.update(self.stream[start:start + size])
+            start += size
+        self.assertEqual(start, self.stream.shape[0])
+
+    def expected(self, factor):
+        # each period is decimated on its own
+        return np.concatenate([
+            decimate(self.stream[:503], factor, 1e3),
+            decimate(self.stream[503:], factor, 1e3)
+        ])
+
+    def test_streaming_matches_batch(self):
+        decimator = StreamingDecimator(10, 1e3, 3, period=503, num_periods=2)
+        self.feed(decimator, [7, 13, 1, 490, 5, 490])
+
+        self.assertEqual(decimator.num_bins, 100)
+        np.testing.assert_allclose(decimator.result(), self.expected(10))
+
+    def test_chunk_per_sample(self):
+        decimator = StreamingDecimator(4, 1e3, 3, period=503, num_periods=2)
+        self.feed(decimator, [1] * self.stream.shape[0])
+
+        np.testing.assert_allclose(decimator.result(), self.expected(4))
+
+    def test_constant_is_kept(self):
+        constant = np.full((200, 2), 3.)
+
+        np.testing.assert_allclose(decimate(constant, 8, 1e3), 3.)
+
+    def test_noise_above_nyquist_is_not_aliased(self):
+        # 60 to 190 Hz is above the 50 Hz Nyquist frequency of 100 Hz
+        t = np.arange(20000) / 1e3
+        noise = sum(np.sin(2 * np.pi * f * t) for f in range(60, 200, 10))
+        interior = slice(10, -10)
+
+        box = bin_data(noise, 10)[interior]
+        fir = decimate(noise, 10, 1e3)[interior]
+
+        self.assertLess(np.abs(fir).max(), 0.01)
+        self.assertLess(np.abs(fir).max(), np.abs(box).max() / 10)
+
+    def test_banks_are_cached(self):
+        bank = filter_bank(10, 1e3)
+
+        self.assertIs(filter_bank(10, 1e3), bank)
+        self.assertEqual(bank.shape, (9, 10))
+        self.assertAlmostEqual(bank.sum(), 1.)
+        self.assertIsNot(filter_bank(10, 2e3), bank)
+
+    def test_errors_are_filtered_as_variances(self):
+        errors = np.ones(200)
+        taps = filter_bank(8, 1e3).ravel()
+
+        # away from the padded ends, each output sums 72 independent samples
+        np.testing.assert_allclose(
+            decimate_errors(errors, 8, 1e3)[5:-5],
+            np.sqrt(np.sum(taps ** 2))
+        )
+
+    def test_dataset_errors_are_filtered_as_variances(self):
+        mean = self.stream[:503]
+        std_error = np.full(mean.shape, 0.1)
+        dataset = Dataset.from_channels(
+            TimeAxis(0., 1e-3, 503), mean, std_error
+        )
+        decimated = dataset.decimate(10)
+
+        np.testing.assert_allclose(
+            decimated['PC'], decimate(mean, 10, 1e3)[:, 1]
+        )
+        np.testing.assert_allclose(
+            decimated.error('PC'), decimate_errors(std_error, 10, 1e3)[:, 1]
+        )
+        self.assertLess(decimated.error('PC').max(), 0.1)
+
+    def test_dataset_is_timed_as_its_bins(self):
+        dataset = Dataset(TimeAxis(0., 1e-3, 503), self.stream[:503].T.copy())
+        decimated = dataset.decimate(10)
+
+        self.assertEqual(
+            (decimated.t0, decimated.dt, len(decimated)),
+            (dataset.bin(10).t0, dataset.bin(10).dt, 50)
+        )
+        np.testing.assert_allclose(
+            decimated.values.T, decimate(self.stream[:503], 10, 1e3)
+        )
@@ -0,0 +1,39 @@
+import unittest
+import numpy as np
+
+from util.TimeAxis import TimeAxis
+
+
+class TimeAxisTest(unittest.TestCase):
+
+    def setUp(self):
+        self.axis = TimeAxis(0.5, 0.25, 5)
+
+    def test_values_are_affine(self):
+        np.testing.assert_array_equal(
+            np.asarray(self.axis), [0.5, 0.75, 1., 1.25, 1.5]
+        )
+        self.assertEqual(len(self.axis), 5)
+        self.assertEqual(self.axis.shape, (5,))
+        self.assertEqual(self.axis.rate, 4.)
+
+    def test_assigns_into_an_array(self):
+        data = np.zeros((5, 2))
+        data[:, 0] = self.axis
+
+        np.testing.assert_array_equal(data[:, 0], self.axis.values())
+
+    def test_indexing(self):
+        self.assertEqual(self.axis[0], 0.5)
+        self.assertEqual(self.axis[-1], 1.5)
+        with self.assertRaises(IndexError):
+            self.axis[5]
+
+    def test_slices_are_axes(self):
+        sliced = self.axis[1::2]
+
+        self.assertEqual(sliced, TimeAxis(0.75, 0.5, 2))
+        np.testing.assert_array_equal(
+            np.asarray(sliced), np.asarray(self.axis)[1::2]
+        )
+        self.assertEqual(len(self.axis[10:]), 0)
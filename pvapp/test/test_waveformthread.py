@@ -3,10 +3,13 @@ from mock import patch
 from hardware.daq import WaveformThread
 from models.LightPulse import LightPulse
 from models.ExperimentSettings import ExperimentSettings
+from test.utils import FakeNIDAQ
+from util.BufferPool import BufferPool
+from util.Exceptions import DAQmxError
 import numpy as np
 
 
-@patch("hardware.daq.ctypes")
+@patch("hardware.backend.ctypes")
 class WaveformThreadTest(unittest.TestCase):
     # np.set_printoptions(threshold='nan')
     def setUp(self):
@@ -23,3 +26,281 @@ class WaveformThreadTest(unittest.TestCase):
             input_sample_rate=self.settings.sample_rate,
             output_sample_rate=self.settings.output_sample_rate
         )
+
+
+class WaveformThreadContinuousTest(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = ExperimentSettings()
+        self.lp = LightPulse(self.settings)
+        self.fake_nidaq = FakeNIDAQ()
+        patcher = patch("hardware.backend.nidaq", self.fake_nidaq, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_thread(self, **kwargs):
+        return WaveformThread(
+            waveform=self.lp.create_waveform(),
+            Channel='ao1',
+            Time=np.float64(1.011),
+            input_voltage_range=10.0,
+            output_voltage_range=self.settings.output_voltage_range,
+            input_sample_rate=self.settings.sample_rate,
+            output_sample_rate=self.settings.output_sample_rate,
+            **kwargs
+        )
+
+    def test_chunks_are_passed_to_consumers(self):
+        thread = self.make_thread(continuous=True, chunk_size=50, ring_size=3)
+        chunks = []
+
+        def consumer(chunk):
+            chunks.append(np.copy(chunk))
+            if len(chunks) == 5:
+                thread.running = False
+
+        thread.add_consumer(consumer)
+        thread.setup()
+        thread.run()
+        thread.stop()
+
+        self.assertEqual(thread.chunks_read, 5)
+        self.assertEqual(thread.ring_buffer.shape, (3, 150))
+        stream = np.vstack(chunks)
+        self.assertEqual(stream.shape, (250, 3))
+        np.testing.assert_array_equal(stream[:, 0], np.arange(250))
+        np.testing.assert_array_equal(stream[:, 2], np.arange(250) + 2e6)
+
+    def test_ring_buffer_is_reused(self):
+        thread = self.make_thread(continuous=True, chunk_size=10, ring_size=2)
+        chunks = []
+
+        def consumer(chunk):
+            chunks.append(chunk)
+            if len(chunks) == 3:
+                thread.running = False
+
+        thread.add_consumer(consumer)
+        thread.setup()
+        thread.run()
+        thread.stop()
+
+        self.assertTrue(np.may_share_memory(chunks[0], chunks[2]))
+        self.assertFalse(np.may_share_memory(chunks[0], chunks[1]))
+        # the first slot now holds the third chunk
+        np.testing.assert_array_equal(chunks[0][:, 0], np.arange(20, 30))
+
+    def test_channel_view_does_not_copy(self):
+        for layout in [WaveformThread.DAQmx_Val_GroupByScanNumber,
+                       WaveformThread.DAQmx_Val_GroupByChannel]:
+            self.fake_nidaq.samples_read = 0
+            thread = self.make_thread(data_layout=layout)
+            thread.setup()
+            thread.run()
+            thread.stop()
+
+            view = thread.channel_view()
+            self.assertEqual(view.shape, (thread.samples_per_shot, 3))
+            self.assertTrue(np.may_share_memory(view, thread.Read_Data))
+            np.testing.assert_array_equal(
+                view[:, 1], np.arange(thread.samples_per_shot) + 1e6
+            )
+
+        # interleaved data gives a C contiguous view
+        self.assertFalse(view.flags['C_CONTIGUOUS'])
+        thread = self.make_thread()
+        thread.setup()
+        thread.run()
+        self.assertTrue(thread.channel_view().flags['C_CONTIGUOUS'])
+
+    def test_runs_in_background_until_stopped(self):
+        thread = self.make_thread(continuous=True, chunk_size=10)
+        thread.setup()
+        thread.start()
+        thread.stop()
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(self.fake_nidaq.calls[-2:],
+                         ['DAQmxStopTask', 'DAQmxClearTask'])
+
+
+class WaveformThreadChunkedReadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = ExperimentSettings()
+        self.lp = LightPulse(self.settings)
+        self.fake_nidaq = FakeNIDAQ()
+        patcher = patch("hardware.backend.nidaq", self.fake_nidaq, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_thread(self, **kwargs):
+        return WaveformThread(
+            waveform=self.lp.create_waveform(),
+            Channel='ao1',
+            Time=np.float64(1.011),
+            input_voltage_range=10.0,
+            output_voltage_range=self.settings.output_voltage_range,
+            input_sample_rate=self.settings.sample_rate,
+            output_sample_rate=self.settings.output_sample_rate,
+            **kwargs
+        )
+
+    def test_reads_in_chunks_with_progress(self):
+        for layout in [WaveformThread.DAQmx_Val_GroupByScanNumber,
+                       WaveformThread.DAQmx_Val_GroupByChannel]:
+            self.fake_nidaq.samples_read = 0
+            thread = self.make_thread(chunk_size=100, data_layout=layout)
+            progress = []
+            thread.add_progress_callback(
+                lambda read, total: progress.append((read, total))
+            )
+            thread.setup()
+            thread.run()
+            thread.stop()
+
+            total = thread.samples_per_shot
+            self.assertEqual(thread.chunks_read, -(-total // 100))
+            self.assertEqual(progress[0], (100, total))
+            self.assertEqual(progress[-1], (total, total))
+            self.assertFalse(thread.aborted)
+            # the chunks are stitched together in sample order
+            np.testing.assert_array_equal(
+                thread.channel_view(),
+                np.arange(total)[:, None] + np.array([0, 1e6, 2e6])
+            )
+
+    def test_chunks_are_passed_to_consumers(self):
+        thread = self.make_thread(chunk_size=100)
+        starts = []
+        thread.add_consumer(lambda chunk: starts.append(chunk[0, 0]))
+        thread.setup()
+        thread.run()
+        thread.stop()
+
+        self.assertEqual(starts[:3], [0, 100, 200])
+
+    def test_abort_stops_after_the_current_chunk(self):
+        for layout in [WaveformThread.DAQmx_Val_GroupByScanNumber,
+                       WaveformThread.DAQmx_Val_GroupByChannel]:
+            self.fake_nidaq.samples_read = 0
+            thread = self.make_thread(chunk_size=100, data_layout=layout)
+
+            def progress(read, total):
+                if read >= 300:
+                    thread.abort()
+
+            thread.add_progress_callback(progress)
+            thread.setup()
+            thread.run()
+            thread.stop()
+
+            self.assertTrue(thread.aborted)
+            self.assertEqual(thread.samples_read, 300)
+            view = thread.channel_view()
+            self.assertEqual(view.shape, (300, 3))
+            np.testing.assert_array_equal(view[:, 2], np.arange(300) + 2e6)
+
+
+    def stop_task_returns(self, status):
+        # status(handle) is the status of stopping the task of handle
+        def stop_task(task):
+            self.fake_nidaq.calls.append('DAQmxStopTask')
+            return status(task.value)
+        self.fake_nidaq.DAQmxStopTask = stop_task
+
+    def test_stop_ignores_warnings(self):
+        # stopped before the end of a finite task
+        self.stop_task_returns(lambda handle: 200010)
+        thread = self.make_thread(chunk_size=100)
+        thread.setup()
+        thread.stop()
+
+        self.assertEqual(self.fake_nidaq.calls.count('DAQmxStopTask'), 2)
+        self.assertEqual(self.fake_nidaq.calls.count('DAQmxClearTask'), 2)
+        self.assertIsNone(thread.taskHandle_Read)
+
+    def test_read_task_is_cleared_when_write_task_fails(self):
+        handles = {}
+        self.stop_task_returns(
+            lambda handle: -200088 if handle == handles['write'] else 0
+        )
+        thread = self.make_thread(chunk_size=100)
+        thread.setup()
+        handles['write'] = thread.taskHandle_Write.handle.value
+
+        with self.assertRaises(DAQmxError):
+            thread.stop()
+        self.assertEqual(self.fake_nidaq.calls.count('DAQmxClearTask'), 2)
+        self.assertIsNone(thread.taskHandle_Read)
+
+
+class WaveformThreadBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = ExperimentSettings()
+        self.lp = LightPulse(self.settings)
+        self.fake_nidaq = FakeNIDAQ()
+        patcher = patch("hardware.backend.nidaq", self.fake_nidaq, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = BufferPool()
+
+    def make_thread(self, waveform, **kwargs):
+        return WaveformThread(
+            waveform=waveform,
+            Channel='ao1',
+            Time=np.float64(1.011),
+            input_voltage_range=10.0,
+            output_voltage_range=self.settings.output_voltage_range,
+            input_sample_rate=self.settings.sample_rate,
+            output_sample_rate=self.settings.output_sample_rate,
+            buffer_pool=self.pool,
+            **kwargs
+        )
+
+    def test_waveform_is_written_whole(self):
+        thread = self.make_thread(np.arange(1.0, 2000.0))
+        thread.setup()
+        thread.stop()
+
+        written = self.fake_nidaq.written
+        self.assertEqual(written.shape, (thread.periodLength + 1,))
+        np.testing.assert_array_equal(
+            written[:-1], np.arange(1.0, thread.periodLength + 1)
+        )
+        # the LED is left off by a sample of its own
+        self.assertEqual(written[-1], 0)
+
+    def test_repeated_periods_stay_a_period_apart(self):
+        thread = self.make_thread(np.arange(1.0, 2000.0), repeats=2)
+        thread.setup()
+        thread.stop()
+
+        written = self.fake_nidaq.written
+        self.assertEqual(written.shape, (thread.periodLength,))
+        np.testing.assert_array_equal(
+            written[:-1], np.arange(1.0, thread.periodLength)
+        )
+        self.assertEqual(written[-1], 0)
+
+    def test_buffers_are_reused_between_shots(self):
+        waveform = self.lp.create_waveform()
+        thread = self.make_thread(waveform)
+        thread.setup()
+        thread.run()
+        thread.stop()
+        read_data = thread.Read_Data
+
+        thread.setup()
+        thread.run()
+        thread.stop()
+        self.assertIs(thread.Read_Data, read_data)
+
+        # another thread picks up the released buffers
+        thread.release_buffers()
+        other = self.make_thread(waveform)
+        other.setup()
+        self.assertIs(other.Read_Data, read_data)
+        other.stop()
+        self.assertEqual(self.pool.allocations, 2)
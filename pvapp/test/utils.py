@@ -1,3 +1,4 @@
+import ctypes
 import numpy as np
 from scipy.signal import sawtooth
 
@@ -21,3 +22,98 @@ def make_sawtooth_data(num=501, var=0.2):
     pc = np.log(sawtooth_waveform() + var * np.random.rand(num))
     pl = np.log(np.log(sawtooth_waveform() + var * np.random.rand(num)))
     return np.column_stack((t, ref, pc, pl))
+
+
+class FakeNIDAQ(object):
+    """
+    In-process stand-in for the nicaiu DLL. Reads fill the buffer with a
+    running sample counter per channel, so the position of every sample
+    in the stream can be checked.
+    """
+
+    def __init__(self, num_channels=3):
+        self.num_channels = num_channels
+        self.next_handle = 1
+        self.samples_read = 0
+        self.written = None
+        self.sample_counts = []
+        self.rates = {}
+        self.calls = []
+
+    @staticmethod
+    def _value(arg):
+        return getattr(arg, 'value', arg)
+
+    def _record(self, name):
+        self.calls.append(name)
+        return 0
+
+    def DAQmxCreateTask(self, name, handle_ref):
+        handle_ref._obj.value = self.next_handle
+        self.next_handle += 1
+        return self._record('DAQmxCreateTask')
+
+    def DAQmxCreateAOVoltageChan(self, *args):
+        return self._record('DAQmxCreateAOVoltageChan')
+
+    def DAQmxCreateAIVoltageChan(self, *args):
+        return self._record('DAQmxCreateAIVoltageChan')
+
+    def DAQmxCfgSampClkTiming(self, task, source, rate, active_edge,
+                              sample_mode, samples_per_channel):
+        self.sample_counts.append(self._value(samples_per_channel))
+        self.rates[self._value(task)] = self._value(rate)
+        return self._record('DAQmxCfgSampClkTiming')
+
+    def DAQmxGetSampClkRate(self, task, rate_ref):
+        rate_ref._obj.value = self.rates[self._value(task)]
+        return self._record('DAQmxGetSampClkRate')
+
+    def DAQmxWriteAnalogF64(self, task, num_samples, autostart, timeout,
+                            layout, address, written, reserved):
+        num_samples = self._value(num_samples)
+        self.written = np.copy(
+            np.ctypeslib.as_array(
+                (ctypes.c_double * num_samples).from_address(address)
+            )
+        )
+        return self._record('DAQmxWriteAnalogF64')
+
+    def DAQmxReadAnalogF64(self, task, num_samples, timeout, layout, address,
+                           array_size, read_ref, reserved):
+        array_size = self._value(array_size)
+        num_samples = self._value(num_samples)
+        if num_samples < 0:
+            num_samples = array_size // self.num_channels
+        buf = np.ctypeslib.as_array(
+            (ctypes.c_double * array_size).from_address(address)
+        )
+        counter = np.arange(
+            self.samples_read, self.samples_read + num_samples
+        )
+        data = buf[:num_samples * self.num_channels]
+        if self._value(layout) == 1:
+            # grouped by scan number, the channels are interleaved
+            data = data.reshape((num_samples, self.num_channels)).T
+        else:
+            data = data.reshape((self.num_channels, num_samples))
+        for i in range(self.num_channels):
+            data[i] = counter + i * 1e6
+        self.samples_read += num_samples
+        read_ref._obj.value = num_samples
+        return self._record('DAQmxReadAnalogF64')
+
+    def DAQmxTaskControl(self, task, action):
+        return self._record('DAQmxTaskControl')
+
+    def DAQmxStartTask(self, task):
+        return self._record('DAQmxStartTask')
+
+    def DAQmxStopTask(self, task):
+        return self._record('DAQmxStopTask')
+
+    def DAQmxClearTask(self, task):
+        return self._record('DAQmxClearTask')
+
+    def DAQmxGetErrorString(self, err, buf_ref, buf_size):
+        return 0
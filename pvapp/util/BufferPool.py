@@ -0,0 +1,57 @@
+import threading
+
+import numpy as np
+
+
+class BufferPool(object):
+    """
+    Hands out one dimensional numpy arrays of a given length and dtype,
+    reusing the ones released back to it rather than allocating new ones.
+
+    The arrays are aligned to ALIGNMENT bytes, and their contents are
+    whatever was last written to them. Up to max_free arrays are kept for
+    each (length, dtype); releasing more lets them be garbage collected.
+    The pool can be shared between threads.
+    """
+
+    ALIGNMENT = 64
+
+    def __init__(self, max_free=4):
+        self.max_free = max_free
+        self._free = {}
+        self._lock = threading.Lock()
+
+        # number of arrays the pool has had to allocate
+        self.allocations = 0
+
+    def _key(self, length, dtype):
+        return (int(length), np.dtype(dtype))
+
+    def _allocate(self, length, dtype):
+        nbytes = length * dtype.itemsize
+        raw = np.empty(nbytes + self.ALIGNMENT, dtype=np.uint8)
+        offset = -raw.ctypes.data % self.ALIGNMENT
+        return raw[offset:offset + nbytes].view(dtype)
+
+    def acquire(self, length, dtype=np.float64):
+        key = self._key(length, dtype)
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                return free.pop()
+            self.allocations += 1
+        return self._allocate(*key)
+
+    def release(self, array):
+        """Returns an array from acquire, which must no longer be used"""
+        assert array.ndim == 1
+        key = self._key(array.shape[0], array.dtype)
+        with self._lock:
+            free = self._free.setdefault(key, [])
+            released = any(other is array for other in free)
+            if not released and len(free) < self.max_free:
+                free.append(array)
+
+
+# the pool used unless another one is given
+shared_pool = BufferPool()
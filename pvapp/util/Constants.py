@@ -1,15 +1,22 @@
+# The analog inputs read, in the order of their channels (ai0, ai1, ...)
 CHANNELS = ['Reference', 'PC', 'PL']
-CHANNEL_INDEX = {
-    'Reference': 1,
-    'PC': 2,
-    'PL': 3
-}
+# the colours channels are plotted in, in the same order
+PLOT_COLOURS = ['b', 'r', 'g', 'm', 'c', 'y', 'k']
 
 INPUT_VOLTAGE_RANGE = [10, 5, 2, 1]
 INPUT_VOLTAGE_RANGE_STR = ['+/- 10', '+/- 5', '+/- 2', '+/- 1']
 
+# How an analog input is wired, see the terminal configuration of
+# DAQmxCreateAIVoltageChan. Default leaves the choice to the card.
+TERMINAL_CONFIGS = ['Default', 'Differential', 'RSE', 'NRSE',
+                    'Pseudodifferential']
+
 OUTPUT_VOLTAGE_RANGE = 5
 
+# How samples are reduced when binning at acquisition: box averages each
+# bin, fir low pass filters before decimating (see StreamingDecimator)
+DECIMATION_METHODS = ['box', 'fir']
+
 WAVEFORMS = ["Sin", "Square", "FrequencyScan",
              "Triangle", "Cos"]
 OUTPUTS = ['Low (50mA/V)', 'High (2A/V)']
@@ -18,6 +25,10 @@ OUTPUTS = ['Low (50mA/V)', 'High (2A/V)']
 ########## NI-DAQmx specific rates
 # These values are specific to NI-DAQmx
 
+# The cards measurements are run on, one tester is wired to each. With more
+# than one, a series of measurements is shared between them.
+DAQ_DEVICES = ['Dev3']
+
 # Magic numbers relating to hardware. They convert sent voltage to current.
 # They are determined by experimental measurement
 HIGH_HARDWARE_CONST = 1840.
@@ -34,6 +45,11 @@ HIGH_VOLTAGE_LIMIT = 1.5
 THRESHOLD_CONST = 5
 
 
+# The highest rate the auto-ranging pre-shot is played and read at, and how
+# far below the range its peaks have to be for that range to be used
+AUTO_RANGE_SAMPLE_RATE = 1e4
+AUTO_RANGE_HEADROOM = 1.2
+
 # Max is float64(1e6), well its 1.25MS/s/channel
 MAX_INPUT_SAMPLE_RATE = 1.2e6
 # It's 3.33MS/s
@@ -1,2 +1,14 @@
 class PVInputError(Exception):
     pass
+
+
+class MeasurementAborted(Exception):
+    pass
+
+
+class DAQmxError(RuntimeError):
+    """An error status code returned by NI-DAQmx"""
+
+    def __init__(self, code, message):
+        super(DAQmxError, self).__init__(message)
+        self.code = code
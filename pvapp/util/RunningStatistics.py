@@ -0,0 +1,49 @@
+import numpy as np
+
+
+class RunningStatistics(object):
+    """
+    Accumulates the mean and variance of a series of equally shaped arrays
+    one array at a time (Welford's algorithm). All the buffers are
+    allocated up front and updated in place, so adding a shot costs no
+    extra memory.
+    """
+
+    def __init__(self, shape, dtype=np.float64):
+        self.count = 0
+        self.mean = np.zeros(shape, dtype=dtype)
+        # sum of squared differences from the current mean
+        self._m2 = np.zeros(shape, dtype=dtype)
+
+        # scratch space for the update
+        self._delta = np.empty(shape, dtype=dtype)
+        self._scratch = np.empty(shape, dtype=dtype)
+
+    def update(self, sample):
+        """
+        Adds sample to the running mean and variance
+        """
+        self.count += 1
+
+        delta = np.subtract(sample, self.mean, out=self._delta)
+        self.mean += np.multiply(delta, 1. / self.count, out=self._scratch)
+
+        # delta * (sample - new mean)
+        correction = np.subtract(sample, self.mean, out=self._scratch)
+        correction *= delta
+        self._m2 += correction
+
+    def variance(self):
+        """
+        Returns the sample variance, which is undefined (nan) for fewer
+        than two samples
+        """
+        if self.count < 2:
+            return np.full(self.mean.shape, np.nan)
+        return self._m2 / (self.count - 1)
+
+    def standard_error(self):
+        """
+        Returns the standard error of the mean
+        """
+        return np.sqrt(self.variance() / self.count)
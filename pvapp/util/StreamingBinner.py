@@ -0,0 +1,85 @@
+import numpy as np
+
+from util.binning import reduce_bins
+
+
+class StreamingBinner(object):
+    """
+    Averages a stream of (samples, channels) chunks in bins of bin_size
+    samples as the chunks arrive, so the stream itself never has to be
+    kept.
+
+    The stream is num_periods periods of period samples each, such as the
+    back to back shots of an acquisition. Bins do not span periods: the
+    samples at the end of a period which do not fill a bin are dropped, as
+    bin_data does. A bin split between two chunks is carried over as a
+    partial sum until the rest of it arrives. The output is allocated up
+    front.
+    """
+
+    def __init__(self, bin_size, num_channels, period, num_periods=1):
+        assert bin_size > 0
+        self.bin_size = int(bin_size)
+        self.period = int(period)
+        self.bins_per_period = self.period // self.bin_size
+
+        self.output = np.empty(
+            (self.bins_per_period * num_periods, num_channels)
+        )
+        self._partial = np.zeros(num_channels)
+        self.reset()
+
+    def reset(self):
+        """Starts a new stream"""
+        self.num_bins = 0
+        # position of the next sample within its period
+        self._position = 0
+        self._partial[:] = 0
+        self._partial_count = 0
+
+    def update(self, chunk):
+        """Bins the next (samples, channels) chunk of the stream"""
+        while chunk.shape[0]:
+            part = chunk[:self.period - self._position]
+            chunk = chunk[part.shape[0]:]
+            self._add(part)
+
+            self._position += part.shape[0]
+            if self._position == self.period:
+                # drops the incomplete bin at the end of the period
+                self._position = 0
+                self._partial[:] = 0
+                self._partial_count = 0
+
+    def _add(self, samples):
+        # samples from within a single period, anything past its last full
+        # bin is dropped
+        usable = self.bins_per_period * self.bin_size - self._position
+        samples = samples[:max(usable, 0)]
+
+        if self._partial_count and samples.shape[0]:
+            head = samples[:self.bin_size - self._partial_count]
+            samples = samples[head.shape[0]:]
+            self._partial += head.sum(axis=0, dtype=np.float64)
+            self._partial_count += head.shape[0]
+            if self._partial_count == self.bin_size:
+                self.output[self.num_bins] = self._partial / self.bin_size
+                self.num_bins += 1
+                self._partial[:] = 0
+                self._partial_count = 0
+
+        num_full = samples.shape[0] // self.bin_size
+        if num_full:
+            self.output[self.num_bins:self.num_bins + num_full] = reduce_bins(
+                samples[:num_full * self.bin_size], self.bin_size
+            )
+            self.num_bins += num_full
+
+        rest = samples[num_full * self.bin_size:]
+        if rest.shape[0]:
+            self._partial += rest.sum(axis=0, dtype=np.float64)
+            self._partial_count += rest.shape[0]
+
+    def result(self):
+        """The (bins, channels) averages of the bins completed so far"""
+        return self.output[:self.num_bins]
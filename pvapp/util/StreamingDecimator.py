@@ -0,0 +1,184 @@
+import threading
+
+import numpy as np
+from scipy import signal
+
+
+# low pass cutoff of the anti-aliasing filter, as a fraction of the
+# Nyquist frequency after decimation
+CUTOFF = 0.8
+
+_filter_banks = {}
+_filter_banks_lock = threading.Lock()
+
+
+def filter_bank(factor, rate, taps_per_phase=9, squared=False):
+    """
+    The polyphase bank of the anti-aliasing FIR filter for decimating by
+    factor from rate: a (taps_per_phase, factor) array whose row q holds
+    the taps applied to the q-th block of factor samples of a window. The
+    banks are designed once for each (factor, rate) and then shared.
+
+    With squared, the taps are squared, the filter which takes the
+    variances of independent samples to the variance of the output.
+    """
+    key = (int(factor), float(rate), int(taps_per_phase), bool(squared))
+    with _filter_banks_lock:
+        bank = _filter_banks.get(key)
+        if bank is None:
+            taps = signal.firwin(
+                taps_per_phase * factor, CUTOFF * rate / (2. * factor),
+                nyq=rate / 2.
+            )
+            if squared:
+                taps = taps ** 2
+            # reversed, so the bank is applied by correlation
+            bank = taps[::-1].reshape((taps_per_phase, factor))
+            bank.flags.writeable = False
+            _filter_banks[key] = bank
+        return bank
+
+
+class StreamingDecimator(object):
+    """
+    Low pass filters and decimates a stream of (samples, channels) chunks
+    by factor as the chunks arrive, an anti-aliased alternative to
+    StreamingBinner with the same interface.
+
+    Output i is timed, like a bin, at the centre of input samples
+    i * factor to (i + 1) * factor - 1, and is the FIR filter's response
+    over taps_per_phase blocks of factor samples centred there. The filter
+    is symmetric, so there is no delay. The start and end of each period
+    are padded with their first and last samples. Only the blocks of
+    samples not yet filtered are carried from one chunk to the next.
+
+    As StreamingBinner, the stream is num_periods periods of period
+    samples, each decimated on its own, and the samples at the end of a
+    period which do not fill a block are dropped.
+    """
+
+    def __init__(self, factor, rate, num_channels, period, num_periods=1,
+                 taps_per_phase=9, squared=False):
+        assert factor > 0
+        assert taps_per_phase % 2 == 1
+        self.bin_size = int(factor)
+        self.period = int(period)
+        self.bins_per_period = self.period // self.bin_size
+        self.bank = filter_bank(self.bin_size, rate, taps_per_phase, squared)
+        # blocks of padding either side of the centre block of a window
+        self._half = taps_per_phase // 2
+
+        self.output = np.empty(
+            (self.bins_per_period * num_periods, num_channels)
+        )
+        self.reset()
+
+    def reset(self):
+        """Starts a new stream"""
+        self.num_bins = 0
+        self._position = 0
+        self._start_period()
+
+    def _start_period(self):
+        # the samples whose filtering is not finished, starting at the
+        # first block of the next output's window
+        self._pending = None
+        self._period_bins = 0
+
+    def update(self, chunk):
+        """Decimates the next (samples, channels) chunk of the stream"""
+        while chunk.shape[0]:
+            part = chunk[:self.period - self._position]
+            chunk = chunk[part.shape[0]:]
+            self._add(part)
+
+            self._position += part.shape[0]
+            if self._position == self.period:
+                self._finish_period()
+                self._position = 0
+
+    def _add(self, samples):
+        if not samples.shape[0]:
+            return
+        if self._pending is None:
+            padding = np.repeat(
+                samples[:1], self._half * self.bin_size, axis=0
+            )
+            self._pending = np.concatenate((padding, samples))
+        else:
+            self._pending = np.concatenate((self._pending, samples))
+        self._filter()
+
+    def _finish_period(self):
+        if self._pending is not None:
+            # the windows of the last outputs run past the end of the period
+            padding = np.repeat(
+                self._pending[-1:], (self._half + 1) * self.bin_size, axis=0
+            )
+            self._pending = np.concatenate((self._pending, padding))
+            self._filter()
+        self._start_period()
+
+    def _filter(self):
+        taps_per_phase, factor = self.bank.shape
+        num_blocks = self._pending.shape[0] // factor
+        count = min(
+            num_blocks - taps_per_phase + 1,
+            self.bins_per_period - self._period_bins
+        )
+        if count <= 0:
+            return
+
+        blocks = self._pending[:num_blocks * factor].reshape(
+            (num_blocks, factor, -1)
+        )
+        # each phase of the bank filters its own stream of blocks
+        out = self.output[self.num_bins:self.num_bins + count]
+        out[:] = 0
+        for q in range(taps_per_phase):
+            out += np.einsum('mfc,f->mc', blocks[q:q + count], self.bank[q])
+
+        self.num_bins += count
+        self._period_bins += count
+        self._pending = self._pending[count * factor:].copy()
+
+    def result(self):
+        """The (outputs, channels) decimated samples completed so far"""
+        return self.output[:self.num_bins]
+
+
+def decimate(values, factor, rate, axis=0, taps_per_phase=9,
+             squared=False):
+    """
+    Decimates values, sampled at rate along axis, by factor in a single
+    batch (see StreamingDecimator)
+    """
+    if factor == 1:
+        return values
+    values = np.asarray(values)
+    axis = axis % values.ndim
+    values = np.rollaxis(values, axis)
+    shape = values.shape
+    samples = values.reshape((shape[0], -1))
+
+    decimator = StreamingDecimator(
+        factor, rate, samples.shape[1], shape[0],
+        taps_per_phase=taps_per_phase, squared=squared
+    )
+    decimator.update(samples)
+    decimated = decimator.result().reshape((-1,) + shape[1:])
+    return np.rollaxis(decimated, 0, axis + 1)
+
+
+def decimate_errors(errors, factor, rate, axis=0, taps_per_phase=9):
+    """
+    The standard errors of the output of decimate, from the standard errors
+    of its (independent) input samples: the square root of the squared taps
+    applied to their squares
+    """
+    if factor == 1:
+        return errors
+    errors = np.asarray(errors, dtype=np.float64)
+    return np.sqrt(decimate(
+        errors ** 2, factor, rate, axis, taps_per_phase, squared=True
+    ))
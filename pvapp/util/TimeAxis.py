@@ -0,0 +1,66 @@
+import numpy as np
+
+
+class TimeAxis(object):
+    """
+    The times t0 + i * dt of n evenly spaced samples.
+
+    Only the three numbers are stored; the times are computed when the axis
+    is converted to an array (np.asarray(axis), or assigning it into one).
+    Indexing with an integer gives a single time, and slicing gives another
+    TimeAxis.
+    """
+
+    def __init__(self, t0, dt, n):
+        self.t0 = float(t0)
+        self.dt = float(dt)
+        self.n = int(n)
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def shape(self):
+        return (self.n,)
+
+    @property
+    def rate(self):
+        return 1. / self.dt
+
+    def values(self, dtype=np.float64):
+        """The times of all the samples"""
+        times = np.arange(self.n, dtype=dtype)
+        times *= self.dt
+        times += self.t0
+        return times
+
+    def __array__(self, dtype=None):
+        return self.values(np.float64 if dtype is None else dtype)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.n)
+            return TimeAxis(
+                self.t0 + start * self.dt,
+                self.dt * step,
+                len(range(start, stop, step))
+            )
+        if isinstance(index, (int, long, np.integer)):
+            if index < 0:
+                index += self.n
+            if not 0 <= index < self.n:
+                raise IndexError('TimeAxis index out of range')
+            return self.t0 + index * self.dt
+        return self.values()[index]
+
+    def __eq__(self, other):
+        return (isinstance(other, TimeAxis) and
+                (self.t0, self.dt, self.n) == (other.t0, other.dt, other.n))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'TimeAxis(t0={0!r}, dt={1!r}, n={2!r})'.format(
+            self.t0, self.dt, self.n
+        )
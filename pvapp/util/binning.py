@@ -0,0 +1,130 @@
+"""
+Vectorised binning of sampled data, in fixed size bins or on log spaced
+time edges.
+
+A bin is reduced to one value by its mean, median or sum (see
+REDUCTIONS). The samples are grouped with reshapes and np.add.reduceat
+rather than a python loop over the bins.
+"""
+import numpy as np
+
+
+REDUCTIONS = {
+    'mean': np.mean,
+    'median': np.median,
+    'sum': np.sum,
+}
+
+
+def _reduction(method):
+    try:
+        return REDUCTIONS[method]
+    except KeyError:
+        raise ValueError('Unknown bin reduction: {0}'.format(method))
+
+
+def reduce_bins(values, bin_size, axis=0, keep_tail=False, method='mean'):
+    """
+    Reduces every bin_size successive samples of values, along axis, to
+    one. The samples left over at the end are dropped, or with keep_tail
+    reduced to a last, shorter, bin.
+    """
+    reduce = _reduction(method)
+    values = np.asarray(values)
+    axis = axis % values.ndim
+    values = np.rollaxis(values, axis)
+    num_bins = values.shape[0] // bin_size
+
+    full = values[:num_bins * bin_size].reshape(
+        (num_bins, bin_size) + values.shape[1:]
+    )
+    binned = reduce(full, axis=1)
+
+    if keep_tail and values.shape[0] > num_bins * bin_size:
+        tail = reduce(values[num_bins * bin_size:], axis=0)
+        binned = np.concatenate((binned, tail[np.newaxis]))
+
+    return np.rollaxis(binned, 0, axis + 1)
+
+
+def reduce_errors(errors, bin_size, axis=0, keep_tail=False, method='mean'):
+    """
+    The standard errors of the bins of reduce_bins, from the standard
+    errors of their samples, which are combined in quadrature: the sum's
+    is sqrt(sum(se ** 2)), the mean's that over the number of samples. The
+    median's is taken as sqrt(pi / 2) times the mean's, as for normally
+    distributed samples.
+    """
+    _reduction(method)
+    errors = np.asarray(errors, dtype=np.float64)
+    axis = axis % errors.ndim
+    combined = np.sqrt(reduce_bins(
+        errors ** 2, bin_size, axis=axis, keep_tail=keep_tail, method='sum'
+    ))
+    if method == 'sum':
+        return combined
+
+    num_samples = errors.shape[axis]
+    counts = np.full(combined.shape[axis], float(bin_size))
+    if combined.shape[axis] * bin_size > num_samples:
+        counts[-1] = num_samples % bin_size
+    shape = [1] * errors.ndim
+    shape[axis] = counts.size
+    combined /= counts.reshape(shape)
+    if method == 'median':
+        combined *= np.sqrt(np.pi / 2.)
+    return combined
+
+
+def log_bin_edges(t_start, t_end, num_bins):
+    """num_bins + 1 logarithmically spaced edges from t_start to t_end"""
+    assert 0 < t_start < t_end
+    return np.logspace(np.log10(t_start), np.log10(t_end), num_bins + 1)
+
+
+def log_bin(times, values, num_bins, t_start=None, t_end=None,
+            method='mean'):
+    """
+    Bins (samples, ...) values taken at the ascending times on num_bins log
+    spaced edges from t_start, by default the first positive time, to
+    t_end, by default the last time. Samples outside the edges are left
+    out.
+
+    Returns the mean time of each bin and its reduced values. Bins with no
+    samples in them, common at early times where the bins are narrower
+    than the sample interval, are left out too.
+    """
+    reduce = _reduction(method)
+    times = np.asarray(times)
+    values = np.asarray(values)
+
+    if t_start is None:
+        t_start = times[np.searchsorted(times, 0, side='right')]
+    if t_end is None:
+        t_end = times[-1]
+    edges = log_bin_edges(t_start, t_end, num_bins)
+
+    index = np.searchsorted(edges, times, side='right') - 1
+    # the last edge closes the last bin
+    index[times == edges[-1]] = num_bins - 1
+    inside = (index >= 0) & (index < num_bins)
+    times, values, index = times[inside], values[inside], index[inside]
+
+    if index.size == 0:
+        return times[:0], values[:0]
+
+    # the times are sorted, so each bin is a contiguous run of samples
+    starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+    counts = np.diff(np.r_[starts, index.size])
+
+    bin_times = np.add.reduceat(times, starts) / counts
+    if reduce is np.median:
+        binned = np.array([
+            np.median(group, axis=0)
+            for group in np.split(values, starts[1:])
+        ])
+    else:
+        binned = np.add.reduceat(values, starts, axis=0)
+        if reduce is np.mean:
+            binned = binned / counts.reshape((-1,) + (1,) * (values.ndim - 1))
+    return bin_times, binned
@@ -2,6 +2,10 @@ import numpy as np
 import json
 import os
 
+from models.Dataset import Dataset
+from util.binning import log_bin, reduce_bins
+from util.TimeAxis import TimeAxis
+
 
 def enum(**named_values):
     return type('Enum', (), named_values)
@@ -15,36 +19,75 @@ def is_float(s):
         return False
 
 
-def bin_data(data, bin_size):
+def bin_data(data, bin_size, keep_tail=False, method='mean'):
     """
-    Returns data where each successive bin_amount data points
-    are grouped together
+    Returns data where each successive bin_size data points are reduced to
+    one, by their mean, median or sum, along the first axis of any 1D or 2D
+    array (every column is reduced the same way) or the samples of a
+    Dataset. The data points left over at the end are dropped, or with
+    keep_tail reduced to a last, shorter, bin.
+
+    Only a Dataset knows which of its rows are standard errors, and
+    combines those in quadrature (see Dataset.bin).
     """
 
     if bin_size == 1:
         return data
-    # This is part of a generic binning class that I wrote.
-    # It lets binning occur of the first axis for any 2D or 1D array
-    if len(data.shape) == 1:
-        data2 = np.zeros((data.shape[0] // bin_size))
+    if isinstance(data, Dataset):
+        return data.bin(bin_size, keep_tail, method)
+    return reduce_bins(data, bin_size, keep_tail=keep_tail, method=method)
+
+
+def log_bin_data(data, num_bins, t_start=None, t_end=None, method='mean'):
+    """
+    Bins a (samples, 1 + columns) array or Dataset, whose time is in column
+    0, on num_bins logarithmically spaced times from t_start to t_end (see
+    binning.log_bin). Returns an array of the same columns, timed at the
+    mean time of each bin.
+    """
+    if isinstance(data, Dataset):
+        times, values = np.asarray(data.time), data.values.T
     else:
-        print('bin size: ', bin_size, '\nshape:', data.shape)
-        data2 = np.zeros((data.shape[0] // bin_size, data.shape[1]))
+        times, values = data[:, 0], data[:, 1:]
+
+    bin_times, binned = log_bin(
+        times, values, num_bins, t_start, t_end, method
+    )
+    return np.column_stack((bin_times, binned))
 
-    for i in range(data.shape[0] // bin_size):
-        data2[i] = np.mean(data[i * bin_size:(i + 1) * bin_size], axis=0)
 
-    return data2
+# first header line of files written from a Dataset, which have no time
+# column
+TIME_AXIS_HEADER = 't0 (s)\t{0!r}\tdt (s)\t{1!r}'
 
 
 def save_data(data, filename, filepath):
     """
     Writes experimental data to TSV file
+
+    A Dataset is written without its time column; t0 and dt are given on
+    the first header line instead, and its channels are named on the
+    second.
     """
 
-    variables = 'Time (s)\tGeneration (V)\tPC (V)\tPL (V)'
+    variables = ['Time (s)', 'Generation (V)', 'PC (V)', 'PL (V)']
+    if data.ndim == 2 and data.shape[1] > len(variables):
+        # averaged measurements carry the standard error of each channel
+        variables += ['Generation SE (V)', 'PC SE (V)', 'PL SE (V)']
+    header = '\t'.join(variables)
+    if isinstance(data, Dataset):
+        variables = ['{0} (V)'.format(name) for name in data.names]
+        if data.has_errors:
+            variables += [
+                '{0} SE (V)'.format(name) for name in data.names
+            ]
+        header = '\n'.join([
+            TIME_AXIS_HEADER.format(data.t0, data.dt),
+            '\t'.join(variables)
+        ])
+        data = data.values.T
     full_path = os.path.join(filepath, filename + '.tsv')
-    np.savetxt(full_path, data, delimiter='\t', header=variables)
+    np.savetxt(full_path, data, delimiter='\t', header=header)
 
 
 def save_metadata(metadata_dict, file_dir, file_name):
@@ -84,13 +127,27 @@ def load_metadata(filename, filepath):
 
 def load_data(full_filepath):
     """
-    Loads data file and returns a numpy structured array
+    Loads data file and returns a Dataset
     """
-
+    with open(full_filepath, 'r') as f:
+        first_line = f.readline().lstrip('# ').split('\t')
+        second_line = f.readline().lstrip('# ').rstrip('\n').split('\t')
+
+    if first_line[0] == 't0 (s)':
+        values = np.loadtxt(full_filepath, ndmin=2)
+        time = TimeAxis(
+            float(first_line[1]), float(first_line[3]), values.shape[0]
+        )
+        names = [
+            variable[:-len(' (V)')] for variable in second_line
+            if not variable.endswith(' SE (V)')
+        ]
+        return Dataset(time, np.ascontiguousarray(values.T), names)
+
+    # files with a time column
     data_record = np.loadtxt(
         full_filepath,
-        skiprows=1
+        skiprows=1,
+        ndmin=2
     )
-    # TODO: better integrate this into the data object.
-    data_record.view(np.float64).reshape(data_record.shape + (-1,))
-    return data_record
+    return Dataset.from_array(data_record)